@@ -0,0 +1,68 @@
+"""
+Shared fixtures for the frame_msg benchmark suite.
+
+All inputs are synthetic and generated from fixed seeds so that results are comparable between runs.
+Run with `pytest benchmarks --benchmark-only`; see README.md for saving and comparing baselines.
+"""
+import asyncio
+import io
+import tracemalloc
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from frame_msg import FrameMsg, SimFrameBle
+
+SEED = 20250101
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(SEED)
+
+@pytest.fixture
+def event_loop_runner():
+    """Runs coroutines to completion on a single event loop reused across benchmark rounds"""
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    loop.close()
+
+@pytest.fixture
+def frame():
+    """A FrameMsg over an unconnected SimFrameBle, enough for Rx classes to attach and receive data"""
+    return FrameMsg(ble=SimFrameBle(time_scale=0))
+
+@pytest.fixture
+def jpeg_720():
+    """A 720x720 JPEG with enough detail to be representative of a Frame photo"""
+    rng = np.random.default_rng(SEED)
+    y, x = np.mgrid[0:720, 0:720]
+    base = np.stack([(x * 255 // 719), (y * 255 // 719), ((x + y) * 255 // 1438)], axis=-1)
+    noise = rng.integers(0, 48, size=(720, 720, 3))
+    pixels = np.clip(base + noise, 0, 255).astype(np.uint8)
+    output = io.BytesIO()
+    Image.fromarray(pixels).save(output, format='JPEG', quality=90)
+    return output.getvalue()
+
+@pytest.fixture
+def record_peak_alloc(benchmark):
+    """
+    Returns a function that runs the benchmarked callable once under tracemalloc and records
+    its peak traced allocation in bytes as `peak_alloc_bytes` in the benchmark's extra_info,
+    so it is saved and tracked alongside the timing statistics.
+    """
+    def record(func, *args, **kwargs):
+        tracemalloc.start()
+        try:
+            func(*args, **kwargs)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        benchmark.extra_info['peak_alloc_bytes'] = peak
+    return record
+
+def chunked(payload: bytes, flag: int, final_flag: int, chunk_size: int = 239):
+    """Split a payload into Frame-to-host notifications the way camera.lua and audio.lua send them"""
+    chunks = [bytes([flag]) + payload[i:i + chunk_size] for i in range(0, len(payload), chunk_size)]
+    chunks.append(bytes([final_flag]))
+    return chunks
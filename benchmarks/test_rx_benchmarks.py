@@ -0,0 +1,141 @@
+"""Benchmarks for the hostside Rx data handling hot paths, fed with synthetic Frame notifications."""
+import io
+import struct
+
+import pytest
+
+from frame_msg import ComplementaryFilter, EMAFilter, MedianFilter, RxAudio, RxAutoExpResult, RxIMU, RxIMURecorder, RxPhoto, SensorBuffer, WavWriter
+
+from conftest import chunked
+
+@pytest.mark.parametrize('upright', [False, True], ids=['as_is', 'upright'])
+def test_photo_reassembly(benchmark, record_peak_alloc, event_loop_runner, frame, jpeg_720, upright):
+    chunks = chunked(jpeg_720, 0x07, 0x08)
+    rx_photo = RxPhoto(upright=upright)
+
+    async def receive_photo():
+        queue = await rx_photo.attach(frame)
+        for chunk in chunks:
+            rx_photo.handle_data(chunk)
+        image = await queue.get()
+        rx_photo.detach(frame)
+        return image
+
+    record_peak_alloc(event_loop_runner, receive_photo())
+    benchmark(lambda: event_loop_runner(receive_photo()))
+
+@pytest.mark.parametrize('bits_per_sample', [8, 16])
+def test_audio_to_wav_bytes(benchmark, record_peak_alloc, rng, bits_per_sample):
+    # one minute of 8kHz audio
+    pcm = rng.integers(0, 256, size=8000 * 60 * bits_per_sample // 8, dtype='uint8').tobytes()
+    record_peak_alloc(RxAudio.to_wav_bytes, pcm, bits_per_sample=bits_per_sample)
+    benchmark(RxAudio.to_wav_bytes, pcm, bits_per_sample=bits_per_sample)
+
+@pytest.mark.parametrize('bits_per_sample', [8, 16])
+def test_audio_wav_writer(benchmark, record_peak_alloc, rng, bits_per_sample):
+    # one minute of 8kHz audio in notification-sized chunks
+    pcm = rng.integers(0, 256, size=8000 * 60 * bits_per_sample // 8, dtype='uint8').tobytes()
+    chunks = [pcm[i:i + 240] for i in range(0, len(pcm), 240)]
+
+    def write_wav():
+        with WavWriter(io.BytesIO(), bits_per_sample=bits_per_sample) as writer:
+            for chunk in chunks:
+                writer.write(chunk)
+
+    record_peak_alloc(write_wav)
+    benchmark(write_wav)
+
+def test_audio_streaming_receive(benchmark, event_loop_runner, frame, rng):
+    pcm = rng.integers(0, 256, size=8000 * 10, dtype='uint8').tobytes()
+    chunks = chunked(pcm, 0x05, 0x06)
+    rx_audio = RxAudio(streaming=True)
+
+    async def receive_audio():
+        queue = await rx_audio.attach(frame)
+        for chunk in chunks:
+            rx_audio.handle_data(chunk)
+        while await queue.get() is not None:
+            pass
+        rx_audio.detach(frame)
+
+    benchmark(lambda: event_loop_runner(receive_audio()))
+
+@pytest.mark.parametrize('batch', [False, True], ids=['per_sample', 'batched'])
+@pytest.mark.parametrize('smoothing_samples', [1, 100])
+def test_imu_handle_data(benchmark, record_peak_alloc, event_loop_runner, frame, rng, smoothing_samples, batch):
+    # one second of IMU data at 1kHz
+    samples = rng.integers(-8192, 8192, size=(1000, 6))
+    packets = [struct.pack('<Bx6h', 0x0A, *sample) for sample in samples.tolist()]
+    rx_imu = RxIMU(smoothing_samples=smoothing_samples, batch=batch)
+
+    async def receive_imu():
+        queue = await rx_imu.attach(frame)
+        for packet in packets:
+            rx_imu.handle_data(packet)
+        received = 0
+        while received < len(packets):
+            item = await queue.get()
+            received += len(item) if batch else 1
+        rx_imu.detach(frame)
+
+    record_peak_alloc(event_loop_runner, receive_imu())
+    benchmark(lambda: event_loop_runner(receive_imu()))
+
+def test_imu_record(benchmark, record_peak_alloc, rng):
+    # one second of IMU data at 1kHz, recorded in memory
+    samples = rng.integers(-8192, 8192, size=(1000, 6))
+    packets = [memoryview(struct.pack('<Bx6h', 0x0A, *sample)) for sample in samples.tolist()]
+
+    def record_imu():
+        recorder = RxIMURecorder(chunk_samples=1000)
+        for packet in packets:
+            recorder.handle_data(packet)
+        return recorder
+
+    record_peak_alloc(record_imu)
+    benchmark(record_imu)
+
+@pytest.mark.parametrize('smoothing', ['moving_average', 'median', 'ema', 'complementary'])
+def test_imu_filter_batch(benchmark, rng, smoothing):
+    # ten seconds of IMU data at 1kHz, filtered as arrays
+    compass = rng.integers(-8192, 8192, size=(10000, 3))
+    accel = rng.integers(-8192, 8192, size=(10000, 3))
+    if smoothing == 'complementary':
+        benchmark(lambda: ComplementaryFilter().update_batch(compass, accel))
+    else:
+        create = {'moving_average': lambda: SensorBuffer(100), 'median': lambda: MedianFilter(100), 'ema': lambda: EMAFilter(0.2)}[smoothing]
+        benchmark(lambda: create().update_batch(accel))
+
+@pytest.mark.parametrize('history_size', [0, 100], ids=['no_history', 'history'])
+def test_auto_exp_handle_data(benchmark, record_peak_alloc, event_loop_runner, frame, rng, history_size):
+    # ten minutes of auto exposure results at 10Hz
+    results = rng.random(size=(6000, 16)).tolist()
+    packets = [memoryview(struct.pack('<B16f', 0x11, *result)) for result in results]
+    rx_auto_exp = RxAutoExpResult(batch=True, history_size=history_size)
+
+    async def receive_results():
+        queue = await rx_auto_exp.attach(frame)
+        for packet in packets:
+            rx_auto_exp.handle_data(packet)
+        received = 0
+        while received < len(packets):
+            received += len(await queue.get())
+        rx_auto_exp.detach(frame)
+
+    record_peak_alloc(event_loop_runner, receive_results())
+    benchmark(lambda: event_loop_runner(receive_results()))
+
+@pytest.mark.parametrize('subscribers', [1, 2])
+def test_data_response_dispatch(benchmark, event_loop_runner, frame, subscribers):
+    # one second of IMU notifications at 1kHz, as FrameBle delivers them
+    packets = [memoryview(struct.pack('<Bx6h', 0x0A, *range(6))) for _ in range(1000)]
+    received = []
+    for subscriber in range(subscribers):
+        frame.register_data_response_handler(subscriber, [0x0A], received.append)
+
+    async def dispatch():
+        for packet in packets:
+            await frame._handle_data_response(packet)
+        received.clear()
+
+    benchmark(lambda: event_loop_runner(dispatch()))
@@ -0,0 +1,20 @@
+"""Benchmarks for hostside message sending over a simulated Frame link."""
+import pytest
+
+from frame_msg import FrameMsg, SimFrameBle
+
+@pytest.mark.parametrize('windowed', [False, True], ids=['stop_and_wait', 'windowed'])
+def test_send_message(benchmark, event_loop_runner, rng, windowed):
+    # a 30 KB message (e.g. an image sprite block) over a link with a tenth of the default BLE latency
+    payload = rng.integers(0, 256, size=30000, dtype='uint8').tobytes()
+    sim = SimFrameBle(time_scale=0.1, seed=1)
+    frame = FrameMsg(ble=sim, windowed=windowed)
+    event_loop_runner(frame.connect(initialize=False))
+
+    async def send():
+        await frame.send_message(0x20, payload)
+        await sim.flush()
+
+    benchmark.pedantic(lambda: event_loop_runner(send()), rounds=5)
+    event_loop_runner(frame.disconnect())
+    assert sim.messages[-1] == (0x20, payload)
@@ -0,0 +1,59 @@
+"""Benchmarks for the hostside Tx message construction and packing hot paths."""
+import pytest
+
+from frame_msg import TxImageSpriteBlock, TxSprite, TxTextSpriteBlock
+
+SPRITE_SIZES = {'full': (640, 400), 'icon': (64, 64)}
+
+def make_sprite(rng, num_colors, size, compress=False):
+    width, height = SPRITE_SIZES[size]
+    # blocky content so that lz4 has something realistic to work with
+    blocks = rng.integers(0, num_colors, size=((height + 7) // 8, (width + 7) // 8), dtype='uint8')
+    pixels = blocks.repeat(8, axis=0).repeat(8, axis=1)[:height, :width]
+    palette = bytes(rng.integers(0, 256, size=num_colors * 3, dtype='uint8'))
+    return TxSprite(width=width, height=height, num_colors=num_colors, palette_data=palette,
+                    pixel_data=pixels.tobytes(), compress=compress)
+
+@pytest.mark.parametrize('size', sorted(SPRITE_SIZES))
+@pytest.mark.parametrize('compress', [False, True], ids=['raw', 'lz4'])
+@pytest.mark.parametrize('num_colors', [2, 4, 16], ids=['1bpp', '2bpp', '4bpp'])
+def test_sprite_pack(benchmark, record_peak_alloc, rng, num_colors, compress, size):
+    sprite = make_sprite(rng, num_colors, size, compress)
+    record_peak_alloc(sprite.pack)
+    benchmark(sprite.pack)
+
+@pytest.mark.parametrize('num_colors', [2, 4, 16], ids=['1bpp', '2bpp', '4bpp'])
+def test_sprite_pack_into(benchmark, record_peak_alloc, rng, num_colors):
+    sprite = make_sprite(rng, num_colors, 'full')
+    buffer = bytearray(sprite.packed_size)
+    record_peak_alloc(sprite.pack_into, buffer)
+    benchmark(sprite.pack_into, buffer)
+
+@pytest.mark.parametrize('compress', [False, True], ids=['raw', 'lz4'])
+def test_image_sprite_block_split(benchmark, record_peak_alloc, rng, compress):
+    sprite = make_sprite(rng, 16, 'full', compress)
+    record_peak_alloc(TxImageSpriteBlock, sprite)
+    benchmark(TxImageSpriteBlock, sprite)
+
+def test_image_sprite_block_pack_all(benchmark, rng):
+    block = TxImageSpriteBlock(make_sprite(rng, 16, 'full'))
+
+    def pack_all():
+        return [block.pack()] + [line.pack() for line in block.sprite_lines]
+
+    benchmark(pack_all)
+
+@pytest.mark.parametrize('cached', [False, True], ids=['cold', 'cached'])
+def test_text_sprite_block_render(benchmark, record_peak_alloc, cached):
+    text = '\n'.join(f'Caption line {i}: the quick brown fox jumps over the lazy dog' for i in range(5))
+
+    def render():
+        return TxTextSpriteBlock(width=600, font_size=40, max_display_rows=5, text=text)
+
+    def setup():
+        if not cached:
+            TxTextSpriteBlock.clear_cache()
+
+    setup()
+    record_peak_alloc(render)
+    benchmark.pedantic(render, setup=setup, rounds=50, warmup_rounds=1)
@@ -4,21 +4,32 @@ frame_msg - Frame Message Package defines Transmit- and Receive-related frame me
 
 __version__ = "0.0.1"
 
-from .frame_msg import FrameMsg
+from .capture_roi import CaptureRoi, RoiPhoto
+from .frame_msg import FrameMsg, FrameTransport
+from .imu_filters import ComplementaryFilter, EMAFilter, MedianFilter, SensorBuffer
+from .send_scheduler import CompressionStats, SendScheduler
+from .sim_frame_ble import SimFrameBle, SimLinkStats
+from .telemetry import TelemetryFilter, TelemetryHistory
 
 from .tx_auto_exp_settings import TxAutoExpSettings
 from .tx_capture_settings import TxCaptureSettings
 from .tx_code import TxCode
-from .tx_image_sprite_block import TxImageSpriteBlock
+from .tx_image_sprite_block import TxImageSpriteBlock, TxImageSpriteStrip
 from .tx_manual_exp_settings import TxManualExpSettings
 from .tx_plain_text import TxPlainText
 from .tx_sprite import TxSprite
+from .tx_sprite_cache import SpriteCache, TxSpriteCacheStore
 from .tx_sprite_coords import TxSpriteCoords
-from .tx_text_sprite_block import TxTextSpriteBlock
+from .tx_text_sprite_block import TextSpriteSession, TxTextSpriteBlock, TxTextSpriteLine
 
 from .rx_audio import RxAudio
-from .rx_auto_exp_result import RxAutoExpResult
+from .rx_auto_exp_result import AutoExpBrightness, AutoExpResult, ColorBrightness, RxAutoExpResult
 from .rx_imu import RxIMU
-from .rx_metering_data import RxMeteringData
+from .rx_imu_recorder import RxIMURecorder
+from .rx_metering_data import MeteringData, RxMeteringData
 from .rx_photo import RxPhoto
+from .rx_queue import RxQueue
 from .rx_tap import RxTap
+from .wav_writer import WavWriter
+
+from .capture_controller import CaptureController, CaptureDecision, LinkMetrics
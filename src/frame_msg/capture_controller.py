@@ -0,0 +1,168 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, replace
+from typing import Deque, Dict, Optional, Sequence
+
+from frame_msg import FrameMsg
+from frame_msg.rx_photo import JPEG_HEADER_LENGTH, PhotoTiming, RxPhoto
+from frame_msg.tx_capture_settings import TxCaptureSettings
+
+@dataclass
+class LinkMetrics:
+    """Smoothed measurements of the photo link, updated after each photo"""
+    throughput: Optional[float] = None  # bytes per second while an image is transferring
+    overhead: Optional[float] = None  # seconds from the capture request to the first byte of the image
+    latency: Optional[float] = None  # seconds from the capture request to the last byte of the image
+    last_image_size: int = 0
+    photos: int = 0
+
+@dataclass
+class CaptureDecision:
+    """The settings chosen for a photo, and the size and latency they were predicted to have"""
+    settings: TxCaptureSettings
+    predicted_size: int
+    predicted_latency: Optional[float]
+    reason: str
+
+class CaptureController:
+    """
+    Chooses the resolution and quality of each photo to meet a latency (or frame rate) target on the current link.
+
+    The expected JPEG size of each (resolution, quality) starts from `RxPhoto.estimated_size()` and is corrected per
+    quality level from the sizes actually received. The latency of a photo is predicted as the measured overhead
+    (capture request, capture and the first notification) plus the expected size over the measured throughput.
+    Each photo gets the largest expected image that is predicted to arrive within `headroom` of the budget,
+    or the smallest one if none is. Until the link has been measured, the `template`'s settings are used.
+
+    `metrics` and the recent `decisions` can be read for monitoring.
+    """
+    def __init__(
+        self,
+        target_latency: Optional[float] = None,
+        target_fps: Optional[float] = None,
+        template: Optional[TxCaptureSettings] = None,
+        resolutions: Sequence[int] = (256, 320, 400, 512, 640, 720),
+        quality_indexes: Sequence[int] = (0, 1, 2, 3, 4),
+        smoothing: float = 0.3,
+        headroom: float = 0.9,
+        history: int = 100,
+    ):
+        """
+        Args:
+            target_latency: Seconds from the capture request to the complete image that each photo should take
+            target_fps: Photos per second to sustain when capturing one after another; used if target_latency isn't set
+            template: Settings for the first photo, and the pan and raw settings of every photo
+            resolutions: The resolutions to choose from (even numbers between 256 and 720)
+            quality_indexes: The quality levels to choose from, as indexes into [VERY_LOW, LOW, MEDIUM, HIGH, VERY_HIGH]
+            smoothing: Weight of each new measurement in the smoothed link metrics and size corrections
+            headroom: Fraction of the latency budget the predicted latency may use
+            history: Number of recent decisions to keep in `decisions`
+        """
+        if target_latency is None and target_fps is None:
+            raise ValueError("Either target_latency or target_fps is required")
+
+        self.budget = target_latency if target_latency is not None else 1.0 / target_fps
+        self.template = template if template is not None else TxCaptureSettings()
+        self.resolutions = tuple(resolutions)
+        self.quality_indexes = tuple(quality_indexes)
+        self.smoothing = smoothing
+        self.headroom = headroom
+
+        self.metrics = LinkMetrics()
+        self.decisions: Deque[CaptureDecision] = deque(maxlen=history)
+        # ratio of the received to the estimated image size at each quality index
+        self._size_correction: Dict[int, float] = {}
+
+    def _smooth(self, previous: Optional[float], value: float) -> float:
+        return value if previous is None else previous + self.smoothing * (value - previous)
+
+    def predicted_size(self, resolution: int, quality_index: int) -> int:
+        """The expected number of bytes transferred for a photo at the given resolution and quality"""
+        correction = self._size_correction.get(quality_index)
+        if correction is None:
+            corrections = self._size_correction.values()
+            correction = sum(corrections) / len(corrections) if corrections else 1.0
+
+        size = RxPhoto.estimated_size(RxPhoto._quality_values[quality_index], resolution) * correction
+        if self.template.raw:
+            size -= JPEG_HEADER_LENGTH
+        return max(int(size), 0)
+
+    def predicted_latency(self, size: int) -> Optional[float]:
+        """The expected seconds from the capture request to the last byte of a photo of `size` bytes, once the link has been measured"""
+        if self.metrics.throughput is None:
+            return None
+        return (self.metrics.overhead or 0.0) + size / self.metrics.throughput
+
+    def next_settings(self) -> TxCaptureSettings:
+        """Choose the settings for the next photo, recording the decision in `decisions`"""
+        if self.metrics.throughput is None:
+            settings = self.template
+            size = self.predicted_size(settings.resolution, settings.quality_index)
+            decision = CaptureDecision(settings, size, None, 'link not measured yet')
+        else:
+            candidates = sorted(
+                ((self.predicted_size(resolution, quality_index), resolution, quality_index)
+                 for resolution in self.resolutions for quality_index in self.quality_indexes),
+                key=lambda candidate: (candidate[0], candidate[1]))
+            fitting = [c for c in candidates if self.predicted_latency(c[0]) <= self.budget * self.headroom]
+            size, resolution, quality_index = fitting[-1] if fitting else candidates[0]
+            reason = 'largest image within budget' if fitting else 'no settings within budget, using the smallest'
+            settings = replace(self.template, resolution=resolution, quality_index=quality_index)
+            decision = CaptureDecision(settings, size, self.predicted_latency(size), reason)
+
+        self.decisions.append(decision)
+        return decision.settings
+
+    def record(self, settings: TxCaptureSettings, image_size: int, latency: float, timing: Optional[PhotoTiming] = None) -> None:
+        """
+        Update the link metrics and size model with a received photo.
+
+        Args:
+            settings: The settings the photo was captured with
+            image_size: Number of image bytes transferred
+            latency: Seconds from the capture request to the last byte
+            timing: The photo's timing, if known, to separate the transfer time from the overhead
+        """
+        transfer = timing.transfer if timing is not None else 0.0
+        if transfer <= 0:
+            # without the time of the first byte, count the whole latency as transfer time (a conservative throughput)
+            transfer = latency
+
+        metrics = self.metrics
+        if image_size > 0 and transfer > 0:
+            metrics.throughput = self._smooth(metrics.throughput, image_size / transfer)
+        metrics.overhead = self._smooth(metrics.overhead, max(latency - transfer, 0.0))
+        metrics.latency = self._smooth(metrics.latency, latency)
+        metrics.last_image_size = image_size
+        metrics.photos += 1
+
+        # the size model is of the whole JPEG, including the header that raw photos leave out
+        estimate = RxPhoto.estimated_size(RxPhoto._quality_values[settings.quality_index], settings.resolution)
+        full_size = image_size + JPEG_HEADER_LENGTH if settings.raw else image_size
+        if image_size > 0:
+            q = settings.quality_index
+            self._size_correction[q] = self._smooth(self._size_correction.get(q), full_size / estimate)
+
+    async def capture(self, frame: FrameMsg, rx_photo: RxPhoto, queue: asyncio.Queue,
+                      capture_msg_code: int = 0x0d, timeout: float = 30.0):
+        """
+        Request a photo with the next settings on `capture_msg_code`, wait for it on `queue` (from `rx_photo.attach()`),
+        record its size and timing and return it. For raw photos, `rx_photo` must have a matching JPEG header,
+        see `RxPhoto.prime_jpeg_headers()`.
+        """
+        settings = self.next_settings()
+        if rx_photo.is_raw:
+            rx_photo.quality = RxPhoto._quality_values[settings.quality_index]
+            rx_photo.resolution = settings.resolution
+
+        start = time.time()
+        await frame.send_message(capture_msg_code, settings.pack())
+        image = await asyncio.wait_for(queue.get(), timeout)
+
+        # RxPhoto records the transfer before any upright processing, so this is the time the last byte arrived
+        timing = rx_photo.last_timing
+        latency = (timing.last_byte if timing is not None else time.time()) - start
+        self.record(settings, rx_photo.last_image_size, latency, timing)
+        return image
@@ -0,0 +1,65 @@
+import math
+from dataclasses import dataclass, replace
+from typing import Optional, Tuple
+
+from frame_msg.tx_capture_settings import TxCaptureSettings
+
+@dataclass
+class CaptureRoi:
+    """
+    A region of interest to capture, for when only part of the camera's view is needed.
+
+    Coordinates are fractions of the full field of view as `RxPhoto` delivers it (upright by default) at pan 0:
+    (0, 0) is the top left and (1, 1) the bottom right. `y` and `y + height` may extend up to
+    `MAX_PAN / 720` beyond 0 and 1 to reach the parts of the view only visible with a pan.
+
+    Frame's camera can't crop: it captures the whole field of view at the requested resolution, panned vertically.
+    So `capture_settings()` chooses the lowest resolution that still gives the region `min_pixels` across its larger side,
+    and the smallest pan that brings it into view, and `RxPhoto` crops the region out of the received image
+    (see `RxPhoto.expect_roi()`). Since the JPEG size scales with the square of the resolution, a region that needs
+    fewer pixels than a full-resolution capture would give it costs correspondingly fewer bytes.
+    """
+    x: float
+    y: float
+    width: float
+    height: float
+    min_pixels: int = 128
+
+    MIN_RESOLUTION = 256
+    MAX_RESOLUTION = 720
+    MAX_PAN = 140
+
+    def capture_settings(self, template: Optional[TxCaptureSettings] = None) -> TxCaptureSettings:
+        """The capture settings (from `template`, for the quality and raw settings) with the resolution and pan for this region"""
+        template = template if template is not None else TxCaptureSettings()
+
+        resolution = math.ceil(self.min_pixels / max(self.width, self.height, 1e-6))
+        resolution = min(max(resolution + (resolution & 1), self.MIN_RESOLUTION), self.MAX_RESOLUTION)
+
+        # a positive pan moves the view up, bringing rows above the top of the unpanned view into it
+        pan = 0
+        if self.y < 0:
+            pan = math.ceil(-self.y * self.MAX_RESOLUTION)
+        elif self.y + self.height > 1:
+            pan = -math.ceil((self.y + self.height - 1) * self.MAX_RESOLUTION)
+        pan = min(max(pan, -self.MAX_PAN), self.MAX_PAN)
+
+        return replace(template, resolution=resolution, pan=pan)
+
+    def crop_box(self, resolution: int, pan: int = 0) -> Tuple[int, int, int, int]:
+        """The (left, top, right, bottom) pixel box of this region in an image captured at `resolution` and `pan`"""
+        top_offset = pan / self.MAX_RESOLUTION
+        left = max(math.floor(self.x * resolution), 0)
+        top = max(math.floor((self.y + top_offset) * resolution), 0)
+        right = min(math.ceil((self.x + self.width) * resolution), resolution)
+        bottom = min(math.ceil((self.y + self.height + top_offset) * resolution), resolution)
+        return left, top, max(right, left + 1), max(bottom, top + 1)
+
+@dataclass
+class RoiPhoto:
+    """A photo cropped to a `CaptureRoi` by `RxPhoto`, with where the crop came from"""
+    image: bytes
+    roi: CaptureRoi
+    box: Tuple[int, int, int, int]  # (left, top, right, bottom) in the captured image
+    resolution: int
+    pan: int
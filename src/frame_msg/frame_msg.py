@@ -1,19 +1,67 @@
-from typing import List
+import asyncio
+from typing import Dict, List, Optional, Protocol
 from importlib.resources import files
 
 from frame_ble import FrameBle
 from typing import Callable
 
+from .send_scheduler import CompressionStats, SendScheduler
+
+class FrameTransport(Protocol):
+    """
+    The transport interface FrameMsg requires of its `ble` connection.
+    `FrameBle` provides it over Bluetooth LE; `SimFrameBle` provides an in-process simulated Frame
+    for testing and benchmarking without hardware.
+    """
+    async def connect(self, name=None, timeout=10, print_response_handler=..., data_response_handler=..., disconnect_handler=...): ...
+    async def disconnect(self): ...
+    def is_connected(self) -> bool: ...
+    def max_lua_payload(self) -> int: ...
+    def max_data_payload(self) -> int: ...
+    async def send_lua(self, string: str, show_me=False, await_print=False): ...
+    async def send_data(self, data: bytes, show_me=False, await_data=False): ...
+    async def send_message(self, msg_code: int, payload: bytes, show_me: bool=False) -> None: ...
+    async def send_reset_signal(self, show_me=False): ...
+    async def send_break_signal(self, show_me=False): ...
+    async def upload_file_from_string(self, content: str, frame_file_path="main.lua"): ...
+    async def upload_file(self, local_file_path: str, frame_file_path="main.lua"): ...
+
 class FrameMsg:
     """
     A high-level library for interacting with Brilliant Labs Frame by passing structured messages
     between a Frameside app and a hostside app.
 
     """
-    def __init__(self):
-        """Initialize the FrameMsg class with a new FrameBle instance and a dictionary for registered data response handlers."""
-        self.ble = FrameBle()
+    def __init__(self, ble: Optional[FrameTransport] = None, windowed: bool = False,
+                 window_size: Optional[int] = None, max_window_size: int = 32, max_queue_size: int = 0,
+                 compress: bool = False, compress_threshold: int = 128):
+        """
+        Initialize the FrameMsg class with a transport and a dictionary for registered data response handlers.
+
+        Args:
+            ble: The transport used to communicate with Frame. Defaults to a new FrameBle instance;
+                 pass a `SimFrameBle` to run against a simulated Frame.
+            windowed: If True, `send_message()` keeps a window of packets in flight and relies on the
+                 cumulative, sequence-numbered ACKs of the extended framing in data.lua, rather than
+                 waiting for an ACK after every packet. Requires the data.lua from this version of the package.
+            window_size: The number of unacknowledged packets allowed in flight when `windowed` is set.
+                 If None (default), the window adapts to the observed round trip time.
+            max_window_size: Upper limit for the adaptive window size
+            max_queue_size: The number of messages `queue_message()` can queue before it waits for room.
+                 0 (default) means unbounded.
+            compress: If True (requires `windowed`), payloads of at least `compress_threshold` bytes are lz4 compressed
+                 when that saves at least one packet, and data.lua inflates them before they are parsed.
+                 Totals per msg_code are kept in `compression_stats`.
+            compress_threshold: The smallest payload worth trying to compress
+        """
+        self.ble = ble if ble is not None else FrameBle()
         self.data_response_handlers = {}
+        # handler (or None) for each msg code, rebuilt from data_response_handlers on register/unregister
+        self._dispatch: List[Optional[Callable[[memoryview], None]]] = [None] * 256
+        # all messages to Frame are sent by the scheduler's writer task
+        self.scheduler = SendScheduler(self.ble, windowed=windowed, window_size=window_size,
+                                       max_window_size=max_window_size, max_queue_size=max_queue_size,
+                                       compress=compress, compress_threshold=compress_threshold)
 
     async def connect(self, initialize:bool=True):
         """
@@ -53,7 +101,8 @@ class FrameMsg:
 
 
     async def disconnect(self):
-        """Disconnect from the Frame device"""
+        """Disconnect from the Frame device, cancelling any messages still queued"""
+        await self.scheduler.close()
         if self.ble.is_connected():
             await self.ble.disconnect()
 
@@ -117,29 +166,78 @@ class FrameMsg:
         """Detach the print response handler so we no longer see stdout from Frame Lua print() statements"""
         self.ble._user_print_response_handler = None
 
-    async def send_message(self, msg_code: int, payload: bytes, show_me: bool=False) -> None:
+    async def send_message(self, msg_code: int, payload: bytes, show_me: bool=False, priority: int=0,
+                           coalesce: bool=False, deadline: Optional[float]=None) -> bool:
         """
         Sends a structured message from hostside to the Frameside app, identified by the specified msg_code.
         For example, if the frame_app is expecting a TxCaptureSettings message on msg_code 0x0d
         to initiate a photo capture, you might send:
         `frame.send_message(0x0d, TxCaptureSettings(resolution=720).pack())`
-        Wraps the frame_ble function of the same name
+        Messages are sent one at a time in order of `priority` (higher first) using the frame_ble function
+        of the same name, unless `windowed` sending is enabled. Without windowed sending, payloads are limited to
+        65279 (0xFEFF) bytes, since a packet starting 0xFF after the msg_code marks the extended framing. Windowed sends allow larger messages,
+        as long as Frame has the memory to receive them.
+
+        Args:
+            msg_code: The message code the Frameside app expects the message on
+            payload: The message payload, e.g. from a Tx class's `pack()`
+            show_me: Print the packets as they are sent
+            priority: Higher priority messages are sent first, and with windowed sending,
+                overtake a lower priority transfer already in progress
+            coalesce: If True, replaces any queued message with the same msg_code that hasn't started sending yet
+                (and was also sent with `coalesce=True`), e.g. so only the latest settings or display update is sent
+            deadline: Seconds from now after which the message is dropped if it hasn't started sending
+
+        Returns:
+            True once the message is sent, or False if it was superseded or its deadline passed
+        """
+        return await self.scheduler.send_message(msg_code, payload, priority, coalesce, deadline, show_me)
+
+    async def queue_message(self, msg_code: int, payload: bytes, show_me: bool=False, priority: int=0,
+                            coalesce: bool=False, deadline: Optional[float]=None) -> asyncio.Future:
         """
-        await self.ble.send_message(msg_code, payload, show_me)
+        Queues a message to be sent without waiting for it to be sent, only for room in the queue
+        if `max_queue_size` is reached. Takes the same arguments as `send_message()`.
 
-    def register_data_response_handler(self, subscriber, msg_codes: List[int], handler: Callable[[bytes], None]):
+        Returns:
+            A future that resolves to True once the message is sent, or False if it was superseded or its
+            deadline passed. Cancel the future to cancel the message.
+        """
+        return await self.scheduler.queue_message(msg_code, payload, priority, coalesce, deadline, show_me)
+
+    async def drain(self):
+        """Wait until all queued messages have been sent (or dropped)"""
+        await self.scheduler.drain()
+
+    def current_window_size(self) -> int:
+        """The number of packets per message a windowed send keeps in flight, see `SendScheduler.current_window_size()`"""
+        return self.scheduler.current_window_size()
+
+    @property
+    def retransmitted_packets(self) -> int:
+        """The number of packets windowed sends have resent after a NACK or a retransmit timeout"""
+        return self.scheduler.retransmitted_packets
+
+    @property
+    def compression_stats(self) -> Dict[int, CompressionStats]:
+        """Compression totals by msg_code for the messages sent so far, if `compress` is enabled"""
+        return self.scheduler.compression_stats
+
+    def register_data_response_handler(self, subscriber, msg_codes: List[int], handler: Callable[[memoryview], None]):
         """
         Register a handler for a subscriber that is interested in specific msg codes.
 
         Args:
             subscriber: The subscriber object.
             msg_codes (List[int]): List of single byte msg codes the subscriber is interested in.
-            handler: The handler function to receive the data.
+            handler: The handler function to receive the data. It is passed a memoryview of the notification
+                (msg code first) that is only valid during the call, so it must copy any bytes it keeps.
         """
         for code in msg_codes:
             if code not in self.data_response_handlers:
                 self.data_response_handlers[code] = []
             self.data_response_handlers[code].append((subscriber, handler))
+            self._compile_dispatch(code)
 
     def unregister_data_response_handler(self, subscriber):
         """
@@ -148,26 +246,53 @@ class FrameMsg:
         Args:
             subscriber: The subscriber object to unregister.
         """
-        for code in list(self.data_response_handlers.keys()):
-            self.data_response_handlers[code] = [
-                (sub, handler) for sub, handler in self.data_response_handlers[code] if sub != subscriber
-            ]
-            if not self.data_response_handlers[code]:
+        for code, handlers in list(self.data_response_handlers.items()):
+            if not any(sub == subscriber for sub, _ in handlers):
+                continue
+            remaining = [(sub, handler) for sub, handler in handlers if sub != subscriber]
+            if remaining:
+                self.data_response_handlers[code] = remaining
+            else:
                 del self.data_response_handlers[code]
+            self._compile_dispatch(code)
+
+    def _compile_dispatch(self, code: int):
+        """
+        Rebuild the dispatch table entry for a msg code after its handlers change, so that
+        `_handle_data_response()` does a single list index and call per notification.
+        A single handler is called directly, multiple handlers through a closure over a tuple.
+        """
+        handlers = tuple(handler for _, handler in self.data_response_handlers.get(code, ()))
+        if not handlers:
+            self._dispatch[code] = None
+        elif len(handlers) == 1:
+            self._dispatch[code] = handlers[0]
+        else:
+            def dispatch_all(data, handlers=handlers):
+                for handler in handlers:
+                    handler(data)
+            self._dispatch[code] = dispatch_all
 
-    async def _handle_data_response(self, data: bytes):
+    async def _handle_data_response(self, data: memoryview):
         """
         Internal method to handle incoming data responses and dispatch to the appropriate handlers.
 
         Args:
-            data (bytes): The incoming data response.
+            data (memoryview): The incoming data response, passed on to the handlers without copying.
         """
         if data:
             msg_code = data[0]
-            if msg_code in self.data_response_handlers:
-                for subscriber, handler in self.data_response_handlers[msg_code]:
-                    # not awaited, synchronous call
-                    handler(data)
+            if msg_code <= 0x01:
+                # ACKs and NACKs of windowed sends are handled by the scheduler; anything else on 0x00 and 0x01
+                # (legacy single-byte ACKs and errors, or an app's own data) is dispatched as usual
+                if msg_code == 0x00 and self.scheduler.handle_ack(data):
+                    return
+                if msg_code == 0x01 and self.scheduler.handle_nack(data):
+                    return
+            handler = self._dispatch[msg_code]
+            if handler is not None:
+                # not awaited, synchronous call
+                handler(data)
 
     def __getattr__(self, name):
         """
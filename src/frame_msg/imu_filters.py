@@ -0,0 +1,231 @@
+import math
+from typing import Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+class SensorBuffer:
+    """
+    Moving average of the last `max_size` 3-axis samples, kept in a fixed-size numpy ring buffer
+    with a running sum so that adding a sample and reading the average are O(1).
+    """
+    def __init__(self, max_size: int):
+        if max_size < 1:
+            raise ValueError(f"max_size must be at least 1, got {max_size}")
+        self.max_size = max_size
+        self._buffer = np.zeros((max_size, 3), dtype=np.int64)
+        self._count = 0
+        self._index = 0
+        self._sum = [0, 0, 0]
+
+    def add(self, value: Tuple[int, int, int]) -> None:
+        if self._count == self.max_size:
+            old_x, old_y, old_z = self._buffer[self._index].tolist()
+            self._sum[0] -= old_x
+            self._sum[1] -= old_y
+            self._sum[2] -= old_z
+        else:
+            self._count += 1
+        self._buffer[self._index] = value
+        self._index = (self._index + 1) % self.max_size
+        self._sum[0] += value[0]
+        self._sum[1] += value[1]
+        self._sum[2] += value[2]
+
+    @property
+    def average(self) -> Tuple[int, int, int]:
+        if not self._count:
+            return (0, 0, 0)
+
+        length = self._count
+        return (
+            self._sum[0] // length,
+            self._sum[1] // length,
+            self._sum[2] // length
+        )
+
+    def update(self, value: Tuple[int, int, int]) -> Tuple[int, int, int]:
+        """Add a sample and return the new average"""
+        self.add(value)
+        return self.average
+
+    def update_batch(self, values: np.ndarray) -> np.ndarray:
+        """
+        Add an (N, 3) array of samples and return the (N, 3) array of averages after each one,
+        the same values `update()` would return for each sample in turn.
+        """
+        values = np.asarray(values, dtype=np.int64).reshape(-1, 3)
+        history = _ring_contents(self._buffer, self._count, self._index)
+        combined = np.concatenate((history, values))
+
+        # windowed sums from the cumulative sum, for the windows ending at each new sample
+        cumsum = np.zeros((len(combined) + 1, 3), dtype=np.int64)
+        np.cumsum(combined, axis=0, out=cumsum[1:])
+        ends = np.arange(len(history) + 1, len(combined) + 1)
+        starts = np.maximum(ends - self.max_size, 0)
+        averages = (cumsum[ends] - cumsum[starts]) // (ends - starts)[:, None]
+
+        self._count, self._index = _ring_refill(self._buffer, combined)
+        self._sum = combined[-self._count:].sum(axis=0).tolist() if self._count else [0, 0, 0]
+        return averages
+
+class MedianFilter:
+    """Moving median of the last `window` 3-axis samples, which rejects spikes that a moving average would smear"""
+    def __init__(self, window: int):
+        if window < 1:
+            raise ValueError(f"window must be at least 1, got {window}")
+        self.window = window
+        self._buffer = np.zeros((window, 3), dtype=np.int64)
+        self._count = 0
+        self._index = 0
+
+    def update(self, value: Tuple[int, int, int]) -> Tuple[int, int, int]:
+        """Add a sample and return the median of each axis over the window, rounded down"""
+        self._buffer[self._index] = value
+        self._index = (self._index + 1) % self.window
+        self._count = min(self._count + 1, self.window)
+        median = np.floor(np.median(self._buffer[:self._count], axis=0))
+        return tuple(int(v) for v in median)
+
+    def update_batch(self, values: np.ndarray) -> np.ndarray:
+        """Add an (N, 3) array of samples and return the (N, 3) array of medians after each one"""
+        values = np.asarray(values, dtype=np.int64).reshape(-1, 3)
+        history = _ring_contents(self._buffer, self._count, self._index)
+        combined = np.concatenate((history, values))
+        medians = np.empty((len(values), 3))
+
+        # the first few windows may not be full yet
+        first_full = min(max(0, self.window - 1 - len(history)), len(values))
+        for k in range(first_full):
+            medians[k] = np.median(combined[:len(history) + k + 1], axis=0)
+
+        if first_full < len(values):
+            # windows[i] holds the samples combined[i:i + window] as shape (3, window)
+            windows = sliding_window_view(combined, self.window, axis=0)
+            medians[first_full:] = np.median(windows[len(history) + first_full - self.window + 1:], axis=-1)
+
+        self._count, self._index = _ring_refill(self._buffer, combined)
+        return np.floor(medians).astype(np.int64)
+
+class EMAFilter:
+    """
+    Exponential moving average of 3-axis samples: each output moves `alpha` of the way
+    from the previous output towards the new sample, so recent samples are weighted most
+    and no window of samples needs to be kept.
+    """
+    def __init__(self, alpha: float):
+        if not 0 < alpha <= 1:
+            raise ValueError(f"alpha must be greater than 0 and at most 1, got {alpha}")
+        self.alpha = alpha
+        self._value: Optional[np.ndarray] = None
+
+    def update(self, value: Tuple[int, int, int]) -> Tuple[float, float, float]:
+        """Add a sample and return the new average"""
+        if self._value is None:
+            self._value = np.array(value, dtype=np.float64)
+        else:
+            self._value += self.alpha * (np.asarray(value) - self._value)
+        return tuple(self._value.tolist())
+
+    def update_batch(self, values: np.ndarray) -> np.ndarray:
+        """Add an (N, 3) array of samples and return the (N, 3) array of averages after each one"""
+        values = np.asarray(values, dtype=np.float64).reshape(-1, 3)
+        if not len(values):
+            return values
+        averages = _ema(values, self.alpha, self._value)
+        self._value = averages[-1].copy()
+        return averages
+
+class ComplementaryFilter:
+    """
+    Fuses accelerometer and compass samples into a smoothed orientation: pitch and roll from the direction of
+    gravity, and a tilt-compensated compass heading. Each estimate keeps `alpha` of its previous value and takes
+    the rest from the new measurement, so a high `alpha` trusts the running estimate over noisy samples.
+    Angles are in degrees: heading 0-360, pitch and roll -180 to 180 (the same definitions as `IMUData.pitch` and `IMUData.roll`).
+    """
+    def __init__(self, alpha: float = 0.98):
+        if not 0 <= alpha < 1:
+            raise ValueError(f"alpha must be at least 0 and less than 1, got {alpha}")
+        self.alpha = alpha
+        # the last measurement and estimate, unwrapped so that they change smoothly through +/-180 degrees
+        self._measured: Optional[np.ndarray] = None
+        self._estimate: Optional[np.ndarray] = None
+
+    @staticmethod
+    def orientation(compass: np.ndarray, accel: np.ndarray) -> np.ndarray:
+        """
+        The unfiltered (heading, pitch, roll) in degrees for each pair of (N, 3) compass and accelerometer samples.
+        The heading is tilt compensated by rotating the compass reading back to level using the direction of gravity.
+        """
+        mx, my, mz = np.asarray(compass, dtype=np.float64).reshape(-1, 3).T
+        ax, ay, az = np.asarray(accel, dtype=np.float64).reshape(-1, 3).T
+
+        pitch = np.arctan2(ay, az)
+        roll = np.arctan2(ax, az)
+
+        # rotation angles about the x and y axes that level the device
+        sin_x, cos_x = np.sin(pitch), np.cos(pitch)
+        tilt_y = np.arctan2(-ax, ay * sin_x + az * cos_x)
+        sin_y, cos_y = np.sin(tilt_y), np.cos(tilt_y)
+        heading = np.arctan2(mz * sin_x - my * cos_x,
+                             mx * cos_y + my * sin_y * sin_x + mz * sin_y * cos_x)
+
+        return np.degrees(np.stack((heading, pitch, roll), axis=-1))
+
+    def update(self, compass: Tuple[int, int, int], accel: Tuple[int, int, int]) -> Tuple[float, float, float]:
+        """Add a compass and accelerometer sample and return the new (heading, pitch, roll)"""
+        return tuple(self.update_batch(np.asarray([compass]), np.asarray([accel]))[0].tolist())
+
+    def update_batch(self, compass: np.ndarray, accel: np.ndarray) -> np.ndarray:
+        """Add (N, 3) arrays of compass and accelerometer samples and return the (N, 3) array of (heading, pitch, roll) after each one"""
+        measured = self.orientation(compass, accel)
+        if not len(measured):
+            return measured
+
+        # unwrap the measurements so that the average of, say, 179 and -179 degrees is 180 rather than 0
+        if self._measured is not None:
+            measured = np.concatenate((self._measured[None, :], measured))
+        measured = np.unwrap(measured, period=360, axis=0)
+        if self._measured is not None:
+            measured = measured[1:]
+
+        estimates = _ema(measured, 1 - self.alpha, self._estimate)
+        self._measured = measured[-1].copy()
+        self._estimate = estimates[-1].copy()
+
+        estimates[:, 0] %= 360
+        estimates[:, 1:] = (estimates[:, 1:] + 180) % 360 - 180
+        return estimates
+
+def _ema(values: np.ndarray, alpha: float, initial: Optional[np.ndarray]) -> np.ndarray:
+    """
+    Exponential moving average along the first axis, y[k] = y[k-1] + alpha * (x[k] - y[k-1]), starting from `initial`
+    (or the first value), computed without a Python loop per sample as
+    y[k] = d^(k+1) * (y[-1] + alpha * sum(x[j] / d^(j+1) for j <= k)) with d = 1 - alpha.
+    The values are processed in blocks short enough that 1 / d^(j+1) stays small and precise.
+    """
+    decay = 1 - alpha
+    if decay == 0:
+        return values.copy()
+
+    averages = np.empty_like(values)
+    previous = values[0] if initial is None else initial
+    block = max(1, int(-6 * math.log(10) / math.log(decay)))
+    for start in range(0, len(values), block):
+        chunk = values[start:start + block]
+        powers = decay ** np.arange(1, len(chunk) + 1)[:, None]
+        averages[start:start + len(chunk)] = powers * (previous + alpha * np.cumsum(chunk / powers, axis=0))
+        previous = averages[start + len(chunk) - 1]
+    return averages
+
+def _ring_contents(buffer: np.ndarray, count: int, index: int) -> np.ndarray:
+    """The samples in a ring buffer, oldest first"""
+    if count < len(buffer):
+        return buffer[:count]
+    return np.roll(buffer, -index, axis=0)
+
+def _ring_refill(buffer: np.ndarray, samples: np.ndarray) -> Tuple[int, int]:
+    """Refill a ring buffer with the most recent samples, returning the new count and next index"""
+    tail = samples[-len(buffer):]
+    buffer[:len(tail)] = tail
+    return len(tail), len(tail) % len(buffer)
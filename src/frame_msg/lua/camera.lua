@@ -100,6 +100,8 @@ function _M.parse_capture_settings(data)
 	local pan_shifted = string.byte(data, 4) << 8 | string.byte(data, 5)
 	settings.pan = pan_shifted - 140
 	settings.raw = string.byte(data, 6) > 0
+	-- optional: the number of photos to capture with start_burst(), 0 for continuous capture until stop_burst()
+	settings.burst_count = string.byte(data, 7)
 
 	return settings
 end
@@ -197,4 +199,109 @@ function _M.capture_and_send(args)
 	end
 end
 
+-- state of a burst/continuous capture started with start_burst()
+local burst = nil
+
+-- starts the next capture of a burst, tagged with the next frame id
+local function start_burst_capture()
+	burst.capture_id = (burst.capture_id + 1) % 256
+	burst.capture_start = frame.time.utc()
+	burst.capturing = true
+	if not burst.continuous then
+		burst.remaining = burst.remaining - 1
+	end
+	frame.camera.capture { resolution=burst.settings.resolution, quality=burst.settings.quality, pan=burst.settings.pan }
+end
+
+-- Starts capturing `count` photos (or continuously, if count is 0 or nil) with the given capture_settings table.
+-- Call run_burst() from the app's main loop to make progress.
+-- Unlike capture_and_send(), each image is read out of the camera into memory as soon as it is ready
+-- so that the next capture runs while the previous image is being sent, so there must be enough free memory
+-- for one image at the requested resolution and quality.
+-- Each image is sent as IMAGE_MSG chunks tagged with a frame id: [IMAGE_MSG, frame_id, data],
+-- then [IMAGE_FINAL_MSG, frame_id, capture time in ms (Uint16)], for RxPhoto(tagged=True)
+function _M.start_burst(args, count)
+	burst = {
+		settings = args,
+		continuous = count == nil or count == 0,
+		remaining = count or 0,
+		capture_id = 255,
+		capturing = false,
+		chunks = nil,
+	}
+	start_burst_capture()
+end
+
+-- Stops a burst after the capture in progress (if any) has been sent
+function _M.stop_burst()
+	if burst ~= nil then
+		burst.continuous = false
+		burst.remaining = 0
+	end
+end
+
+-- Makes progress on a burst started with start_burst(): reads out a completed capture and starts the next one,
+-- then sends up to `max_packets` (default 20) packets of the buffered image so the main loop stays responsive.
+-- Returns true while the burst is still in progress
+function _M.run_burst(max_packets)
+	if burst == nil then
+		return false
+	end
+
+	-- once the previous image has been sent, read out the next one as soon as it's ready and start the capture after it
+	if burst.chunks == nil and burst.capturing and frame.camera.image_ready() then
+		local chunks = {}
+		local chunk_size = frame.bluetooth.max_length() - 2
+		local data = ''
+
+		while true do
+			-- skip the 623 byte header if the caller requested raw data
+			if (burst.settings.raw) then
+				data = frame.camera.read_raw(chunk_size)
+			else
+				data = frame.camera.read(chunk_size)
+			end
+
+			if (data == nil) then
+				break
+			end
+			chunks[#chunks + 1] = data
+		end
+
+		burst.chunks = chunks
+		burst.num_chunks = #chunks
+		burst.next_chunk = 1
+		burst.send_id = burst.capture_id
+		burst.capture_ms = math.min(math.floor((frame.time.utc() - burst.capture_start) * 1000), 0xFFFF)
+		burst.capturing = false
+
+		if burst.continuous or burst.remaining > 0 then
+			start_burst_capture()
+		end
+	end
+
+	if burst.chunks ~= nil then
+		local last = math.min(burst.next_chunk + (max_packets or 20) - 1, burst.num_chunks)
+		for i = burst.next_chunk, last do
+			send_data(string.char(IMAGE_MSG, burst.send_id) .. burst.chunks[i])
+			-- release each chunk once it's sent
+			burst.chunks[i] = nil
+		end
+		burst.next_chunk = last + 1
+
+		if burst.next_chunk > burst.num_chunks then
+			send_data(string.char(IMAGE_FINAL_MSG, burst.send_id, burst.capture_ms >> 8, burst.capture_ms & 0xFF))
+			burst.chunks = nil
+			collectgarbage('collect')
+		end
+	end
+
+	if burst.chunks == nil and not burst.capturing then
+		burst = nil
+		return false
+	end
+
+	return true
+end
+
 return _M
\ No newline at end of file
@@ -1 +1 @@
-local a={}local b=0x07;local c=0x08;local d=0x11;local e=0x12;local f={'VERY_LOW','LOW','MEDIUM','HIGH','VERY_HIGH'}local g={'SPOT','CENTER_WEIGHTED','AVERAGE'}local h={metering='CENTER_WEIGHTED',exposure=0.1,exposure_speed=0.45,shutter_limit=16383,analog_gain_limit=16.0,white_balance_speed=0.5,rgb_gain_limit=287}local i={shutter=4096,analog_gain=1,red_gain=121,green_gain=64,blue_gain=140}a.is_auto_exp=true;function update_if_present(j,k)for l,m in pairs(k)do if m~=nil then j[l]=m end end end;function a.set_auto_exp_settings(n)update_if_present(h,n)a.is_auto_exp=true end;function a.set_manual_exp_settings(n)a.is_auto_exp=false;update_if_present(i,n)frame.camera.set_shutter(i.shutter)frame.camera.set_gain(i.analog_gain)frame.camera.set_white_balance(i.red_gain,i.green_gain,i.blue_gain)end;function a.parse_auto_exp_settings(o)local j={}j.metering=g[string.byte(o,1)+1]j.exposure=string.byte(o,2)/255.0;j.exposure_speed=string.byte(o,3)/255.0;j.shutter_limit=string.byte(o,4)<<8|(string.byte(o,5)&0x3FFF)j.analog_gain_limit=string.byte(o,6)&0xFF;j.white_balance_speed=string.byte(o,7)/255.0;j.rgb_gain_limit=string.byte(o,8)<<8|(string.byte(o,9)&0x3FF)return j end;function a.parse_manual_exp_settings(o)local j={}j.shutter=string.byte(o,1)<<8|(string.byte(o,2)&0x3FFF)j.analog_gain=string.byte(o,3)&0xFF;j.red_gain=string.byte(o,4)<<8|(string.byte(o,5)&0x3FF)j.green_gain=string.byte(o,6)<<8|(string.byte(o,7)&0x3FF)j.blue_gain=string.byte(o,8)<<8|(string.byte(o,9)&0x3FF)return j end;function a.parse_capture_settings(o)local j={}j.quality=f[string.byte(o,1)+1]local p=string.byte(o,2)<<8|string.byte(o,3)j.resolution=p*2;local q=string.byte(o,4)<<8|string.byte(o,5)j.pan=q-140;j.raw=string.byte(o,6)>0;return j end;function send_data(o)local r=false;local s=frame.time.utc()+2;while frame.time.utc()<s do if pcall(frame.bluetooth.send,o)then r=true;break end end;if not r then error('Error sending photo data')end end;function a.run_auto_exposure()return frame.camera.auto(h)end;function a.send_autoexp_result(t)local o=string.pack("<Bffffffffffffffff",d,t['error'],t['shutter'],t['analog_gain'],t['red_gain'],t['green_gain'],t['blue_gain'],t['brightness']['center_weighted_average'],t['brightness']['scene'],t['brightness']['matrix']['r'],t['brightness']['matrix']['g'],t['brightness']['matrix']['b'],t['brightness']['matrix']['average'],t['brightness']['spot']['r'],t['brightness']['spot']['g'],t['brightness']['spot']['b'],t['brightness']['spot']['average'])send_data(o)end;function a.send_metering_data()send_data(string.char(e)..frame.fpga_read(0x25,6))end;function a.capture_and_send(n)frame.camera.capture{resolution=n.resolution,quality=n.quality,pan=n.pan}while not frame.camera.image_ready()do frame.sleep(0.005)end;local o=''local u=n.raw;while true do if u then o=frame.camera.read_raw(frame.bluetooth.max_length()-1)else o=frame.camera.read(frame.bluetooth.max_length()-1)end;if o~=nil then send_data(string.char(b)..o)else send_data(string.char(c))break end end end;return a
\ No newline at end of file
+local _M={}local IMAGE_MSG=0x07 local IMAGE_FINAL_MSG=0x08 local AUTOEXP_DATA_MSG=0x11 local METERING_DATA_MSG=0x12 local quality_values={'VERY_LOW','LOW','MEDIUM','HIGH','VERY_HIGH'}local metering_values={'SPOT','CENTER_WEIGHTED','AVERAGE'}local auto_exp_settings={metering='CENTER_WEIGHTED',exposure=0.1,exposure_speed=0.45,shutter_limit=16383,analog_gain_limit=16.0,white_balance_speed=0.5,rgb_gain_limit=287}local manual_exp_settings={shutter=4096,analog_gain=1,red_gain=121,green_gain=64,blue_gain=140}_M.is_auto_exp=true function update_if_present(settings,updates)for k,v in pairs(updates)do if v~=nil then settings[k]=v end end end function _M.set_auto_exp_settings(args)update_if_present(auto_exp_settings,args)_M.is_auto_exp=true end function _M.set_manual_exp_settings(args)_M.is_auto_exp=false update_if_present(manual_exp_settings,args)frame.camera.set_shutter(manual_exp_settings.shutter)frame.camera.set_gain(manual_exp_settings.analog_gain)frame.camera.set_white_balance(manual_exp_settings.red_gain,manual_exp_settings.green_gain,manual_exp_settings.blue_gain)end function _M.parse_auto_exp_settings(data)local settings={}settings.metering=metering_values[string.byte(data,1)+1]settings.exposure=string.byte(data,2)/255.0 settings.exposure_speed=string.byte(data,3)/255.0 settings.shutter_limit=string.byte(data,4)<<8|string.byte(data,5)&0x3FFF settings.analog_gain_limit=string.byte(data,6)&0xFF settings.white_balance_speed=string.byte(data,7)/255.0 settings.rgb_gain_limit=string.byte(data,8)<<8|string.byte(data,9)&0x3FF return settings end function _M.parse_manual_exp_settings(data)local settings={}settings.shutter=string.byte(data,1)<<8|string.byte(data,2)&0x3FFF settings.analog_gain=string.byte(data,3)&0xFF settings.red_gain=string.byte(data,4)<<8|string.byte(data,5)&0x3FF settings.green_gain=string.byte(data,6)<<8|string.byte(data,7)&0x3FF settings.blue_gain=string.byte(data,8)<<8|string.byte(data,9)&0x3FF return settings end function _M.parse_capture_settings(data)local settings={}settings.quality=quality_values[string.byte(data,1)+1]local half_res=string.byte(data,2)<<8|string.byte(data,3)settings.resolution=half_res*2 local pan_shifted=string.byte(data,4)<<8|string.byte(data,5)settings.pan=pan_shifted-140 settings.raw=string.byte(data,6)>0 settings.burst_count=string.byte(data,7)return settings end function send_data(data)local sent=false local try_until=frame.time.utc()+2 while frame.time.utc()<try_until do if pcall(frame.bluetooth.send,data)then sent=true break end end if not sent then error('Error sending photo data')end end function _M.run_auto_exposure()return frame.camera.auto(auto_exp_settings)end function _M.send_autoexp_result(autoexp)local data=string.pack("<Bffffffffffffffff",AUTOEXP_DATA_MSG,autoexp['error'],autoexp['shutter'],autoexp['analog_gain'],autoexp['red_gain'],autoexp['green_gain'],autoexp['blue_gain'],autoexp['brightness']['center_weighted_average'],autoexp['brightness']['scene'],autoexp['brightness']['matrix']['r'],autoexp['brightness']['matrix']['g'],autoexp['brightness']['matrix']['b'],autoexp['brightness']['matrix']['average'],autoexp['brightness']['spot']['r'],autoexp['brightness']['spot']['g'],autoexp['brightness']['spot']['b'],autoexp['brightness']['spot']['average'])send_data(data)end function _M.send_metering_data()send_data(string.char(METERING_DATA_MSG)..frame.fpga_read(0x25,6))end function _M.capture_and_send(args)frame.camera.capture{resolution=args.resolution,quality=args.quality,pan=args.pan}while not frame.camera.image_ready()do frame.sleep(0.005)end local data=''local raw=args.raw while true do if(raw)then data=frame.camera.read_raw(frame.bluetooth.max_length()-1)else data=frame.camera.read(frame.bluetooth.max_length()-1)end if(data~=nil)then send_data(string.char(IMAGE_MSG)..data)else send_data(string.char(IMAGE_FINAL_MSG))break end end end local burst=nil local function start_burst_capture()burst.capture_id=(burst.capture_id+1)%256 burst.capture_start=frame.time.utc()burst.capturing=true if not burst.continuous then burst.remaining=burst.remaining-1 end frame.camera.capture{resolution=burst.settings.resolution,quality=burst.settings.quality,pan=burst.settings.pan}end function _M.start_burst(args,count)burst={settings=args,continuous=count==nil or count==0,remaining=count or 0,capture_id=255,capturing=false,chunks=nil,}start_burst_capture()end function _M.stop_burst()if burst~=nil then burst.continuous=false burst.remaining=0 end end function _M.run_burst(max_packets)if burst==nil then return false end if burst.chunks==nil and burst.capturing and frame.camera.image_ready()then local chunks={}local chunk_size=frame.bluetooth.max_length()-2 local data=''while true do if(burst.settings.raw)then data=frame.camera.read_raw(chunk_size)else data=frame.camera.read(chunk_size)end if(data==nil)then break end chunks[#chunks+1]=data end burst.chunks=chunks burst.num_chunks=#chunks burst.next_chunk=1 burst.send_id=burst.capture_id burst.capture_ms=math.min(math.floor((frame.time.utc()-burst.capture_start)*1000),0xFFFF)burst.capturing=false if burst.continuous or burst.remaining>0 then start_burst_capture()end end if burst.chunks~=nil then local last=math.min(burst.next_chunk+(max_packets or 20)-1,burst.num_chunks)for i=burst.next_chunk,last do send_data(string.char(IMAGE_MSG,burst.send_id)..burst.chunks[i])burst.chunks[i]=nil end burst.next_chunk=last+1 if burst.next_chunk>burst.num_chunks then send_data(string.char(IMAGE_FINAL_MSG,burst.send_id,burst.capture_ms>>8,burst.capture_ms&0xFF))burst.chunks=nil collectgarbage('collect')end end if burst.chunks==nil and not burst.capturing then burst=nil return false end return true end return _M
\ No newline at end of file
@@ -11,6 +11,11 @@ _M.app_data_accum = app_data_accum
 local app_data_block = {}
 _M.app_data_block = app_data_block
 
+-- for blocks that arrived compressed, the message code mapped to the uncompressed size,
+-- so that the block can be inflated before it is parsed
+local app_data_inflate = {}
+_M.app_data_inflate = app_data_inflate
+
 -- contains typed objects representing full messages
 local app_data = {}
 _M.app_data = app_data
@@ -19,6 +24,135 @@ _M.app_data = app_data
 local parsers = {}
 _M.parsers = parsers
 
+-- send an acknowledgement (or error) back to the host, retrying until it gets through
+local function send_ack(ack)
+	while true do
+		-- If the Bluetooth is busy, this simply tries again until it gets through
+		if (pcall(frame.bluetooth.send, ack)) then
+			break
+		end
+		frame.sleep(0.0025)
+	end
+end
+
+-- Decompress an lz4 frame to its uncompressed size
+-- Note: this registers its own frame.compression.process_function, so an app that also decompresses
+-- (e.g. compressed sprite pixel data) should register its own function before each of its decompress calls
+local function inflate(data, size)
+	local blocks = {}
+	frame.compression.process_function(function(block) blocks[#blocks + 1] = block end)
+	frame.compression.decompress(data, size)
+	return table.concat(blocks)
+end
+
+-- Extended framing, used by the host for windowed (pipelined) sends:
+-- The first packet has 0xFFFF in place of the Uint16 message length, then
+-- flags(Uint8), message id(Uint8, 0-254), message length(Uint16, or Uint32 if flags has bit 0x01 set),
+-- uncompressed length(Uint32, only if flags has bit 0x02 set, meaning the message is lz4 compressed), data
+-- Subsequent packets carry the message id and a packet sequence number (Uint16, first packet is 0):
+-- msg_code(Uint8), 0xFF, message id(Uint8, 0-254), sequence number(Uint16), data
+-- So every extended packet has 0xFF as its second byte, and the first packet is told apart by the 0xFF in its third.
+-- Legacy messages are limited to 65279 (0xFEFF) bytes so that a legacy first packet never starts 0xFF, and
+-- either framing can start whenever no legacy message is in progress, even if the first packet of an extended
+-- message was lost and its later packets arrive first.
+-- Each message id is a separate stream, so messages with the same msg_code can be interleaved
+-- (though as with the legacy framing, a completed message replaces any unprocessed one in app_data_block)
+-- Every packet is answered with a cumulative ACK of the last packet received in order:
+-- 0x00, msg_code(Uint8), message id(Uint8), sequence number(Uint16)
+-- Packets received ahead of a gap are buffered, and the missing packets are requested with a NACK:
+-- 0x01, msg_code(Uint8), message id(Uint8), first missing sequence number(Uint16), last missing sequence number(Uint16)
+-- Duplicate packets (including a resent first packet) are dropped and acknowledged again.
+-- The host allocates message ids in sequence for each msg_code, so starting a message forgets the message
+-- 64 ids behind it (allowing up to 64 messages in flight per msg_code) and its id can be reused.
+-- (A msg_code should not interleave extended packets with the packets of a legacy message in progress,
+-- whose continuation packets have no header to tell them apart)
+local function update_ext_item(msg_flag, item, data)
+	local id, stream
+	if item.streams == nil then
+		item.streams = {}
+		item.done = {}
+	end
+
+	if string.byte(data, 3) == 0xFF then
+
+		id = string.byte(data, 5)
+		stream = item.streams[id]
+		-- a resent first packet of a message in progress or already complete is a duplicate
+		if stream == nil and item.done[id] == nil then
+			local flags = string.byte(data, 4)
+			local header_len = 7
+			local size = string.byte(data, 6) << 8 | string.byte(data, 7)
+			if flags & 0x01 ~= 0 then
+				header_len = 9
+				size = string.byte(data, 6) << 24 | string.byte(data, 7) << 16 | string.byte(data, 8) << 8 | string.byte(data, 9)
+			end
+			local orig_size = nil
+			if flags & 0x02 ~= 0 then
+				orig_size = string.byte(data, header_len + 1) << 24 | string.byte(data, header_len + 2) << 16 | string.byte(data, header_len + 3) << 8 | string.byte(data, header_len + 4)
+				header_len = header_len + 4
+			end
+			stream = { flags = flags, size = size, orig_size = orig_size, chunk_table = { string.sub(data, header_len + 1) }, num_chunks = 1, recv_bytes = string.len(data) - header_len, seq = 0, max_seq = 0, pending = {} }
+			item.streams[id] = stream
+			-- (Lua's % is never negative, so this is the id 64 behind, wrapping around 0-254)
+			item.streams[(id - 64) % 255] = nil
+			item.done[(id - 64) % 255] = nil
+		end
+	else
+		id = string.byte(data, 3)
+		stream = item.streams[id]
+
+		local seq = string.byte(data, 4) << 8 | string.byte(data, 5)
+		if stream ~= nil and seq > stream.seq and stream.pending[seq] == nil then
+			if seq == stream.seq + 1 then
+				stream.num_chunks = stream.num_chunks + 1
+				stream.chunk_table[stream.num_chunks] = string.sub(data, 6)
+				stream.recv_bytes = stream.recv_bytes + string.len(data) - 5
+				stream.seq = seq
+
+				-- append any buffered packets that now follow in order
+				while stream.pending[stream.seq + 1] ~= nil do
+					stream.seq = stream.seq + 1
+					stream.num_chunks = stream.num_chunks + 1
+					stream.chunk_table[stream.num_chunks] = stream.pending[stream.seq]
+					stream.recv_bytes = stream.recv_bytes + string.len(stream.pending[stream.seq])
+					stream.pending[stream.seq] = nil
+				end
+			else
+				-- buffer the packet until the gap is filled, and request packets not seen missing before
+				stream.pending[seq] = string.sub(data, 6)
+				if seq > stream.max_seq + 1 then
+					send_ack(string.char(0x01, msg_flag, id, (stream.max_seq + 1) >> 8, (stream.max_seq + 1) & 0xFF, (seq - 1) >> 8, (seq - 1) & 0xFF))
+				end
+			end
+
+			if seq > stream.max_seq then
+				stream.max_seq = seq
+			end
+		end
+	end
+
+	-- if all bytes are received, concat and move message to block
+	-- but don't parse yet
+	if stream ~= nil and stream.recv_bytes == stream.size then
+		collectgarbage('collect')
+		_M.app_data_block[msg_flag] = table.concat(stream.chunk_table)
+		-- compressed messages are inflated in process_raw_items(), not here in the data handler
+		_M.app_data_inflate[msg_flag] = stream.orig_size
+		item.streams[id] = nil
+		-- remember the last sequence number of the completed message so late duplicates are acknowledged and ignored
+		item.done[id] = stream.seq
+		stream = nil
+		collectgarbage('collect')
+	end
+
+	if stream ~= nil then
+		send_ack(string.char(0x00, msg_flag, id, stream.seq >> 8, stream.seq & 0xFF))
+	elseif item.done[id] ~= nil then
+		send_ack(string.char(0x00, msg_flag, id, item.done[id] >> 8, item.done[id] & 0xFF))
+	end
+	-- otherwise the first packet of this message hasn't arrived yet, and the host will resend it
+end
+
 -- Data Handler: called when data arrives, must execute quickly.
 -- Update the app_data_accum item based on the contents of the current packet
 -- The first byte of the packet indicates the message type, and the item's key
@@ -28,7 +162,7 @@ _M.parsers = parsers
 -- The message codes and message length fields are not included in the accumulated chunks.
 -- When the message is fully received, the full concatenated bytes are saved in the block
 -- table associated to the message type, so no need to pass on the length or message type in the payload
--- TODO add reliability features (packet acknowledgement is present, but dropped packet retransmission requests, message and packet sequence numbers are possible)
+-- The legacy framing has no sequence numbers or retransmission requests, see the extended framing above
 function _M.update_app_data_accum(data)
     rc, err = pcall(
         function()
@@ -39,6 +173,12 @@ function _M.update_app_data_accum(data)
                 _M.app_data_accum[msg_flag] = item
             end
 
+            -- extended framing: any packet starting 0xFF after the msg_code, unless it continues a legacy message
+            if item.num_chunks == 0 and string.byte(data, 2) == 0xFF then
+                update_ext_item(msg_flag, item, data)
+                return
+            end
+
             if item.num_chunks == 0 then
                 -- first chunk of new data contains size (Uint16)
                 item.size = string.byte(data, 2) << 8 | string.byte(data, 3)
@@ -75,26 +215,14 @@ function _M.update_app_data_accum(data)
 
             -- send some data back as an ACK for receiver-paced flow control
             -- and send_message() must use await_data=True
-            while true do
-                -- If the Bluetooth is busy, this simply tries again until it gets through
-                if (pcall(frame.bluetooth.send, '\x00')) then
-                    break
-                end
-                frame.sleep(0.0025)
-            end
+            send_ack('\x00')
 
         end
     )
     if rc == false then
         -- send the error back on the stdout stream otherwise the data handler thread fails silently
         print('Error in data accumulator: ' .. err)
-        while true do
-            -- If the Bluetooth is busy, this simply tries again until it gets through
-            if (pcall(frame.bluetooth.send, '\x01')) then
-                break
-            end
-            frame.sleep(0.0025)
-        end
+        send_ack('\x01')
         -- rethrow the error, especially important to propagate the break signal to stop execution
         error(err)
     end
@@ -116,6 +244,11 @@ function _M.process_raw_items()
                 if _M.parsers[flag] == nil then
                     print('Error: No parser for flag: ' .. tostring(flag))
                 else
+                    if _M.app_data_inflate[flag] ~= nil then
+                        block = inflate(block, _M.app_data_inflate[flag])
+                        _M.app_data_inflate[flag] = nil
+                    end
+
                     -- call the parser and pass in the previous value in
                     -- case it accumulates, like the text_sprite_block can
                     _M.app_data[flag] = _M.parsers[flag](block, _M.app_data[flag])
@@ -1 +1 @@
-local a={}local b={}a.app_data_accum=b;local c={}a.app_data_block=c;local d={}a.app_data=d;local e={}a.parsers=e;function a.update_app_data_accum(f)rc,err=pcall(function()local g=string.byte(f,1)local h=a.app_data_accum[g]if h==nil or next(h)==nil then h={chunk_table={},num_chunks=0,size=0,recv_bytes=0}a.app_data_accum[g]=h end;if h.num_chunks==0 then h.size=string.byte(f,2)<<8|string.byte(f,3)h.chunk_table[1]=string.sub(f,4)h.num_chunks=1;h.recv_bytes=string.len(f)-3;if h.recv_bytes==h.size then a.app_data_block[g]=h.chunk_table[1]h.size=0;h.recv_bytes=0;h.num_chunks=0;h.chunk_table[1]=nil;b[g]=h end else h.chunk_table[h.num_chunks+1]=string.sub(f,2)h.num_chunks=h.num_chunks+1;h.recv_bytes=h.recv_bytes+string.len(f)-1;if h.recv_bytes==h.size then collectgarbage('collect')a.app_data_block[g]=table.concat(h.chunk_table)for i,j in pairs(h.chunk_table)do h.chunk_table[i]=nil end;collectgarbage('collect')h.size=0;h.recv_bytes=0;h.num_chunks=0;a.app_data_accum[g]=h end end;while true do if pcall(frame.bluetooth.send,'\x00')then break end;frame.sleep(0.0025)end end)if rc==false then print('Error in data accumulator: '..err)while true do if pcall(frame.bluetooth.send,'\x01')then break end;frame.sleep(0.0025)end;error(err)end end;frame.bluetooth.receive_callback(a.update_app_data_accum)function a.process_raw_items()local k=0;rc,err=pcall(function()collectgarbage('collect')for l,m in pairs(a.app_data_block)do if a.parsers[l]==nil then print('Error: No parser for flag: '..tostring(l))else a.app_data[l]=a.parsers[l](m,a.app_data[l])a.app_data_block[l]=nil;k=k+1 end end end)if rc==false then print('Error processing raw items: '..err)error(err)end;return k end;return a
\ No newline at end of file
+local _M={}local app_data_accum={}_M.app_data_accum=app_data_accum local app_data_block={}_M.app_data_block=app_data_block local app_data_inflate={}_M.app_data_inflate=app_data_inflate local app_data={}_M.app_data=app_data local parsers={}_M.parsers=parsers local function send_ack(ack)while true do if(pcall(frame.bluetooth.send,ack))then break end frame.sleep(0.0025)end end local function inflate(data,size)local blocks={}frame.compression.process_function(function(block)blocks[#blocks+1]=block end)frame.compression.decompress(data,size)return table.concat(blocks)end local function update_ext_item(msg_flag,item,data)local id,stream if item.streams==nil then item.streams={}item.done={}end if string.byte(data,3)==0xFF then id=string.byte(data,5)stream=item.streams[id]if stream==nil and item.done[id]==nil then local flags=string.byte(data,4)local header_len=7 local size=string.byte(data,6)<<8|string.byte(data,7)if flags&0x01~=0 then header_len=9 size=string.byte(data,6)<<24|string.byte(data,7)<<16|string.byte(data,8)<<8|string.byte(data,9)end local orig_size=nil if flags&0x02~=0 then orig_size=string.byte(data,header_len+1)<<24|string.byte(data,header_len+2)<<16|string.byte(data,header_len+3)<<8|string.byte(data,header_len+4)header_len=header_len+4 end stream={flags=flags,size=size,orig_size=orig_size,chunk_table={string.sub(data,header_len+1)},num_chunks=1,recv_bytes=string.len(data)-header_len,seq=0,max_seq=0,pending={}}item.streams[id]=stream item.streams[(id-64)%255]=nil item.done[(id-64)%255]=nil end else id=string.byte(data,3)stream=item.streams[id]local seq=string.byte(data,4)<<8|string.byte(data,5)if stream~=nil and seq>stream.seq and stream.pending[seq]==nil then if seq==stream.seq+1 then stream.num_chunks=stream.num_chunks+1 stream.chunk_table[stream.num_chunks]=string.sub(data,6)stream.recv_bytes=stream.recv_bytes+string.len(data)-5 stream.seq=seq while stream.pending[stream.seq+1]~=nil do stream.seq=stream.seq+1 stream.num_chunks=stream.num_chunks+1 stream.chunk_table[stream.num_chunks]=stream.pending[stream.seq]stream.recv_bytes=stream.recv_bytes+string.len(stream.pending[stream.seq])stream.pending[stream.seq]=nil end else stream.pending[seq]=string.sub(data,6)if seq>stream.max_seq+1 then send_ack(string.char(0x01,msg_flag,id,(stream.max_seq+1)>>8,(stream.max_seq+1)&0xFF,(seq-1)>>8,(seq-1)&0xFF))end end if seq>stream.max_seq then stream.max_seq=seq end end end if stream~=nil and stream.recv_bytes==stream.size then collectgarbage('collect')_M.app_data_block[msg_flag]=table.concat(stream.chunk_table)_M.app_data_inflate[msg_flag]=stream.orig_size item.streams[id]=nil item.done[id]=stream.seq stream=nil collectgarbage('collect')end if stream~=nil then send_ack(string.char(0x00,msg_flag,id,stream.seq>>8,stream.seq&0xFF))elseif item.done[id]~=nil then send_ack(string.char(0x00,msg_flag,id,item.done[id]>>8,item.done[id]&0xFF))end end function _M.update_app_data_accum(data)rc,err=pcall(function()local msg_flag=string.byte(data,1)local item=_M.app_data_accum[msg_flag]if item==nil or next(item)==nil then item={chunk_table={},num_chunks=0,size=0,recv_bytes=0}_M.app_data_accum[msg_flag]=item end if item.num_chunks==0 and string.byte(data,2)==0xFF then update_ext_item(msg_flag,item,data)return end if item.num_chunks==0 then item.size=string.byte(data,2)<<8|string.byte(data,3)item.chunk_table[1]=string.sub(data,4)item.num_chunks=1 item.recv_bytes=string.len(data)-3 if item.recv_bytes==item.size then _M.app_data_block[msg_flag]=item.chunk_table[1]item.size=0 item.recv_bytes=0 item.num_chunks=0 item.chunk_table[1]=nil app_data_accum[msg_flag]=item end else item.chunk_table[item.num_chunks+1]=string.sub(data,2)item.num_chunks=item.num_chunks+1 item.recv_bytes=item.recv_bytes+string.len(data)-1 if item.recv_bytes==item.size then collectgarbage('collect')_M.app_data_block[msg_flag]=table.concat(item.chunk_table)for k,v in pairs(item.chunk_table)do item.chunk_table[k]=nil end collectgarbage('collect')item.size=0 item.recv_bytes=0 item.num_chunks=0 _M.app_data_accum[msg_flag]=item end end send_ack('\x00')end)if rc==false then print('Error in data accumulator: '..err)send_ack('\x01')error(err)end end frame.bluetooth.receive_callback(_M.update_app_data_accum)function _M.process_raw_items()local processed=0 rc,err=pcall(function()collectgarbage('collect')for flag,block in pairs(_M.app_data_block)do if _M.parsers[flag]==nil then print('Error: No parser for flag: '..tostring(flag))else if _M.app_data_inflate[flag]~=nil then block=inflate(block,_M.app_data_inflate[flag])_M.app_data_inflate[flag]=nil end _M.app_data[flag]=_M.parsers[flag](block,_M.app_data[flag])_M.app_data_block[flag]=nil processed=processed+1 end end end)if rc==false then print('Error processing raw items: '..err)error(err)end return processed end return _M
\ No newline at end of file
@@ -1,8 +1,31 @@
 -- Module to parse Sprites sent from phoneside app as TxImageSpriteBlock messages
 local _M = {}
 
+-- Parse a TxSprite strip starting at the beginning of data
+local function parse_strip_sprite(data)
+	local sprite = {}
+	sprite.width = string.byte(data, 1) << 8 | string.byte(data, 2)
+	sprite.height = string.byte(data, 3) << 8 | string.byte(data, 4)
+	sprite.compressed = string.byte(data, 5) > 0
+	sprite.bpp = string.byte(data, 6)
+	sprite.num_colors = string.byte(data, 7)
+	sprite.palette_data = string.sub(data, 8, 8 + sprite.num_colors * 3 - 1)
+	sprite.pixel_data = string.sub(data, 8 + sprite.num_colors * 3)
+	return sprite
+end
+
+-- Extend the active (renderable) sprites over any strips that now follow them contiguously,
+-- since strips can arrive out of order, or after a strip of the block was lost
+local function advance_active_sprites(block)
+	while block.active_sprites < block.total_sprites and block.sprites[block.active_sprites + 1] ~= nil do
+		block.active_sprites = block.active_sprites + 1
+	end
+end
+
 -- Parse the image sprite block message raw data. Unpack the header fields.
 -- width(Uint16), height(Uint16), sprite_line_height(Uint16), progressive_render(bool as Uint8), updatable(bool as Uint8)
+-- A TxImageSpriteStrip message replaces a single strip in the current (updatable) block:
+-- 0xFE, index(Uint16), TxSprite
 function _M.parse_image_sprite_block(data, prev)
 	if string.byte(data, 1) == 0xFF then
 		-- new block starting, zero out the old block to get memory back
@@ -26,6 +49,25 @@ function _M.parse_image_sprite_block(data, prev)
 		image_sprite_block.active_sprites = 0
 		image_sprite_block.current_sprite_index = 0
 		return image_sprite_block
+	elseif string.byte(data, 1) == 0xFE then
+		-- no existing updatable ImageSpriteBlock to update, drop this strip
+		if prev == nil then
+			return nil
+		end
+		if not prev.updatable then
+			return prev
+		end
+
+		local index = string.byte(data, 2) << 8 | string.byte(data, 3)
+		if index < 1 or index > prev.total_sprites then
+			return prev
+		end
+
+		-- place this strip at its index, leaving the position for any plain sprites that follow unchanged
+		prev.sprites[index] = parse_strip_sprite(string.sub(data, 4))
+		advance_active_sprites(prev)
+
+		return prev
 	-- Otherwise this is a TxSprite, so parse it
 	else
 		-- no existing ImageSpriteBlock to accumulate into, drop this sprite
@@ -45,23 +87,11 @@ function _M.parse_image_sprite_block(data, prev)
 			end
 		end
 
-		-- we just accumulate up to total_sprites then stop
-		if prev.active_sprites < prev.total_sprites then
-			prev.active_sprites = prev.active_sprites + 1
-		end
-
-		-- new text sprite line
-		local sprite = {}
-		sprite.width = string.byte(data, 1) << 8 | string.byte(data, 2)
-		sprite.height = string.byte(data, 3) << 8 | string.byte(data, 4)
-		sprite.compressed = string.byte(data, 5) > 0
-		sprite.bpp = string.byte(data, 6)
-		sprite.num_colors = string.byte(data, 7)
-		sprite.palette_data = string.sub(data, 8, 8 + sprite.num_colors * 3 - 1)
-		sprite.pixel_data = string.sub(data, 8 + sprite.num_colors * 3)
-
 		-- add this sprite to the current slot
-		prev.sprites[prev.current_sprite_index] = sprite
+		prev.sprites[prev.current_sprite_index] = parse_strip_sprite(data)
+
+		-- we just accumulate up to total_sprites then stop
+		advance_active_sprites(prev)
 
 		return prev
 	end
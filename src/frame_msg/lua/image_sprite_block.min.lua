@@ -1 +1 @@
-local a={}function a.parse_image_sprite_block(b,c)if string.byte(b,1)==0xFF then if c~=nil then for d,e in pairs(c.sprites)do c.sprites[d]=nil end;c=nil;collectgarbage('collect')end;local f={}f.width=string.byte(b,2)<<8|string.byte(b,3)f.height=string.byte(b,4)<<8|string.byte(b,5)f.sprite_line_height=string.byte(b,6)<<8|string.byte(b,7)f.progressive_render=string.byte(b,8)==1;f.updatable=string.byte(b,9)==1;f.sprites={}local g=f.height+f.sprite_line_height-1;f.total_sprites=g//f.sprite_line_height;f.active_sprites=0;f.current_sprite_index=0;return f else if c==nil then return nil end;c.current_sprite_index=c.current_sprite_index+1;if c.current_sprite_index>c.total_sprites then if c.updatable then c.current_sprite_index=1 else return c end end;if c.active_sprites<c.total_sprites then c.active_sprites=c.active_sprites+1 end;local h={}h.width=string.byte(b,1)<<8|string.byte(b,2)h.height=string.byte(b,3)<<8|string.byte(b,4)h.compressed=string.byte(b,5)>0;h.bpp=string.byte(b,6)h.num_colors=string.byte(b,7)h.palette_data=string.sub(b,8,8+h.num_colors*3-1)h.pixel_data=string.sub(b,8+h.num_colors*3)c.sprites[c.current_sprite_index]=h;return c end end;function a.set_palette(i,j)local k={'VOID','WHITE','GREY','RED','PINK','DARKBROWN','BROWN','ORANGE','YELLOW','DARKGREEN','GREEN','LIGHTGREEN','NIGHTBLUE','SEABLUE','SKYBLUE','CLOUDBLUE'}for l=1,i do local m=(l-1)*3;frame.display.assign_color(k[l],string.byte(j,m+1),string.byte(j,m+2),string.byte(j,m+3))end end;return a
\ No newline at end of file
+local _M={}local function parse_strip_sprite(data)local sprite={}sprite.width=string.byte(data,1)<<8|string.byte(data,2)sprite.height=string.byte(data,3)<<8|string.byte(data,4)sprite.compressed=string.byte(data,5)>0 sprite.bpp=string.byte(data,6)sprite.num_colors=string.byte(data,7)sprite.palette_data=string.sub(data,8,8+sprite.num_colors*3-1)sprite.pixel_data=string.sub(data,8+sprite.num_colors*3)return sprite end local function advance_active_sprites(block)while block.active_sprites<block.total_sprites and block.sprites[block.active_sprites+1]~=nil do block.active_sprites=block.active_sprites+1 end end function _M.parse_image_sprite_block(data,prev)if string.byte(data,1)==0xFF then if prev~=nil then for k,v in pairs(prev.sprites)do prev.sprites[k]=nil end prev=nil collectgarbage('collect')end local image_sprite_block={}image_sprite_block.width=string.byte(data,2)<<8|string.byte(data,3)image_sprite_block.height=string.byte(data,4)<<8|string.byte(data,5)image_sprite_block.sprite_line_height=string.byte(data,6)<<8|string.byte(data,7)image_sprite_block.progressive_render=string.byte(data,8)==1 image_sprite_block.updatable=string.byte(data,9)==1 image_sprite_block.sprites={}local sprite_height_temp=image_sprite_block.height+image_sprite_block.sprite_line_height-1 image_sprite_block.total_sprites=sprite_height_temp//image_sprite_block.sprite_line_height image_sprite_block.active_sprites=0 image_sprite_block.current_sprite_index=0 return image_sprite_block elseif string.byte(data,1)==0xFE then if prev==nil then return nil end if not prev.updatable then return prev end local index=string.byte(data,2)<<8|string.byte(data,3)if index<1 or index>prev.total_sprites then return prev end prev.sprites[index]=parse_strip_sprite(string.sub(data,4))advance_active_sprites(prev)return prev else if prev==nil then return nil end prev.current_sprite_index=prev.current_sprite_index+1 if prev.current_sprite_index>prev.total_sprites then if prev.updatable then prev.current_sprite_index=1 else return prev end end prev.sprites[prev.current_sprite_index]=parse_strip_sprite(data)advance_active_sprites(prev)return prev end end function _M.set_palette(num_colors,palette_data)local colors={'VOID','WHITE','GREY','RED','PINK','DARKBROWN','BROWN','ORANGE','YELLOW','DARKGREEN','GREEN','LIGHTGREEN','NIGHTBLUE','SEABLUE','SKYBLUE','CLOUDBLUE'}for i=1,num_colors do local col_offset=(i-1)*3 frame.display.assign_color(colors[i],string.byte(palette_data,col_offset+1),string.byte(palette_data,col_offset+2),string.byte(palette_data,col_offset+3))end end return _M
\ No newline at end of file
@@ -0,0 +1,43 @@
+-- Module to hold Sprites sent from phoneside app as TxSpriteCacheStore messages in numbered cache slots,
+-- so they can be drawn again (e.g. at the position given in a TxSpriteCoords message) without being resent.
+-- The phoneside SpriteCache decides which slots to evict to stay within Frame's memory budget
+local _M = {}
+
+-- cached sprites, keyed by slot number
+local sprites = {}
+_M.sprites = sprites
+
+-- Parse the sprite cache store message raw data, evict the listed slots and store the sprite in its slot.
+-- slot(Uint8), evict_count(Uint8), evict_slot(Uint8)*evict_count, TxSprite
+-- Returns the stored sprite, which also has a slot field
+function _M.parse_sprite_cache_store(data)
+	local slot = string.byte(data, 1)
+	local evict_count = string.byte(data, 2)
+	for i=1,evict_count do
+		sprites[string.byte(data, 2 + i)] = nil
+	end
+	-- release the previous sprite in this slot before parsing the new one
+	sprites[slot] = nil
+	collectgarbage('collect')
+
+	local offset = 2 + evict_count
+	local sprite = {}
+	sprite.slot = slot
+	sprite.width = string.byte(data, offset + 1) << 8 | string.byte(data, offset + 2)
+	sprite.height = string.byte(data, offset + 3) << 8 | string.byte(data, offset + 4)
+	sprite.compressed = string.byte(data, offset + 5) > 0
+	sprite.bpp = string.byte(data, offset + 6)
+	sprite.num_colors = string.byte(data, offset + 7)
+	sprite.palette_data = string.sub(data, offset + 8, offset + 8 + sprite.num_colors * 3 - 1)
+	sprite.pixel_data = string.sub(data, offset + 8 + sprite.num_colors * 3)
+
+	sprites[slot] = sprite
+	return sprite
+end
+
+-- Returns the sprite cached in the given slot (e.g. the code field of a parsed TxSpriteCoords), or nil
+function _M.get(slot)
+	return sprites[slot]
+end
+
+return _M
\ No newline at end of file
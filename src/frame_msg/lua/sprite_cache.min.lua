@@ -0,0 +1 @@
+local _M={}local sprites={}_M.sprites=sprites function _M.parse_sprite_cache_store(data)local slot=string.byte(data,1)local evict_count=string.byte(data,2)for i=1,evict_count do sprites[string.byte(data,2+i)]=nil end sprites[slot]=nil collectgarbage('collect')local offset=2+evict_count local sprite={}sprite.slot=slot sprite.width=string.byte(data,offset+1)<<8|string.byte(data,offset+2)sprite.height=string.byte(data,offset+3)<<8|string.byte(data,offset+4)sprite.compressed=string.byte(data,offset+5)>0 sprite.bpp=string.byte(data,offset+6)sprite.num_colors=string.byte(data,offset+7)sprite.palette_data=string.sub(data,offset+8,offset+8+sprite.num_colors*3-1)sprite.pixel_data=string.sub(data,offset+8+sprite.num_colors*3)sprites[slot]=sprite return sprite end function _M.get(slot)return sprites[slot]end return _M
\ No newline at end of file
@@ -1,8 +1,23 @@
 -- Module to parse Sprites sent from phoneside app as TxTextSpriteBlock messages
 local _M = {}
 
+-- Parse a TxSprite line starting at the beginning of data
+local function parse_line_sprite(data)
+	local sprite = {}
+	sprite.width = string.byte(data, 1) << 8 | string.byte(data, 2)
+	sprite.height = string.byte(data, 3) << 8 | string.byte(data, 4)
+	sprite.compressed = string.byte(data, 5) > 0
+	sprite.bpp = string.byte(data, 6)
+	sprite.num_colors = string.byte(data, 7)
+	sprite.palette_data = string.sub(data, 8, 8 + sprite.num_colors * 3 - 1)
+	sprite.pixel_data = string.sub(data, 8 + sprite.num_colors * 3)
+	return sprite
+end
+
 -- Parse the text sprite block message raw data. Unpack the header fields.
 -- width(Uint16), max_display_rows(Uint8), lines(Uint8), [x_offset (Uint16), y_offset (Uint16)] * lines
+-- A TxTextSpriteLine message replaces (or appends) a single line in the current block:
+-- 0xFE, index(Uint8), x_offset(Uint16), y_offset(Uint16), TxSprite
 function _M.parse_text_sprite_block(data, prev)
 	if string.byte(data, 1) == 0xFF then
 		-- new block
@@ -23,6 +38,38 @@ function _M.parse_text_sprite_block(data, prev)
 		text_sprite_block.last_sprite_index = 0
 		text_sprite_block.first_sprite_index = 0
 		return text_sprite_block
+	elseif string.byte(data, 1) == 0xFE then
+		-- no existing TextSpriteBlock to update, drop this line
+		if prev == nil then
+			return nil
+		end
+
+		local index = string.byte(data, 2)
+		local xy = {}
+		xy.x = string.byte(data, 3) << 8 | string.byte(data, 4)
+		xy.y = string.byte(data, 5) << 8 | string.byte(data, 6)
+		prev.offsets[index] = xy
+		if index > prev.lines then
+			prev.lines = index
+		end
+
+		-- replace the sprite for this line in place
+		prev.sprites[index] = parse_line_sprite(string.sub(data, 7))
+
+		-- a new line extends the block, so keep only the last max_display_rows sprites
+		if index > prev.last_sprite_index then
+			prev.last_sprite_index = index
+			if prev.first_sprite_index == 0 then
+				prev.first_sprite_index = 1
+			end
+
+			while (prev.last_sprite_index - prev.first_sprite_index + 1) > prev.max_display_rows do
+				prev.sprites[prev.first_sprite_index] = nil
+				prev.first_sprite_index = prev.first_sprite_index + 1
+			end
+		end
+
+		return prev
 	else
 		-- no existing TextSpriteBlock to accumulate into, drop this sprite
 		if prev == nil then
@@ -42,18 +89,8 @@ function _M.parse_text_sprite_block(data, prev)
 			prev.first_sprite_index = prev.first_sprite_index + 1
 		end
 
-		-- new text sprite line
-		local sprite = {}
-		sprite.width = string.byte(data, 1) << 8 | string.byte(data, 2)
-		sprite.height = string.byte(data, 3) << 8 | string.byte(data, 4)
-		sprite.compressed = string.byte(data, 5) > 0
-		sprite.bpp = string.byte(data, 6)
-		sprite.num_colors = string.byte(data, 7)
-		sprite.palette_data = string.sub(data, 8, 8 + sprite.num_colors * 3 - 1)
-		sprite.pixel_data = string.sub(data, 8 + sprite.num_colors * 3)
-
-		-- add this sprite to the end
-		prev.sprites[prev.last_sprite_index] = sprite
+		-- new text sprite line, added to the end
+		prev.sprites[prev.last_sprite_index] = parse_line_sprite(data)
 
 		return prev
 	end
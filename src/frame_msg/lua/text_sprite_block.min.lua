@@ -1 +1 @@
-local a={}function a.parse_text_sprite_block(b,c)if string.byte(b,1)==0xFF then local d={}d.width=string.byte(b,2)<<8|string.byte(b,3)d.max_display_rows=string.byte(b,4)d.lines=string.byte(b,5)local e={}for f=0,d.lines-1 do local g={}g.x=string.byte(b,5+4*f+1)<<8|string.byte(b,5+4*f+2)g.y=string.byte(b,5+4*f+3)<<8|string.byte(b,5+4*f+4)table.insert(e,g)end;d.offsets=e;d.sprites={}d.last_sprite_index=0;d.first_sprite_index=0;return d else if c==nil then return nil end;c.last_sprite_index=c.last_sprite_index+1;if c.first_sprite_index==0 then c.first_sprite_index=1 end;if c.last_sprite_index-c.first_sprite_index+1>c.max_display_rows then c.sprites[c.first_sprite_index]=nil;c.first_sprite_index=c.first_sprite_index+1 end;local h={}h.width=string.byte(b,1)<<8|string.byte(b,2)h.height=string.byte(b,3)<<8|string.byte(b,4)h.compressed=string.byte(b,5)>0;h.bpp=string.byte(b,6)h.num_colors=string.byte(b,7)h.palette_data=string.sub(b,8,8+h.num_colors*3-1)h.pixel_data=string.sub(b,8+h.num_colors*3)c.sprites[c.last_sprite_index]=h;return c end end;return a
\ No newline at end of file
+local _M={}local function parse_line_sprite(data)local sprite={}sprite.width=string.byte(data,1)<<8|string.byte(data,2)sprite.height=string.byte(data,3)<<8|string.byte(data,4)sprite.compressed=string.byte(data,5)>0 sprite.bpp=string.byte(data,6)sprite.num_colors=string.byte(data,7)sprite.palette_data=string.sub(data,8,8+sprite.num_colors*3-1)sprite.pixel_data=string.sub(data,8+sprite.num_colors*3)return sprite end function _M.parse_text_sprite_block(data,prev)if string.byte(data,1)==0xFF then local text_sprite_block={}text_sprite_block.width=string.byte(data,2)<<8|string.byte(data,3)text_sprite_block.max_display_rows=string.byte(data,4)text_sprite_block.lines=string.byte(data,5)local offsets={}for i=0,text_sprite_block.lines-1 do local xy={}xy.x=string.byte(data,5+(4*i)+1)<<8|string.byte(data,5+(4*i)+2)xy.y=string.byte(data,5+(4*i)+3)<<8|string.byte(data,5+(4*i)+4)table.insert(offsets,xy)end text_sprite_block.offsets=offsets text_sprite_block.sprites={}text_sprite_block.last_sprite_index=0 text_sprite_block.first_sprite_index=0 return text_sprite_block elseif string.byte(data,1)==0xFE then if prev==nil then return nil end local index=string.byte(data,2)local xy={}xy.x=string.byte(data,3)<<8|string.byte(data,4)xy.y=string.byte(data,5)<<8|string.byte(data,6)prev.offsets[index]=xy if index>prev.lines then prev.lines=index end prev.sprites[index]=parse_line_sprite(string.sub(data,7))if index>prev.last_sprite_index then prev.last_sprite_index=index if prev.first_sprite_index==0 then prev.first_sprite_index=1 end while(prev.last_sprite_index-prev.first_sprite_index+1)>prev.max_display_rows do prev.sprites[prev.first_sprite_index]=nil prev.first_sprite_index=prev.first_sprite_index+1 end end return prev else if prev==nil then return nil end prev.last_sprite_index=prev.last_sprite_index+1 if prev.first_sprite_index==0 then prev.first_sprite_index=1 end if(prev.last_sprite_index-prev.first_sprite_index+1)>prev.max_display_rows then prev.sprites[prev.first_sprite_index]=nil prev.first_sprite_index=prev.first_sprite_index+1 end prev.sprites[prev.last_sprite_index]=parse_line_sprite(data)return prev end end return _M
\ No newline at end of file
@@ -1,10 +1,11 @@
 import asyncio
 import logging
-import struct
 from typing import Optional
 from io import BytesIO
 
 from frame_msg import FrameMsg
+from frame_msg.rx_queue import RxQueue
+from frame_msg.wav_writer import SIGNED_TO_UNSIGNED_8BIT, wav_header
 
 logging.basicConfig()
 _log = logging.getLogger("RxAudio")
@@ -14,7 +15,10 @@ class RxAudio:
         self,
         non_final_chunk_flag: int = 0x05,
         final_chunk_flag: int = 0x06,
-        streaming: bool = False
+        streaming: bool = False,
+        queue_size: int = 0,
+        overflow: str = 'block',
+        batch: bool = False,
     ):
         """
         Initialize audio handler for processing audio data chunks.
@@ -23,37 +27,45 @@ class RxAudio:
             non_final_chunk_flag: Flag indicating a non-final chunk of audio data
             final_chunk_flag: Flag indicating the final chunk of audio data
             streaming: If True, emit chunks as they arrive; if False, accumulate and emit complete clip
+            queue_size: The number of chunks the queue holds before `overflow` applies. 0 (default) means unbounded.
+            overflow: What happens to new chunks when the queue is full: 'block' (default, nothing is dropped),
+                'drop_oldest' or 'drop_newest', see `RxQueue`
+            batch: If True (streaming only), the queue receives lists of the chunks received in each event loop iteration
         """
         self.non_final_chunk_flag = non_final_chunk_flag
         self.final_chunk_flag = final_chunk_flag
         self.streaming = streaming
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.batch = batch
 
-        self.queue: Optional[asyncio.Queue] = None
+        self.queue: Optional[RxQueue] = None
         self._audio_buffer = BytesIO()
         self._raw_offset = 0
 
-    def handle_data(self, data: bytes) -> None:
+    def handle_data(self, data: memoryview) -> None:
         """
         Process incoming audio data packets with either a non-final or a final msg code.
 
         Args:
-            data: Bytes containing audio data with flag byte prefix
+            data: Audio data with flag byte prefix, only valid during the call
         """
         if not self.queue:
             _log.warning("Received data but queue not initialized - call start() first")
             return
 
         flag = data[0]
-        chunk = data[1:]
+        # a zero-copy slice of the notification, copied only where it is kept
+        chunk = memoryview(data)[1:]
 
         if self.streaming:
             if len(chunk) > 0:
                 # In streaming mode, immediately queue each chunk
-                asyncio.create_task(self.queue.put(bytes(chunk)))
+                self.queue.deliver(bytes(chunk))
 
             if flag == self.final_chunk_flag:
-                # Signal end of stream with None
-                asyncio.create_task(self.queue.put(None))
+                # Signal end of stream with None, after any batched chunks
+                self.queue.deliver(None, batch=False)
 
         else:
             # In single-clip mode, accumulate chunks
@@ -67,21 +79,21 @@ class RxAudio:
                 self._raw_offset = 0
 
                 # Queue the complete audio clip
-                asyncio.create_task(self.queue.put(complete_audio))
+                self.queue.deliver(complete_audio, batch=False)
                 # Signal end with None
-                asyncio.create_task(self.queue.put(None))
+                self.queue.deliver(None, batch=False)
 
-    async def attach(self, frame: FrameMsg) -> asyncio.Queue:
+    async def attach(self, frame: FrameMsg) -> RxQueue:
         """
         Attach the audio handler to the Frame data response and return a queue that will receive audio data.
 
         Returns:
-            asyncio.Queue that will receive bytes containing audio data.
-            In streaming mode, receives chunks as they arrive.
+            RxQueue that will receive bytes containing audio data.
+            In streaming mode, receives chunks as they arrive (or lists of chunks in batch mode).
             In single-clip mode, receives complete audio clip at once.
             A None value indicates end of stream/clip.
         """
-        self.queue = asyncio.Queue()
+        self.queue = RxQueue(self.queue_size, self.overflow, self.batch and self.streaming)
         self._audio_buffer = BytesIO()
         self._raw_offset = 0
 
@@ -115,47 +127,15 @@ class RxAudio:
             channels: Number of audio channels
 
         Returns:
-            Bytes containing complete WAV file
+            Bytes containing complete WAV file. To write long recordings to a file as they stream in, see `WavWriter`.
         """
-        byte_rate = sample_rate * channels * bits_per_sample // 8
-        data_size = len(pcm_data)
-        file_size = 36 + data_size
-
-        # Create WAV header
-        header = struct.pack(
-            '<4sI4s'    # RIFF chunk descriptor
-            '4sI'       # fmt chunk
-            'HHIIHH'    # fmt chunk data
-            '4sI',      # data chunk header
-
-            # RIFF chunk
-            b'RIFF',
-            file_size,
-            b'WAVE',
-
-            # fmt chunk
-            b'fmt ',
-            16,                         # Subchunk1Size (16 for PCM)
-            1,                          # AudioFormat (1 for PCM)
-            channels,                   # NumChannels
-            sample_rate,                # SampleRate
-            byte_rate,                  # ByteRate
-            channels * bits_per_sample // 8,  # BlockAlign
-            bits_per_sample,            # BitsPerSample
-
-            # data chunk header
-            b'data',
-            data_size
-        )
+        header = wav_header(len(pcm_data), sample_rate, bits_per_sample, channels)
 
         # Convert 8-bit signed PCM to unsigned 8-bit for WAV format (16-bit PCM is left as-is)
         if bits_per_sample == 8:
-            # Iterate over each sample and reinterpret as signed 8-bit then convert to unsigned 8-bit
-            pcm_data = bytearray(pcm_data)
-            for i in range(len(pcm_data)):
-                # Convert signed 8-bit (-128 to 127) to unsigned 8-bit (0 to 255)
-                pcm_data[i] = (pcm_data[i] if pcm_data[i] < 128 else pcm_data[i] - 256) + 128
-
-            pcm_data = bytes(pcm_data)
+            pcm_data = bytes(pcm_data).translate(SIGNED_TO_UNSIGNED_8BIT)
 
+        # RIFF chunks are padded to an even length
+        if len(pcm_data) & 1:
+            return header + pcm_data + b'\x00'
         return header + pcm_data
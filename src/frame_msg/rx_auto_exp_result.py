@@ -1,78 +1,117 @@
 import asyncio
 import logging
 import struct
-from typing import Optional
+from typing import NamedTuple, Optional
 
 from frame_msg import FrameMsg
+from frame_msg.rx_queue import RxQueue
+from frame_msg.telemetry import TelemetryFilter, TelemetryHistory, record_getitem
 
 logging.basicConfig()
 _log = logging.getLogger("RxAutoExpResult")
 
+class ColorBrightness(NamedTuple):
+    r: float
+    g: float
+    b: float
+    average: float
+
+    __getitem__ = record_getitem
+
+class AutoExpBrightness(NamedTuple):
+    center_weighted_average: float
+    scene: float
+    matrix: ColorBrightness
+    spot: ColorBrightness
+
+    __getitem__ = record_getitem
+
+class AutoExpResult(NamedTuple):
+    """An auto exposure result. Fields can also be read by name with `result['shutter']`, as when results were dicts"""
+    error: float
+    shutter: float
+    analog_gain: float
+    red_gain: float
+    green_gain: float
+    blue_gain: float
+    brightness: AutoExpBrightness
+
+    __getitem__ = record_getitem
+
+# the names of the 16 values in each result, as in RxAutoExpResult.history
+AUTO_EXP_FIELDS = (
+    'error', 'shutter', 'analog_gain', 'red_gain', 'green_gain', 'blue_gain',
+    'center_weighted_average', 'scene',
+    'matrix_r', 'matrix_g', 'matrix_b', 'matrix_average',
+    'spot_r', 'spot_g', 'spot_b', 'spot_average',
+)
+
 class RxAutoExpResult:
     def __init__(
         self,
         msg_code: int = 0x11,
+        queue_size: int = 0,
+        overflow: str = 'block',
+        batch: bool = False,
+        decimation: int = 1,
+        change_threshold: float = 0.0,
+        history_size: int = 0,
     ):
         """
         Initialize receive handler for processing auto exposure result data.
 
         Args:
             msg_code: Message type identifier for auto exposure result data
+            queue_size: The number of results the queue holds before `overflow` applies. 0 (default) means unbounded.
+            overflow: What happens to new results when the queue is full: 'block' (default, nothing is dropped),
+                'drop_oldest' or 'drop_newest', see `RxQueue`
+            batch: If True, the queue receives lists of the results received in each event loop iteration
+            decimation: Queue only every `decimation`th result (default 1, every result)
+            change_threshold: Queue only results where some value differs from the last queued result by more than this.
+                0 (default) queues every result
+            history_size: If set, keep the values of the last `history_size` results (queued or not) in `history`
         """
         self.msg_code = msg_code
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.batch = batch
+
+        self.filter = TelemetryFilter(decimation, change_threshold)
+        self.history = TelemetryHistory(AUTO_EXP_FIELDS, history_size) if history_size else None
 
-        self.queue: Optional[asyncio.Queue] = None
+        self.queue: Optional[RxQueue] = None
 
-    def handle_data(self, data: bytes) -> None:
+    def handle_data(self, data: memoryview) -> None:
         """
         Process incoming data packets.
 
         Args:
-            data: Bytes containing auto exposure result data with flag byte prefix and 16 floats
+            data: Auto exposure result data with flag byte prefix and 16 floats
         """
         if not self.queue:
             _log.warning("Received data but queue not initialized - call start() first")
             return
 
-        # Parse six signed 16-bit integers from the data starting at offset 2
-        unpacked = struct.unpack("<ffffff ff ffff ffff", data[1:65])
-        # Create the result dictionary
-        result = {
-            'error': unpacked[0],
-            'shutter': unpacked[1],
-            'analog_gain': unpacked[2],
-            'red_gain': unpacked[3],
-            'green_gain': unpacked[4],
-            'blue_gain': unpacked[5],
-            'brightness': {
-                'center_weighted_average': unpacked[6],
-                'scene': unpacked[7],
-                'matrix': {
-                    'r': unpacked[8],
-                    'g': unpacked[9],
-                    'b': unpacked[10],
-                    'average': unpacked[11]
-                },
-                'spot': {
-                    'r': unpacked[12],
-                    'g': unpacked[13],
-                    'b': unpacked[14],
-                    'average': unpacked[15]
-                }
-            }
-        }
-
-        # Queue the data
-        asyncio.create_task(self.queue.put(result))
-
-    async def attach(self, frame: FrameMsg) -> asyncio.Queue:
+        values = struct.unpack_from("<16f", data, 1)
+
+        if self.history is not None:
+            self.history.append(values)
+        if not self.filter.accept(values):
+            return
+
+        self.queue.deliver(AutoExpResult(
+            *values[:6],
+            AutoExpBrightness(values[6], values[7], ColorBrightness(*values[8:12]), ColorBrightness(*values[12:16]))
+        ))
+
+    async def attach(self, frame: FrameMsg) -> RxQueue:
         """
         Attach the receive handler to the Frame data response and return a queue that will receive autoexposure result data.
 
         Returns:
-            asyncio.Queue that will receive autoexposure result objects
+            RxQueue that will receive `AutoExpResult`s, or lists of them in batch mode
         """
-        self.queue = asyncio.Queue()
+        self.queue = RxQueue(self.queue_size, self.overflow, self.batch)
 
         # subscribe for notifications
         frame.register_data_response_handler(self, [self.msg_code], self.handle_data)
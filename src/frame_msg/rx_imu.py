@@ -6,47 +6,29 @@ from typing import Optional, Tuple
 from dataclasses import dataclass
 
 from frame_msg import FrameMsg
+from frame_msg.imu_filters import ComplementaryFilter, EMAFilter, MedianFilter, SensorBuffer
+from frame_msg.rx_queue import RxQueue
 
 logging.basicConfig()
 _log = logging.getLogger("RxIMU")
 
-class SensorBuffer:
-    """Buffer class to provide smoothed moving average of samples"""
-    def __init__(self, max_size: int):
-        self.max_size = max_size
-        self._buffer: list[Tuple[int, int, int]] = []
-
-    def add(self, value: Tuple[int, int, int]) -> None:
-        self._buffer.append(value)
-        if len(self._buffer) > self.max_size:
-            self._buffer.pop(0)
-
-    @property
-    def average(self) -> Tuple[int, int, int]:
-        if not self._buffer:
-            return (0, 0, 0)
-
-        sum_x = sum(x for x, _, _ in self._buffer)
-        sum_y = sum(y for _, y, _ in self._buffer)
-        sum_z = sum(z for _, _, z in self._buffer)
-        length = len(self._buffer)
-
-        return (
-            sum_x // length,
-            sum_y // length,
-            sum_z // length
-        )
-
 @dataclass
 class IMURawData:
     compass: Tuple[int, int, int]
     accel: Tuple[int, int, int]
 
+@dataclass
+class IMUOrientation:
+    heading: float
+    pitch: float
+    roll: float
+
 @dataclass
 class IMUData:
     compass: Tuple[int, int, int]
     accel: Tuple[int, int, int]
     raw: Optional[IMURawData] = None
+    orientation: Optional[IMUOrientation] = None
 
     @property
     def pitch(self) -> float:
@@ -61,64 +43,101 @@ class RxIMU:
         self,
         imu_flag: int = 0x0A,
         smoothing_samples: int = 1,
+        smoothing: str = 'moving_average',  # 'moving_average', 'median', 'ema' or 'complementary'
+        ema_alpha: float = 0.2,
+        complementary_alpha: float = 0.98,
+        queue_size: int = 0,
+        overflow: str = 'block',
+        batch: bool = False,
     ):
         """
         Initialize IMU handler for processing magnetometer and accelerometer data.
 
         Args:
             imu_flag: Message type identifier for IMU data
-            smoothing_samples: Number of samples to use for moving average
+            smoothing_samples: Number of samples to use for moving average (or moving median)
+            smoothing: How the compass and accelerometer values are smoothed. 'moving_average' (default) and 'median'
+                use the last `smoothing_samples` samples, 'ema' is an exponential moving average with weight `ema_alpha`
+                for each new sample. 'complementary' also fuses them into a smoothed heading, pitch and roll in
+                `IMUData.orientation` with a `ComplementaryFilter` (the values themselves use a moving average).
+            ema_alpha: Weight of each new sample in the 'ema' smoothing, between 0 (exclusive) and 1
+            complementary_alpha: Weight of the previous orientation in the 'complementary' smoothing, between 0 and 1 (exclusive)
+            queue_size: The number of samples the queue holds before `overflow` applies. 0 (default) means unbounded.
+            overflow: What happens to new samples when the queue is full: 'block' (default, nothing is dropped),
+                'drop_oldest' or 'drop_newest', see `RxQueue`
+            batch: If True, the queue receives lists of the samples received in each event loop iteration
         """
         self.imu_flag = imu_flag
-        self._smoothing_samples = smoothing_samples
+        if smoothing not in ('moving_average', 'median', 'ema', 'complementary'):
+            raise ValueError(f"smoothing must be 'moving_average', 'median', 'ema' or 'complementary', got {smoothing}")
 
-        self.queue: Optional[asyncio.Queue] = None
-        self._compass_buffer = SensorBuffer(smoothing_samples)
-        self._accel_buffer = SensorBuffer(smoothing_samples)
-
-    def handle_data(self, data: bytes) -> None:
+        self._smoothing_samples = smoothing_samples
+        self.smoothing = smoothing
+        self.ema_alpha = ema_alpha
+        self.complementary_alpha = complementary_alpha
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.batch = batch
+
+        self.queue: Optional[RxQueue] = None
+        self._compass_filter, self._accel_filter = self._create_filter(), self._create_filter()
+        self._orientation_filter = ComplementaryFilter(complementary_alpha) if smoothing == 'complementary' else None
+
+    def _create_filter(self):
+        if self.smoothing == 'median':
+            return MedianFilter(self._smoothing_samples)
+        if self.smoothing == 'ema':
+            return EMAFilter(self.ema_alpha)
+        return SensorBuffer(self._smoothing_samples)
+
+    def handle_data(self, data: memoryview) -> None:
         """
         Process incoming IMU data packets.
 
         Args:
-            data: Bytes containing IMU data with flag byte prefix
+            data: IMU data with flag byte prefix
         """
         if not self.queue:
             _log.warning("Received data but queue not initialized - call start() first")
             return
 
         # Parse six signed 16-bit integers from the data starting at offset 2
-        values = struct.unpack('<6h', data[2:14])
+        values = struct.unpack_from('<6h', data, 2)
 
         # Extract compass and accelerometer values
         raw_compass = (values[0], values[1], values[2])
         raw_accel = (values[3], values[4], values[5])
 
-        # Add to buffers
-        self._compass_buffer.add(raw_compass)
-        self._accel_buffer.add(raw_accel)
+        # Add to filters
+        compass = self._compass_filter.update(raw_compass)
+        accel = self._accel_filter.update(raw_accel)
+        if self.smoothing == 'ema':
+            compass = (round(compass[0]), round(compass[1]), round(compass[2]))
+            accel = (round(accel[0]), round(accel[1]), round(accel[2]))
 
         # Create IMU data with smoothed and raw values
         imu_data = IMUData(
-            compass=self._compass_buffer.average,
-            accel=self._accel_buffer.average,
+            compass=compass,
+            accel=accel,
             raw=IMURawData(
                 compass=raw_compass,
                 accel=raw_accel
             )
         )
+        if self._orientation_filter is not None:
+            imu_data.orientation = IMUOrientation(*self._orientation_filter.update(raw_compass, raw_accel))
 
         # Queue the data
-        asyncio.create_task(self.queue.put(imu_data))
+        self.queue.deliver(imu_data)
 
-    async def attach(self, frame: FrameMsg) -> asyncio.Queue:
+    async def attach(self, frame: FrameMsg) -> RxQueue:
         """
         Attach the IMU handler to the Frame data response and return a queue that will receive IMU data.
 
         Returns:
-            asyncio.Queue that will receive IMUData objects
+            RxQueue that will receive IMUData objects, or lists of them in batch mode
         """
-        self.queue = asyncio.Queue()
+        self.queue = RxQueue(self.queue_size, self.overflow, self.batch)
 
         # subscribe for notifications
         frame.register_data_response_handler(self, [self.imu_flag], self.handle_data)
@@ -0,0 +1,153 @@
+import asyncio
+import time
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from frame_msg import FrameMsg
+
+class RxIMURecorder:
+    """
+    Records the raw IMU stream in columnar form for analysis: each sample is copied straight from the BLE
+    notification into a preallocated int16 array (compass x, y, z, accelerometer x, y, z) alongside a float64
+    host timestamp (seconds since the epoch), with no per-sample objects.
+
+    Full chunks of `chunk_samples` samples are kept in memory, or written to `path` as a pair of .npy files
+    (`<chunk>.timestamps.npy` and `<chunk>.samples.npy`) that `iter_chunks()` and `load()` memory-map back.
+    Files are written on an executor so that the disk doesn't hold up the event loop; `drain()` waits for them.
+    Can be attached alongside an `RxIMU` for the same imu_flag, and the filters in `imu_filters`
+    can be run over the recorded arrays with `update_batch()`.
+    """
+    def __init__(
+        self,
+        path: Optional[Union[str, Path]] = None,
+        imu_flag: int = 0x0A,
+        chunk_samples: int = 65536,
+        executor: Optional[Executor] = None,
+    ):
+        """
+        Initialize a recorder for raw IMU data.
+
+        Args:
+            path: Directory to write the recording to, created if needed. If None (default), the recording is kept in memory.
+            imu_flag: Message type identifier for IMU data
+            chunk_samples: Number of samples preallocated per chunk, and per pair of files written
+            executor: Executor used to write chunks to `path` off the event loop.
+                Defaults to the event loop's default executor.
+        """
+        self.path = Path(path) if path is not None else None
+        self.imu_flag = imu_flag
+        self.chunk_samples = chunk_samples
+        self.executor = executor
+
+        self._saves: List[asyncio.Future] = []
+        self._chunks: List[Tuple[np.ndarray, np.ndarray]] = []
+        self._chunk_index = 0
+        self._stored_samples = 0
+        self._new_chunk()
+
+    def _new_chunk(self) -> None:
+        self._timestamps = np.empty(self.chunk_samples, dtype=np.float64)
+        self._samples = np.empty((self.chunk_samples, 6), dtype='<i2')
+        # the samples as bytes, so each notification's payload is copied in without unpacking
+        self._sample_bytes = memoryview(self._samples).cast('B')
+        self._count = 0
+
+    def handle_data(self, data: memoryview) -> None:
+        """
+        Record an incoming IMU data packet.
+
+        Args:
+            data: IMU data with flag byte prefix, followed by six little-endian signed 16-bit integers from offset 2
+        """
+        offset = self._count * 12
+        self._sample_bytes[offset:offset + 12] = data[2:14]
+        self._timestamps[self._count] = time.time()
+        self._count += 1
+
+        if self._count == self.chunk_samples:
+            self._store_chunk(self._timestamps, self._samples)
+            self._new_chunk()
+
+    def _store_chunk(self, timestamps: np.ndarray, samples: np.ndarray) -> None:
+        if self.path is None:
+            self._chunks.append((timestamps, samples))
+        else:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                # not recording from an event loop, so there's nothing to hold up
+                self._save_chunk(self.path, self._chunk_index, timestamps, samples)
+            else:
+                self._saves = [save for save in self._saves if not save.done()]
+                self._saves.append(loop.run_in_executor(
+                    self.executor, self._save_chunk, self.path, self._chunk_index, timestamps, samples))
+        self._chunk_index += 1
+        self._stored_samples += len(timestamps)
+
+    @staticmethod
+    def _save_chunk(path: Path, index: int, timestamps: np.ndarray, samples: np.ndarray) -> None:
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / f"{index:06d}.timestamps.npy", timestamps)
+        np.save(path / f"{index:06d}.samples.npy", samples)
+
+    async def drain(self) -> None:
+        """Wait until the chunks stored so far have been written to `path`, raising any error from writing them"""
+        saves, self._saves = self._saves, []
+        await asyncio.gather(*saves)
+
+    def flush(self) -> None:
+        """Store the samples recorded since the last full chunk as a (shorter) chunk of their own"""
+        if self._count:
+            self._store_chunk(self._timestamps[:self._count].copy(), self._samples[:self._count].copy())
+            self._new_chunk()
+
+    @property
+    def sample_count(self) -> int:
+        """Number of samples recorded so far"""
+        return self._stored_samples + self._count
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        """Host timestamps of the samples recorded so far, if recording in memory (otherwise only those not yet written)"""
+        return np.concatenate([t for t, _ in self._chunks] + [self._timestamps[:self._count]])
+
+    @property
+    def samples(self) -> np.ndarray:
+        """(N, 6) int16 array of the samples recorded so far, if recording in memory: compass x, y, z, accelerometer x, y, z"""
+        return np.concatenate([s for _, s in self._chunks] + [self._samples[:self._count]])
+
+    @staticmethod
+    def iter_chunks(path: Union[str, Path], mmap: bool = True) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Yield the (timestamps, samples) arrays of each chunk of a recording in order, memory-mapped by default"""
+        mmap_mode = 'r' if mmap else None
+        for timestamps_file in sorted(Path(path).glob('*.timestamps.npy')):
+            samples_file = timestamps_file.with_name(timestamps_file.name.replace('.timestamps.', '.samples.'))
+            yield np.load(timestamps_file, mmap_mode=mmap_mode), np.load(samples_file, mmap_mode=mmap_mode)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Load a whole recording as (timestamps, compass, accel) arrays, where compass and accel are (N, 3) views
+        of the int16 samples. A single chunk stays memory-mapped; several chunks are concatenated into memory.
+        """
+        chunks = list(cls.iter_chunks(path))
+        if not chunks:
+            return np.empty(0, dtype=np.float64), np.empty((0, 3), dtype='<i2'), np.empty((0, 3), dtype='<i2')
+        if len(chunks) == 1:
+            timestamps, samples = chunks[0]
+        else:
+            timestamps = np.concatenate([t for t, _ in chunks])
+            samples = np.concatenate([s for _, s in chunks])
+        return timestamps, samples[:, :3], samples[:, 3:]
+
+    async def attach(self, frame: FrameMsg) -> None:
+        """Attach the recorder to the Frame data response so that IMU data is recorded"""
+        frame.register_data_response_handler(self, [self.imu_flag], self.handle_data)
+
+    def detach(self, frame: FrameMsg) -> None:
+        """Detach the recorder from the Frame data response and store any partial chunk (await `drain()` for it to be written)"""
+        frame.unregister_data_response_handler(self)
+        self.flush()
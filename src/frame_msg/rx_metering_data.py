@@ -1,62 +1,89 @@
 import asyncio
 import logging
 import struct
-from typing import Optional
+from typing import NamedTuple, Optional
 
 from frame_msg import FrameMsg
+from frame_msg.rx_queue import RxQueue
+from frame_msg.telemetry import TelemetryFilter, TelemetryHistory, record_getitem
 
 logging.basicConfig()
 _log = logging.getLogger("RxMeteringData")
 
+class MeteringData(NamedTuple):
+    """Metering data. Fields can also be read by name with `data['spot_r']`, as when metering data was a dict"""
+    spot_r: int
+    spot_g: int
+    spot_b: int
+    matrix_r: int
+    matrix_g: int
+    matrix_b: int
+
+    __getitem__ = record_getitem
+
 class RxMeteringData:
     def __init__(
         self,
         msg_code: int = 0x12,
+        queue_size: int = 0,
+        overflow: str = 'block',
+        batch: bool = False,
+        decimation: int = 1,
+        change_threshold: float = 0.0,
+        history_size: int = 0,
     ):
         """
         Initialize receive handler for processing metering data.
 
         Args:
             msg_code: Message type identifier for metering data
+            queue_size: The number of results the queue holds before `overflow` applies. 0 (default) means unbounded.
+            overflow: What happens to new results when the queue is full: 'block' (default, nothing is dropped),
+                'drop_oldest' or 'drop_newest', see `RxQueue`
+            batch: If True, the queue receives lists of the results received in each event loop iteration
+            decimation: Queue only every `decimation`th result (default 1, every result)
+            change_threshold: Queue only results where some value differs from the last queued result by more than this.
+                0 (default) queues every result
+            history_size: If set, keep the values of the last `history_size` results (queued or not) in `history`
         """
         self.msg_code = msg_code
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.batch = batch
 
-        self.queue: Optional[asyncio.Queue] = None
+        self.filter = TelemetryFilter(decimation, change_threshold)
+        self.history = TelemetryHistory(MeteringData._fields, history_size) if history_size else None
 
-    def handle_data(self, data: bytes) -> None:
+        self.queue: Optional[RxQueue] = None
+
+    def handle_data(self, data: memoryview) -> None:
         """
         Process incoming data packets.
 
         Args:
-            data: Bytes containing metering data with flag byte prefix and 6 unsigned bytes (spot r,g,b, matrix r,g,b)
+            data: Metering data with flag byte prefix and 6 unsigned bytes (spot r,g,b, matrix r,g,b)
         """
         if not self.queue:
             _log.warning("Received data but queue not initialized - call start() first")
             return
 
-        # Parse six unsigned bytes from the data starting at offset 2
-        unpacked = struct.unpack("<BBBBBB", data[1:7])
-        # Create the result dictionary
-        result = {
-            'spot_r': unpacked[0],
-            'spot_g': unpacked[1],
-            'spot_b': unpacked[2],
-            'matrix_r': unpacked[3],
-            'matrix_g': unpacked[4],
-            'matrix_b': unpacked[5],
-        }
-
-        # Queue the data
-        asyncio.create_task(self.queue.put(result))
-
-    async def attach(self, frame: FrameMsg) -> asyncio.Queue:
+        values = struct.unpack_from("<6B", data, 1)
+
+        if self.history is not None:
+            self.history.append(values)
+        if not self.filter.accept(values):
+            return
+
+        self.queue.deliver(MeteringData(*values))
+
+    async def attach(self, frame: FrameMsg) -> RxQueue:
         """
         Attach the receive handler to the Frame data response and return a queue that will receive metering data.
 
         Returns:
-            asyncio.Queue that will receive metering data objects
+            RxQueue that will receive `MeteringData`, or lists of them in batch mode
         """
-        self.queue = asyncio.Queue()
+        self.queue = RxQueue(self.queue_size, self.overflow, self.batch)
 
         # subscribe for notifications
         frame.register_data_response_handler(self, [self.msg_code], self.handle_data)
@@ -1,16 +1,77 @@
 import asyncio
+import base64
+import json
 import logging
-from typing import Dict, List, Optional
+import os
+import struct
+import time
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 import PIL.Image as Image
 import io
 from frame_msg import FrameMsg
+from frame_msg.capture_roi import CaptureRoi, RoiPhoto
+from frame_msg.tx_capture_settings import TxCaptureSettings
+from frame_msg.rx_queue import RxQueue
 
 logging.basicConfig()
 _log = logging.getLogger("RxPhoto")
 
+@dataclass
+class PhotoTiming:
+    """
+    Timing of a photo: seconds Frame took to capture it (from its own clock, only reported for tagged photos),
+    and host times its first and last bytes arrived
+    """
+    capture: Optional[float]
+    first_byte: float
+    last_byte: float
+
+    @property
+    def transfer(self) -> float:
+        """Seconds from the first to the last byte of the image arriving"""
+        return self.last_byte - self.first_byte
+
+@dataclass
+class TaggedPhoto:
+    """A photo from a burst or continuous capture (`RxPhoto(tagged=True)`), with the frame id Frame tagged it with"""
+    frame_id: int
+    image: Union[bytes, RoiPhoto]
+    timing: PhotoTiming
+
+@dataclass
+class _TaggedFrame:
+    """Reassembly state for a tagged image still arriving"""
+    buffer: bytearray
+    bytes_received: int
+    first_byte: float
+
+# Length of the JPEG header that raw captures leave out
+JPEG_HEADER_LENGTH = 623
+
+# Format version of the JPEG header cache file; files with a different version are ignored
+JPEG_HEADER_CACHE_VERSION = 1
+
 class RxPhoto:
     # Static storage for JPEG headers
     _jpeg_header_map: Dict[str, bytes] = {}
+    # File the JPEG headers are persisted to, if set with use_jpeg_header_cache()
+    _jpeg_header_cache_path: Optional[Path] = None
+
+    # Quality levels in the order of TxCaptureSettings.quality_index
+    _quality_values: Tuple[str, ...] = ('VERY_LOW', 'LOW', 'MEDIUM', 'HIGH', 'VERY_HIGH')
+
+    # Approximate upper bound on the size of a Frame JPEG per pixel at each quality level,
+    # used to size the reassembly buffer so it rarely needs to grow
+    _bytes_per_pixel: Dict[str, float] = {
+        'VERY_LOW': 0.06,
+        'LOW': 0.08,
+        'MEDIUM': 0.11,
+        'HIGH': 0.15,
+        'VERY_HIGH': 0.2,
+    }
 
     def __init__(
         self,
@@ -20,6 +81,13 @@ class RxPhoto:
         is_raw: bool = False,
         quality: Optional[str] = None,  # 'VERY_LOW', 'LOW', 'MEDIUM', 'HIGH', 'VERY_HIGH'
         resolution: Optional[int] = None,  # even number between 100 and 720 inclusive
+        size_hint: Optional[int] = None,
+        upright_mode: str = 'reencode',  # 'reencode' or 'exif'
+        executor: Optional[Executor] = None,
+        queue_size: int = 0,
+        overflow: str = 'block',
+        tagged: bool = False,
+        prime_msg_code: Optional[int] = None,
     ):
         """
         Initialize a photo handler that assembles image chunks into complete JPEG images.
@@ -31,96 +99,343 @@ class RxPhoto:
             is_raw: Whether incoming data will be raw (without JPEG header)
             quality: JPEG quality level
             resolution: Image resolution (must be even number between 100 and 720)
+            size_hint: Expected size in bytes of each image, used as the initial capacity of the
+                reassembly buffer. Defaults to an estimate from quality and resolution, if provided.
+            upright_mode: How an upright image is produced. 'reencode' decodes, rotates and re-encodes the JPEG
+                (pixels are rotated, at the cost of CPU time and a generation of quality loss).
+                'exif' leaves the JPEG data untouched and adds an EXIF Orientation tag so that viewers
+                and `PIL.ImageOps.exif_transpose()` display it upright (lossless and nearly free).
+            executor: Executor used to rotate images off the event loop in 'reencode' mode.
+                Defaults to the event loop's default executor.
+            queue_size: The number of images the queue holds before `overflow` applies. 0 (default) means unbounded.
+            overflow: What happens to new images when the queue is full: 'block' (default, nothing is dropped),
+                'drop_oldest' or 'drop_newest', see `RxQueue`
+            tagged: Whether incoming chunks are tagged with a frame id, as sent by `camera.start_burst()`.
+                Several tagged images can be reassembled at once, and the queue receives `TaggedPhoto`s
+                with per-frame timing instead of bytes.
+            prime_msg_code: For raw images, the msg code the Frameside app takes TxCaptureSettings on.
+                If set, `attach()` requests a full JPEG capture to fetch the JPEG header if it isn't cached yet
+                (see `prime_jpeg_headers()`).
         """
+        if upright_mode not in ('reencode', 'exif'):
+            raise ValueError(f"upright_mode must be 'reencode' or 'exif', got {upright_mode}")
+
         self.non_final_chunk_flag = non_final_chunk_flag
         self.final_chunk_flag = final_chunk_flag
         self.upright = upright
         self.is_raw = is_raw
         self.quality = quality
         self.resolution = resolution
+        self.size_hint = size_hint
+        self.upright_mode = upright_mode
+        self.executor = executor
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.tagged = tagged
+        self.prime_msg_code = prime_msg_code
+
+        self.queue: Optional[RxQueue] = None
+        # reassembly buffer, reused between images; only the first _bytes_received bytes are valid
+        self._image_data = bytearray()
+        self._bytes_received: int = 0
+        self._first_byte_time: float = 0.0
+        # transferred size and timing of the most recently completed image, e.g. for measuring the link
+        self.last_image_size: int = 0
+        self.last_timing: Optional[PhotoTiming] = None
+        # region of interest to crop images to, with the resolution and pan they are captured at
+        self._roi: Optional[Tuple[CaptureRoi, int, int]] = None
+        # tagged images being reassembled by frame id, and their buffers for reuse once complete
+        self._tagged_frames: Dict[int, _TaggedFrame] = {}
+        self._free_buffers: List[bytearray] = []
+        # images are processed in order of arrival even when processing is offloaded
+        self._process_lock = asyncio.Lock()
+
+    @classmethod
+    def estimated_size(cls, quality: str, resolution: int) -> int:
+        """Estimate an upper bound on the size in bytes of a JPEG captured at the given quality and resolution"""
+        return int(resolution * resolution * cls._bytes_per_pixel.get(quality, 0.2)) + 1024
 
-        self.queue: Optional[asyncio.Queue] = None
-        self._image_data: List[int] = []
-        self._raw_offset: int = 0
+    @property
+    def expected_size(self) -> Optional[int]:
+        """The expected size in bytes of the image being received, if known from size_hint or quality and resolution"""
+        if self.size_hint is not None:
+            return self.size_hint
+        if self.quality is not None and self.resolution is not None:
+            return self.estimated_size(self.quality, self.resolution)
+        return None
+
+    @property
+    def bytes_received(self) -> int:
+        """Number of image bytes received so far for the image currently being assembled (in tagged mode, all of them)"""
+        if self.tagged:
+            return sum(frame.bytes_received for frame in self._tagged_frames.values())
+        return self._bytes_received
 
     @classmethod
     def has_jpeg_header(cls, quality: str, resolution: int) -> bool:
         """Check if we have a stored JPEG header for the given quality and resolution"""
         return f"{quality}_{resolution}" in cls._jpeg_header_map
 
-    def handle_data(self, data: bytes) -> None:
+    @classmethod
+    def use_jpeg_header_cache(cls, path: Union[str, Path]) -> int:
+        """
+        Load the JPEG headers saved in a cache file, if it exists and has the current format version, and save
+        headers to it from now on as they are learned, so that raw captures need no priming in later runs.
+
+        Returns:
+            The number of headers loaded
+        """
+        cls._jpeg_header_cache_path = Path(path)
+        try:
+            cache = json.loads(cls._jpeg_header_cache_path.read_text())
+        except (OSError, ValueError):
+            return 0
+
+        if not isinstance(cache, dict) or cache.get('version') != JPEG_HEADER_CACHE_VERSION:
+            _log.info(f"Ignoring JPEG header cache {path} with a different version")
+            return 0
+
+        loaded = 0
+        for key, encoded in cache.get('headers', {}).items():
+            header = base64.b64decode(encoded)
+            if len(header) == JPEG_HEADER_LENGTH and header.startswith(b'\xff\xd8'):
+                cls._jpeg_header_map.setdefault(key, header)
+                loaded += 1
+        return loaded
+
+    @classmethod
+    def _store_jpeg_header(cls, key: str, header: bytes) -> None:
+        """Store a newly learned JPEG header, and save the cache file if one is in use"""
+        cls._jpeg_header_map[key] = header
+        if cls._jpeg_header_cache_path is None:
+            return
+
+        cache = {
+            'version': JPEG_HEADER_CACHE_VERSION,
+            'headers': {k: base64.b64encode(v).decode('ascii') for k, v in cls._jpeg_header_map.items()},
+        }
+        try:
+            # write a temporary file and rename it so the cache is never left half-written
+            temp_path = cls._jpeg_header_cache_path.with_suffix('.tmp')
+            temp_path.write_text(json.dumps(cache))
+            os.replace(temp_path, cls._jpeg_header_cache_path)
+        except OSError as e:
+            _log.warning(f"Could not save JPEG header cache {cls._jpeg_header_cache_path}: {e}")
+
+    @classmethod
+    async def prime_jpeg_headers(
+        cls,
+        frame: FrameMsg,
+        combinations: Iterable[Tuple[str, int]],
+        capture_msg_code: int = 0x0d,
+        non_final_chunk_flag: int = 0x07,
+        final_chunk_flag: int = 0x08,
+        timeout: float = 10.0,
+    ) -> None:
+        """
+        Fetch the JPEG header for each (quality, resolution) combination that isn't cached yet, by requesting a full
+        JPEG capture with TxCaptureSettings on `capture_msg_code`, e.g. at startup for every combination the app uses.
+        Call `use_jpeg_header_cache()` first to load headers from, and save them to, disk.
+        No other RxPhoto should be attached while priming, since the priming images arrive on the same flags.
+        """
+        for quality, resolution in combinations:
+            if cls.has_jpeg_header(quality, resolution):
+                continue
+
+            rx_photo = cls(non_final_chunk_flag, final_chunk_flag, upright=False, quality=quality, resolution=resolution)
+            queue = await rx_photo.attach(frame)
+            try:
+                settings = TxCaptureSettings(resolution=resolution, quality_index=cls._quality_values.index(quality))
+                await frame.send_message(capture_msg_code, settings.pack())
+                await asyncio.wait_for(queue.get(), timeout)
+            finally:
+                rx_photo.detach(frame)
+
+    def handle_data(self, data: memoryview) -> None:
         """
         Process incoming chunks of image data.
 
         Args:
-            data: Bytes containing image chunk with flag byte prefix
+            data: Image chunk with flag byte prefix, only valid during the call
         """
         if not self.queue:
             _log.warning("Received data but queue not initialized - call start() first")
             return
 
+        if self.tagged:
+            self._handle_tagged_data(data)
+            return
+
         flag = data[0]
-        chunk = data[1:]
+        # a zero-copy slice of the notification, copied straight into the image buffer
+        chunk = memoryview(data)[1:]
+        if self._bytes_received == 0:
+            self._first_byte_time = time.time()
 
-        self._image_data.extend(chunk)
-        self._raw_offset += len(chunk)
+        # copy the chunk into the buffer in place, which only grows the buffer if it is beyond capacity
+        end = self._bytes_received + len(chunk)
+        self._image_data[self._bytes_received:end] = chunk
+        self._bytes_received = end
 
         if flag == self.final_chunk_flag:
-            # Process complete image
-            asyncio.create_task(self._process_complete_image())
+            self._bytes_received = 0
+            self.last_image_size = end
+            self.last_timing = PhotoTiming(None, self._first_byte_time, time.time())
 
-    async def _process_complete_image(self) -> None:
-        """Process and queue a complete image once all chunks are received"""
-        if self.is_raw:
-            # Prepend stored JPEG header for raw images
-            key = f"{self.quality}_{self.resolution}"
-            if key not in self._jpeg_header_map:
-                raise Exception(
-                    f"No JPEG header found for quality {self.quality} "
-                    f"and resolution {self.resolution} - request full JPEG first"
-                )
-            final_image = self._jpeg_header_map[key] + bytes(self._image_data)
+            # Take the complete image out of the buffer before the next image starts arriving
+            image = self._take_image(self._image_data, end)
+            if image is not None:
+                # Process complete image
+                asyncio.create_task(self._process_complete_image(image))
+
+    def _handle_tagged_data(self, data: memoryview) -> None:
+        """
+        Process a chunk tagged with a frame id: [flag, frame_id, data] for non-final chunks,
+        and [final flag, frame_id, capture time in ms (Uint16)] to complete the image.
+        """
+        flag = data[0]
+        frame_id = data[1]
+        now = time.time()
+
+        frame = self._tagged_frames.get(frame_id)
+        if frame is None:
+            buffer = self._free_buffers.pop() if self._free_buffers else bytearray(self.expected_size or 0)
+            frame = self._tagged_frames[frame_id] = _TaggedFrame(buffer, 0, now)
+
+        if flag == self.final_chunk_flag:
+            del self._tagged_frames[frame_id]
+            image = self._take_image(frame.buffer, frame.bytes_received)
+            self._free_buffers.append(frame.buffer)
+            capture_ms = data[2] << 8 | data[3] if len(data) >= 4 else 0
+            timing = PhotoTiming(capture_ms / 1000, frame.first_byte, now)
+            self.last_image_size = frame.bytes_received
+            self.last_timing = timing
+            if image is not None:
+                asyncio.create_task(self._process_complete_image(image, frame_id, timing))
         else:
-            final_image = bytes(self._image_data)
+            chunk = memoryview(data)[2:]
+            end = frame.bytes_received + len(chunk)
+            frame.buffer[frame.bytes_received:end] = chunk
+            frame.bytes_received = end
+
+    def _take_image(self, buffer: bytearray, end: int) -> Optional[bytes]:
+        """Copy a complete image out of a reassembly buffer, prepending the stored JPEG header for raw images"""
+        with memoryview(buffer) as view:
+            if self.is_raw:
+                # Prepend stored JPEG header for raw images
+                key = f"{self.quality}_{self.resolution}"
+                if key not in self._jpeg_header_map:
+                    _log.error(
+                        f"No JPEG header found for quality {self.quality} "
+                        f"and resolution {self.resolution} - request full JPEG first"
+                    )
+                    return None
+                return self._jpeg_header_map[key] + view[:end]
+            return bytes(view[:end])
+
+    async def _process_complete_image(self, final_image: bytes, frame_id: Optional[int] = None,
+                                      timing: Optional[PhotoTiming] = None) -> None:
+        """Process and queue a complete image once all chunks are received"""
+        if not self.is_raw:
             # Store JPEG header for future raw images
             if self.quality is not None and self.resolution is not None:
                 key = f"{self.quality}_{self.resolution}"
                 if key not in self._jpeg_header_map:
-                    self._jpeg_header_map[key] = final_image[:623]
+                    self._store_jpeg_header(key, final_image[:JPEG_HEADER_LENGTH])
+
+        roi = self._roi
+
+        async with self._process_lock:
+            if roi is not None:
+                # decode, make upright and crop in one pass, off the event loop
+                box = roi[0].crop_box(roi[1], roi[2])
+                cropped = await asyncio.get_running_loop().run_in_executor(
+                    self.executor, self._crop_image, final_image, box, self.upright)
+                final_image = RoiPhoto(cropped, roi[0], box, roi[1], roi[2])
+            elif self.upright:
+                if self.upright_mode == 'exif':
+                    final_image = self._add_exif_orientation(final_image)
+                else:
+                    # decoding and re-encoding is CPU-bound so keep it off the event loop
+                    final_image = await asyncio.get_running_loop().run_in_executor(
+                        self.executor, self._rotate_upright, final_image)
+
+            if self.queue:
+                self.queue.deliver(final_image if frame_id is None else TaggedPhoto(frame_id, final_image, timing))
+
+    def expect_roi(self, roi: Optional[CaptureRoi], settings: Optional[TxCaptureSettings] = None) -> None:
+        """
+        Crop the images received from now on to a region of interest, given the settings they are captured with
+        (usually `roi.capture_settings()`), and queue them as `RoiPhoto`s with the crop box (the `image` of a
+        `TaggedPhoto` in tagged mode). Cropped images are always rotated upright by re-encoding if `upright` is set.
+        Pass None to go back to whole images.
+        """
+        if roi is None:
+            self._roi = None
+            return
 
-        if self.upright:
-            # Rotate image -90 degrees (or 90 degrees counterclockwise, in PIL)
-            img = Image.open(io.BytesIO(final_image))
+        settings = settings if settings is not None else roi.capture_settings()
+        self._roi = (roi, settings.resolution, settings.pan)
+        if self.is_raw:
+            self.resolution = settings.resolution
+
+    @staticmethod
+    def _crop_image(image: bytes, box: Tuple[int, int, int, int], upright: bool) -> bytes:
+        """Decode the image, rotate it upright if requested, crop it to box and re-encode it"""
+        img = Image.open(io.BytesIO(image))
+        if upright:
             img = img.transpose(Image.ROTATE_90)
-            output = io.BytesIO()
-            img.save(output, format='JPEG')
-            final_image = output.getvalue()
+        img = img.crop(box)
+        output = io.BytesIO()
+        img.save(output, format='JPEG')
+        return output.getvalue()
 
-        await self.queue.put(final_image)
+    @staticmethod
+    def _rotate_upright(image: bytes) -> bytes:
+        """Rotate image -90 degrees (or 90 degrees counterclockwise, in PIL) and re-encode it"""
+        img = Image.open(io.BytesIO(image))
+        img = img.transpose(Image.ROTATE_90)
+        output = io.BytesIO()
+        img.save(output, format='JPEG')
+        return output.getvalue()
 
-        # Reset state
-        self._image_data.clear()
-        self._raw_offset = 0
+    @staticmethod
+    def _add_exif_orientation(image: bytes) -> bytes:
+        """
+        Insert an EXIF APP1 segment with Orientation 8 (rotate 90 degrees counterclockwise to display)
+        after the SOI marker and any JFIF APP0 segment, leaving the compressed image data untouched.
+        """
+        # big-endian TIFF header with a single IFD entry: Orientation (0x0112), SHORT, count 1, value 8
+        exif = (b'Exif\x00\x00' + b'MM\x00\x2a' + struct.pack('>I', 8)
+                + struct.pack('>H', 1) + struct.pack('>HHIHH', 0x0112, 3, 1, 8, 0) + struct.pack('>I', 0))
+        segment = b'\xff\xe1' + struct.pack('>H', len(exif) + 2) + exif
 
-    async def attach(self, frame: FrameMsg) -> asyncio.Queue:
+        insert_at = 2
+        if image[2:4] == b'\xff\xe0':
+            insert_at = 4 + (image[4] << 8 | image[5])
+
+        return image[:insert_at] + segment + image[insert_at:]
+
+    async def attach(self, frame: FrameMsg) -> RxQueue:
         """
         Attach the photo handler to the Frame data response and return a queue that will receive complete images.
 
         Returns:
-            asyncio.Queue that will receive bytes containing complete JPEG images
+            RxQueue that will receive bytes containing complete JPEG images (`TaggedPhoto`s in tagged mode)
         """
         if self.is_raw and (self.quality is None or self.resolution is None):
             raise ValueError("Quality and resolution required when handling raw images")
 
-        self.queue = asyncio.Queue()
-        self._image_data = []
-        self._raw_offset = 0
+        if self.is_raw and self.prime_msg_code is not None:
+            await self.prime_jpeg_headers(frame, [(self.quality, self.resolution)], self.prime_msg_code,
+                                          self.non_final_chunk_flag, self.final_chunk_flag)
 
-        if self.is_raw:
-            # Pre-populate image data with stored JPEG header
-            key = f"{self.quality}_{self.resolution}"
-            if key in self._jpeg_header_map:
-                self._image_data.extend(self._jpeg_header_map[key])
+        self.queue = RxQueue(self.queue_size, self.overflow)
+        # preallocate the reassembly buffer to the expected image size
+        self._image_data = bytearray(self.expected_size or 0)
+        self._bytes_received = 0
+        self._tagged_frames = {}
+        self._free_buffers = []
 
         # subscribe for notifications
         frame.register_data_response_handler(self, [self.non_final_chunk_flag, self.final_chunk_flag], self.handle_data)
@@ -131,5 +446,5 @@ class RxPhoto:
         """Detach the photo handler from the Frame data response and clean up resources"""
         frame.unregister_data_response_handler(self)
         self.queue = None
-        self._image_data.clear()
-        self._raw_offset = 0
\ No newline at end of file
+        self._image_data = bytearray()
+        self._bytes_received = 0
\ No newline at end of file
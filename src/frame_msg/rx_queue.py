@@ -0,0 +1,83 @@
+import asyncio
+from collections import deque
+from typing import Any, List, Optional
+
+OVERFLOW_POLICIES = ('block', 'drop_oldest', 'drop_newest')
+
+class RxQueue(asyncio.Queue):
+    """
+    The queue returned by the Rx classes' `attach()`. BLE notifications are handled synchronously,
+    so Rx handlers add items with `deliver()` rather than creating a Task per `put()`, which keeps
+    items in arrival order and is much cheaper at high notification rates.
+
+    When `maxsize` is reached, the `overflow` policy decides what happens to a new item:
+    - 'block': nothing is lost; the item waits in an overflow buffer, in order, until `get()` makes room
+      (a BLE callback can't wait, so this bounds the queue but not the memory used)
+    - 'drop_oldest': the oldest queued item is discarded to make room, e.g. for sensor data where only recent samples matter
+    - 'drop_newest': the new item is discarded
+    Discarded items are counted in `dropped`.
+
+    With `batch` set, the items delivered during one event loop iteration are queued together
+    as a single list, so a consumer handles a burst of samples per `get()`.
+    """
+    def __init__(self, maxsize: int = 0, overflow: str = 'block', batch: bool = False):
+        """
+        Args:
+            maxsize: The number of items (or batches) the queue holds before the overflow policy applies.
+                0 (default) means unbounded.
+            overflow: 'block' (default), 'drop_oldest' or 'drop_newest'
+            batch: If True, queue the items delivered in each event loop iteration as one list
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}, not {overflow!r}")
+        super().__init__(maxsize)
+        self.overflow = overflow
+        self.batch = batch
+        self.dropped = 0
+        self._overflow_items = deque()
+        self._batch_items: Optional[List[Any]] = None
+
+    def deliver(self, item: Any, batch: bool = True) -> None:
+        """
+        Add an item to the queue without waiting, applying the overflow policy if it is full.
+        In batch mode the item joins the current batch, unless `batch` is False, e.g. for an end of stream
+        marker, in which case the current batch is queued first and the item is queued on its own.
+        """
+        if self.batch:
+            if batch:
+                if self._batch_items is None:
+                    self._batch_items = []
+                    asyncio.get_running_loop().call_soon(self.flush)
+                self._batch_items.append(item)
+                return
+            self.flush()
+
+        self._put_item(item)
+
+    def flush(self) -> None:
+        """Queue the current batch now, rather than at the end of this event loop iteration"""
+        if self._batch_items:
+            self._put_item(self._batch_items)
+        self._batch_items = None
+
+    def get_nowait(self) -> Any:
+        item = super().get_nowait()
+        # get() also returns through get_nowait(), so this is where blocked items move up
+        if self._overflow_items:
+            super().put_nowait(self._overflow_items.popleft())
+        return item
+
+    def _put_item(self, item: Any) -> None:
+        if not self.full():
+            if self._overflow_items:
+                self._overflow_items.append(item)
+            else:
+                self.put_nowait(item)
+        elif self.overflow == 'block':
+            self._overflow_items.append(item)
+        elif self.overflow == 'drop_oldest':
+            super().get_nowait()
+            self.dropped += 1
+            self.put_nowait(item)
+        else:
+            self.dropped += 1
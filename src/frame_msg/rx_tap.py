@@ -40,7 +40,7 @@ class RxTap:
         except asyncio.CancelledError:
             pass
 
-    def handle_data(self, data: bytes) -> None:
+    def handle_data(self, data: memoryview) -> None:
         """
         Process an incoming Tap message
 
@@ -0,0 +1,585 @@
+import asyncio
+import math
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import lz4.frame
+
+@dataclass
+class CompressionStats:
+    """
+    Totals for the messages sent on one msg_code by a SendScheduler with compression enabled.
+
+    Attributes:
+        messages: Messages sent
+        compressed_messages: Messages sent compressed, because compressing them saved at least one packet
+        payload_bytes: Payload bytes before compression
+        sent_bytes: Payload bytes sent, after compression where it was used
+    """
+    messages: int = 0
+    compressed_messages: int = 0
+    payload_bytes: int = 0
+    sent_bytes: int = 0
+
+    @property
+    def ratio(self) -> float:
+        """Bytes sent as a fraction of the payload bytes (1.0 if nothing was saved)"""
+        return self.sent_bytes / self.payload_bytes if self.payload_bytes else 1.0
+
+class _QueuedMessage:
+    """A message waiting in a SendScheduler priority queue"""
+    def __init__(self, msg_code: int, payload: bytes, priority: int, coalesce: bool, show_me: bool, future: asyncio.Future):
+        self.msg_code = msg_code
+        self.payload = payload
+        self.priority = priority
+        self.coalesce = coalesce
+        self.show_me = show_me
+        # resolves to True once sent, or False if dropped (superseded or past its deadline)
+        self.future = future
+        self.expiry: Optional[asyncio.TimerHandle] = None
+
+class _WindowedTransfer:
+    """
+    The state of a message being sent with the windowed (extended) framing,
+    updated by the cumulative ACKs and NACKs from data.lua.
+    """
+    def __init__(self, message: _QueuedMessage, transfer_id: int, packets: List[bytes], started: float):
+        self.message = message
+        self.msg_code = message.msg_code
+        self.priority = message.priority
+        self.transfer_id = transfer_id
+        self.num_packets = len(packets)
+        # retransmit buffer: packets not yet acknowledged (acknowledged packets are released as None)
+        self.packets: List[Optional[bytes]] = packets
+        # sequence number of the last packet acknowledged in order, -1 for none
+        self.acked = -1
+        # sequence numbers requested again by a NACK, in the order requested
+        self.resend: List[int] = []
+        # next new (or after a go-back-N, resent) sequence number to send, and one past the highest sent so far
+        self.next_seq = 0
+        self.sent_high = 0
+        # loop time each packet was first sent, for RTT sampling; None once a packet has been resent
+        self.sent_at: List[Optional[float]] = [None] * self.num_packets
+        # loop time of the last packet sent or acknowledgement received, for the retransmit timeout
+        self.last_activity = started
+        # consecutive retransmit timeouts without progress
+        self.timeouts = 0
+
+    def pending_seq(self, window: int) -> Optional[int]:
+        """The sequence number of the next packet to send, if any: NACKed packets first, then new packets within the window"""
+        while self.resend:
+            seq = self.resend[0]
+            if self.acked < seq < self.next_seq:
+                return seq
+            self.resend.pop(0)
+
+        # packets resent after a go-back-N may be acknowledged while earlier ones are being resent
+        self.next_seq = max(self.next_seq, self.acked + 1)
+        if self.next_seq < self.num_packets and self.next_seq <= self.acked + window:
+            return self.next_seq
+        return None
+
+    def mark_sent(self, seq: int, now: float) -> bool:
+        """Record that the packet returned by pending_seq() has been sent. Returns True if it was sent before."""
+        self.last_activity = now
+        if self.resend and self.resend[0] == seq:
+            self.resend.pop(0)
+            self.sent_at[seq] = None
+            return True
+
+        # Karn's algorithm: only sample the round trip time of packets sent once
+        resent = seq < self.sent_high
+        self.sent_at[seq] = None if resent else now
+        self.next_seq = seq + 1
+        self.sent_high = max(self.sent_high, self.next_seq)
+        return resent
+
+    def in_flight(self) -> bool:
+        """True if packets have been sent that are not yet acknowledged"""
+        return self.next_seq > self.acked + 1 or bool(self.resend)
+
+    def unacked(self) -> int:
+        """The number of packets sent that are not yet acknowledged"""
+        return max(0, self.next_seq - self.acked - 1)
+
+class SendScheduler:
+    """
+    Sends messages to Frame from a single writer task that drains per-priority queues, so that
+    concurrent senders don't race on the link and urgent messages aren't stuck behind stale ones.
+    `FrameMsg` creates one as `FrameMsg.scheduler`, and `FrameMsg.send_message()` and `FrameMsg.queue_message()` use it.
+
+    Messages are taken highest priority first, then in order of arrival. A queued message can be
+    superseded by a newer message with the same msg_code (`coalesce=True`), can be given a deadline
+    after which it is dropped if it hasn't started sending, and can be cancelled by cancelling its future.
+    The queue can be bounded (`max_queue_size`) so that producers wait for room, and `drain()` waits
+    until everything queued has been sent.
+
+    With the legacy framing each message is sent whole, waiting for an ACK after every packet.
+    With `windowed` sending the writer keeps up to `current_window_size()` packets in flight
+    using the extended framing in data.lua, resending packets that Frame reports missing with a NACK,
+    or after the last acknowledged packet if acknowledgements stop advancing. Payloads can also be lz4 compressed (`compress`)
+    whenever that reduces the number of packets to send, and data.lua inflates them before they are parsed. Up to
+    MAX_TRANSFERS messages can be in flight at once, sharing the window: each packet sent is the next one from the
+    highest priority message that has one ready, and a queued message starts while another is in flight only if it has
+    a strictly higher priority than every message in flight, so a short high priority message overtakes a bulk transfer
+    in progress while messages of the same priority are still sent (and completed) in the order they were queued.
+    """
+    # consecutive retransmission timeouts without progress before a windowed send gives up
+    MAX_RETRANSMITS = 5
+    # windowed messages in flight at once, each of which data.lua buffers separately
+    # (well within the 64 message ids per msg_code that data.lua keeps streams for)
+    MAX_TRANSFERS = 4
+
+    def __init__(self, ble: Any, windowed: bool = False, window_size: Optional[int] = None,
+                 max_window_size: int = 32, max_queue_size: int = 0, compress: bool = False, compress_threshold: int = 128):
+        """
+        Args:
+            ble: The transport (e.g. FrameBle or SimFrameBle) to send packets with
+            windowed: Use the windowed extended framing (requires the data.lua from this version of the package)
+            window_size: The number of unacknowledged packets allowed in flight when `windowed` is set.
+                If None (default), the window adapts to the observed round trip time.
+            max_window_size: Upper limit for the adaptive window size
+            max_queue_size: The number of messages that can be queued before `queue_message()` waits for room.
+                0 (default) means unbounded.
+            compress: Try lz4 compression on payloads of at least `compress_threshold` bytes, and send them compressed
+                if that saves at least one packet. Requires `windowed`, since only the extended framing can flag it.
+            compress_threshold: The smallest payload worth trying to compress
+        """
+        if compress and not windowed:
+            raise ValueError("compress requires windowed sending")
+
+        self.ble = ble
+        self.windowed = windowed
+        self.window_size = window_size
+        self.max_window_size = max_window_size
+        self.max_queue_size = max_queue_size
+        self.compress = compress
+        self.compress_threshold = compress_threshold
+        # packets sent again after a NACK or a retransmit timeout
+        self.retransmitted_packets = 0
+        # compression totals by msg_code, if compression is enabled
+        self.compression_stats: Dict[int, CompressionStats] = {}
+
+        self._queues: Dict[int, Deque[_QueuedMessage]] = {}
+        self._queued = 0
+        # windowed transfers in progress by (msg_code, message id), in the order they started,
+        # and the next message id to use by msg_code
+        self._transfers: Dict[Tuple[int, int], _WindowedTransfer] = {}
+        # (msg_code, message id) of recently finished transfers, whose late ACKs are still ours to swallow
+        self._finished: Deque[Tuple[int, int]] = deque(maxlen=64)
+        self._next_transfer_id: Dict[int, int] = {}
+        # smoothed round trip time from a packet write to its ACK, and smoothed time taken to write one packet
+        self._srtt: Optional[float] = None
+        self._send_interval: Optional[float] = None
+
+        self._writer: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._room = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def queued(self) -> int:
+        """The number of messages waiting to be sent"""
+        return self._queued
+
+    def current_window_size(self) -> int:
+        """
+        The number of packets windowed sending keeps in flight, across all messages: the fixed `window_size` if set,
+        otherwise enough packets to cover the observed round trip time (the bandwidth-delay product)
+        plus one, up to `max_window_size`.
+        """
+        if self.window_size is not None:
+            return max(1, self.window_size)
+
+        if self._srtt is None or not self._send_interval:
+            return min(4, self.max_window_size)
+
+        return max(1, min(self.max_window_size, math.ceil(self._srtt / self._send_interval) + 1))
+
+    def _retransmit_timeout(self) -> float:
+        """How long to wait for the acknowledged sequence number to advance before resending"""
+        if self._srtt is None:
+            return 1.0
+        return min(5.0, max(0.25, 4 * self._srtt))
+
+    async def queue_message(self, msg_code: int, payload: bytes, priority: int = 0, coalesce: bool = False,
+                            deadline: Optional[float] = None, show_me: bool = False) -> asyncio.Future:
+        """
+        Queue a message to be sent, waiting for room in the queue if `max_queue_size` is reached.
+
+        Args:
+            msg_code: The message code the Frameside app expects the message on
+            payload: The message payload
+            priority: Higher priority messages are sent first
+            coalesce: If True, replaces any queued (not yet started) message with the same msg_code that was also queued
+                with `coalesce=True`, e.g. so that only the latest settings or display update is sent
+            deadline: Seconds from now after which the message is dropped if it hasn't started sending
+            show_me: Print the packets as they are sent
+
+        Returns:
+            A future that resolves to True once the message has been sent (and with windowed sending, acknowledged),
+            or False if it was dropped because it was superseded or its deadline passed. Cancelling the future
+            removes the message from the queue, or abandons a windowed transfer in progress.
+        """
+        if not 0 <= msg_code <= 255:
+            raise ValueError(f"Message code must be 0-255, got {msg_code}")
+
+        max_size = self._max_payload_size()
+        if len(payload) > max_size:
+            raise ValueError(f"Payload size {len(payload)} exceeds maximum {max_size} bytes")
+
+        loop = asyncio.get_running_loop()
+        message = _QueuedMessage(msg_code, payload, priority, coalesce, show_me, loop.create_future())
+
+        superseded = self._find_coalescable(message) if coalesce else None
+        if superseded is not None:
+            # take the superseded message's place in the queue, if it has the same priority
+            queue = self._queues[superseded.priority]
+            if superseded.priority == priority:
+                queue[queue.index(superseded)] = message
+            else:
+                queue.remove(superseded)
+                self._queues.setdefault(priority, deque()).append(message)
+            self._settle(superseded, False)
+        else:
+            while self.max_queue_size > 0 and self._queued >= self.max_queue_size:
+                self._room.clear()
+                await self._room.wait()
+            self._queues.setdefault(priority, deque()).append(message)
+            self._queued += 1
+
+        if deadline is not None:
+            message.expiry = loop.call_later(deadline, self._expire, message)
+        message.future.add_done_callback(lambda _: self._on_done(message))
+
+        self._idle.clear()
+        self._ensure_writer()
+        self._wakeup.set()
+        return message.future
+
+    async def send_message(self, msg_code: int, payload: bytes, priority: int = 0, coalesce: bool = False,
+                           deadline: Optional[float] = None, show_me: bool = False) -> bool:
+        """
+        Queue a message and wait until it has been sent (see `queue_message()` for the arguments).
+        Returns True once sent, or False if it was dropped because it was superseded or its deadline passed.
+        Cancelling the calling task cancels the message.
+        """
+        future = await self.queue_message(msg_code, payload, priority, coalesce, deadline, show_me)
+        return await future
+
+    async def drain(self) -> None:
+        """Wait until all queued messages have been sent (or dropped)"""
+        await self._idle.wait()
+
+    async def close(self) -> None:
+        """Stop the writer task and cancel all queued and in progress messages"""
+        if self._writer is not None:
+            writer, self._writer = self._writer, None
+            writer.cancel()
+            await asyncio.wait([writer])
+
+        for queue in list(self._queues.values()):
+            for message in list(queue):
+                message.future.cancel()
+        for transfer in list(self._transfers.values()):
+            transfer.message.future.cancel()
+
+    def _owns_response(self, data: bytes) -> bool:
+        """Whether an ACK or NACK refers to a windowed transfer in progress or recently finished"""
+        key = (data[1], data[2])
+        return key in self._transfers or key in self._finished
+
+    def handle_ack(self, data: bytes) -> bool:
+        """
+        Handle a cumulative ACK from the extended framing in data.lua:
+        0x00, msg_code, message id, sequence number (Uint16)
+
+        Returns:
+            True if the ACK was for a windowed transfer (in progress or recently finished), False if it isn't an ACK of ours
+        """
+        if not self.windowed or len(data) < 5 or not self._owns_response(data):
+            return False
+
+        transfer = self._transfers.get((data[1], data[2]))
+        if transfer is None:
+            return True
+
+        seq = data[3] << 8 | data[4]
+        if seq <= transfer.acked or seq >= transfer.num_packets:
+            return
+
+        loop = asyncio.get_running_loop()
+        sent_at = transfer.sent_at[seq]
+        if sent_at is not None:
+            rtt = loop.time() - sent_at
+            self._srtt = rtt if self._srtt is None else 0.875 * self._srtt + 0.125 * rtt
+
+        # release the acknowledged packets from the retransmit buffer
+        for acked_seq in range(transfer.acked + 1, seq + 1):
+            transfer.packets[acked_seq] = None
+        transfer.acked = seq
+        transfer.timeouts = 0
+        transfer.last_activity = loop.time()
+
+        if transfer.acked == transfer.num_packets - 1:
+            self._settle(transfer.message, True)
+        self._wakeup.set()
+        return True
+
+    def handle_nack(self, data: bytes) -> bool:
+        """
+        Handle a request from data.lua to resend the packets missing from a gap in a windowed transfer:
+        0x01, msg_code, message id, first missing sequence number (Uint16), last missing sequence number (Uint16)
+
+        Returns:
+            True if the NACK was for a windowed transfer (in progress or recently finished), False if it isn't a NACK of ours
+        """
+        if not self.windowed or len(data) < 7 or not self._owns_response(data):
+            return False
+
+        transfer = self._transfers.get((data[1], data[2]))
+        if transfer is None:
+            return True
+
+        first = max(data[3] << 8 | data[4], transfer.acked + 1)
+        last = min(data[5] << 8 | data[6], transfer.num_packets - 1)
+        transfer.resend.extend(range(first, last + 1))
+        self._wakeup.set()
+        return True
+
+    def _max_payload_size(self) -> int:
+        if not self.windowed:
+            # data.lua takes a packet starting 0xFF after the msg_code for the extended framing,
+            # so a legacy length (in the first packet) can't start 0xFF
+            return 0xFEFF
+        # sequence numbers are Uint16
+        max_payload = self.ble.max_data_payload()
+        return max_payload - 9 + 65535 * (max_payload - 5)
+
+    def _find_coalescable(self, message: _QueuedMessage) -> Optional[_QueuedMessage]:
+        for queue in self._queues.values():
+            for queued in queue:
+                if queued.coalesce and queued.msg_code == message.msg_code:
+                    return queued
+        return None
+
+    def _settle(self, message: _QueuedMessage, result: bool) -> None:
+        if not message.future.done():
+            message.future.set_result(result)
+
+    def _expire(self, message: _QueuedMessage) -> None:
+        """Drop a message whose deadline has passed, if it is still queued"""
+        message.expiry = None
+        queue = self._queues.get(message.priority)
+        if queue is not None and message in queue:
+            self._settle(message, False)
+
+    def _on_done(self, message: _QueuedMessage) -> None:
+        """Remove a message from the queue or from the transfers in flight once its future is done, for whatever reason"""
+        if message.expiry is not None:
+            message.expiry.cancel()
+            message.expiry = None
+
+        queue = self._queues.get(message.priority)
+        if queue is not None and message in queue:
+            queue.remove(message)
+            self._dequeued()
+
+        for key, transfer in list(self._transfers.items()):
+            if transfer.message is message:
+                del self._transfers[key]
+                self._finished.append(key)
+
+        self._wakeup.set()
+
+    def _dequeued(self) -> None:
+        self._queued -= 1
+        self._room.set()
+
+    def _pop_queued(self, above: Optional[int] = None) -> Optional[_QueuedMessage]:
+        """Take the first message from the highest priority non-empty queue, if its priority is above `above`"""
+        while True:
+            priorities = [priority for priority, queue in self._queues.items() if queue]
+            if not priorities:
+                return None
+
+            priority = max(priorities)
+            if above is not None and priority <= above:
+                return None
+
+            message = self._queues[priority].popleft()
+            self._dequeued()
+            if message.expiry is not None:
+                message.expiry.cancel()
+                message.expiry = None
+            # skip messages dropped or cancelled since their done callback was scheduled
+            if not message.future.done():
+                return message
+
+    def _ensure_writer(self) -> None:
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        """The writer task: the only sender of data packets while messages are queued"""
+        loop = asyncio.get_running_loop()
+        while True:
+            self._wakeup.clear()
+            timeout = None
+
+            if self.windowed:
+                timeout = self._check_timeouts(loop.time())
+                if await self._send_next_packet(loop):
+                    continue
+            else:
+                message = self._pop_queued()
+                if message is not None:
+                    await self._send_whole(message)
+                    continue
+
+            if self._queued == 0 and not self._transfers:
+                self._idle.set()
+
+            # (a timer rather than wait_for(), which can swallow the cancellation that stops the writer)
+            timer = loop.call_later(timeout, self._wakeup.set) if timeout is not None else None
+            try:
+                await self._wakeup.wait()
+            finally:
+                if timer is not None:
+                    timer.cancel()
+
+    async def _send_whole(self, message: _QueuedMessage) -> None:
+        """Send a message with the legacy framing, waiting for an ACK after each packet"""
+        try:
+            await self.ble.send_message(message.msg_code, message.payload, message.show_me)
+            self._settle(message, True)
+        except Exception as e:
+            if not message.future.done():
+                message.future.set_exception(e)
+
+    async def _send_next_packet(self, loop: asyncio.AbstractEventLoop) -> bool:
+        """Send the next packet of the highest priority windowed transfer that has one ready. Returns False if none are ready."""
+        window = self.current_window_size()
+        # the window is shared by all the transfers in flight: NACKed packets can always be resent, new packets need room
+        room = window - sum(transfer.unacked() for transfer in self._transfers.values())
+        candidate: Optional[_WindowedTransfer] = None
+        seq: Optional[int] = None
+        for transfer in self._transfers.values():
+            if candidate is not None and transfer.priority <= candidate.priority:
+                continue
+            transfer_seq = transfer.pending_seq(window)
+            if transfer_seq is not None and (room > 0 or transfer_seq < transfer.next_seq):
+                candidate, seq = transfer, transfer_seq
+
+        # start the next queued message if nothing is in flight, or if it outranks everything in flight and there's room
+        if not self._transfers:
+            message = self._pop_queued()
+        elif len(self._transfers) < self.MAX_TRANSFERS and room > 0:
+            message = self._pop_queued(above=max(transfer.priority for transfer in self._transfers.values()))
+        else:
+            message = None
+        if message is not None:
+            candidate = self._start_transfer(message, loop.time())
+            seq = 0
+
+        if candidate is None:
+            return False
+
+        packet = candidate.packets[seq]
+        if candidate.mark_sent(seq, loop.time()):
+            self.retransmitted_packets += 1
+
+        started = loop.time()
+        try:
+            await self.ble.send_data(packet, show_me=candidate.message.show_me)
+        except Exception as e:
+            if not candidate.message.future.done():
+                candidate.message.future.set_exception(e)
+            return True
+
+        interval = loop.time() - started
+        self._send_interval = interval if self._send_interval is None else 0.875 * self._send_interval + 0.125 * interval
+        return True
+
+    def _start_transfer(self, message: _QueuedMessage, now: float) -> _WindowedTransfer:
+        """Split a message into packets using the extended framing and add it to the transfers in flight"""
+        msg_code = message.msg_code
+        payload = message.payload
+        max_payload = self.ble.max_data_payload()
+
+        # message ids are allocated in sequence for each msg_code, and data.lua relies on it to reuse them:
+        # starting a message forgets the one 64 ids behind, which MAX_TRANSFERS keeps long finished
+        transfer_id = self._next_transfer_id.get(msg_code, 0)
+        self._next_transfer_id[msg_code] = (transfer_id + 1) % 255
+
+        compressed_size = b''
+        if self.compress:
+            stats = self.compression_stats.setdefault(msg_code, CompressionStats())
+            stats.messages += 1
+            stats.payload_bytes += len(payload)
+            if len(payload) >= self.compress_threshold:
+                compressed = lz4.frame.compress(payload)
+                # only worth it if it saves airtime, i.e. at least one packet (Frame also has to inflate it)
+                if self._packet_count(len(compressed), max_payload, True) < self._packet_count(len(payload), max_payload, False):
+                    compressed_size = len(payload).to_bytes(4, 'big')
+                    payload = compressed
+                    stats.compressed_messages += 1
+            stats.sent_bytes += len(payload)
+
+        # first packet: msg_code, 0xFFFF in place of the legacy length, flags, message id, length (Uint16, or Uint32 with flag 0x01),
+        # uncompressed length (Uint32, only with flag 0x02 for lz4 compressed messages)
+        # subsequent packets: msg_code, 0xFF, message id, sequence number (Uint16)
+        total_size = len(payload)
+        flags = 0x02 if compressed_size else 0x00
+        if total_size > 65535:
+            header = bytes([msg_code, 0xFF, 0xFF, flags | 0x01, transfer_id]) + total_size.to_bytes(4, 'big') + compressed_size
+        else:
+            header = bytes([msg_code, 0xFF, 0xFF, flags, transfer_id]) + total_size.to_bytes(2, 'big') + compressed_size
+        first_chunk_size = max_payload - len(header)
+        chunk_size = max_payload - 5
+        packets = [header + payload[:first_chunk_size]]
+        for seq, offset in enumerate(range(first_chunk_size, total_size, chunk_size), start=1):
+            packets.append(bytes([msg_code, 0xFF, transfer_id, seq >> 8, seq & 0xFF]) + payload[offset:offset + chunk_size])
+
+        transfer = _WindowedTransfer(message, transfer_id, packets, now)
+        self._transfers[(msg_code, transfer_id)] = transfer
+        return transfer
+
+    @staticmethod
+    def _packet_count(size: int, max_payload: int, compressed: bool) -> int:
+        """The number of packets needed to send a payload of `size` bytes with the extended framing"""
+        header_len = (9 if size > 65535 else 7) + (4 if compressed else 0)
+        remaining = max(0, size - (max_payload - header_len))
+        return 1 + math.ceil(remaining / (max_payload - 5))
+
+    def _check_timeouts(self, now: float) -> Optional[float]:
+        """
+        Go back N on any transfer whose acknowledgements have stopped advancing, failing it after MAX_RETRANSMITS attempts.
+        Returns the time until the next retransmit timeout is due, if any transfer has packets in flight.
+        """
+        rto = self._retransmit_timeout()
+        next_due = None
+        for transfer in list(self._transfers.values()):
+            if not transfer.in_flight():
+                continue
+
+            due = transfer.last_activity + rto - now
+            if due <= 0:
+                transfer.timeouts += 1
+                if transfer.timeouts > self.MAX_RETRANSMITS:
+                    if not transfer.message.future.done():
+                        transfer.message.future.set_exception(Exception("device didn't respond"))
+                    continue
+
+                # go back N: resend everything after the last packet acknowledged in order
+                for seq in range(transfer.acked + 1, transfer.next_seq):
+                    transfer.sent_at[seq] = None
+                transfer.next_seq = transfer.acked + 1
+                transfer.resend.clear()
+                transfer.last_activity = now
+                due = rto
+
+            next_due = due if next_due is None else min(next_due, due)
+        return next_due
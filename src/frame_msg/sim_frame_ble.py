@@ -0,0 +1,453 @@
+import asyncio
+import logging
+import random
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import lz4.frame
+
+logging.basicConfig()
+_log = logging.getLogger("SimFrameBle")
+
+@dataclass
+class SimLinkStats:
+    """
+    Counters for traffic over the simulated link.
+
+    Attributes:
+        packets_sent: Data packets written by the host (including dropped packets)
+        bytes_sent: Data bytes written by the host (including dropped packets)
+        packets_dropped: Host-to-Frame data packets discarded by the drop model
+        acks_sent: Acknowledgement (and NACK) notifications sent by the simulated data accumulator
+        notifications: Data notifications sent from the simulated Frame to the host
+        bytes_received: Data bytes received by the host in notifications
+        messages_received: Complete messages assembled by the simulated data accumulator
+    """
+    packets_sent: int = 0
+    bytes_sent: int = 0
+    packets_dropped: int = 0
+    acks_sent: int = 0
+    notifications: int = 0
+    bytes_received: int = 0
+    messages_received: int = 0
+
+class SimFrameBle:
+    """
+    An in-process simulated Frame that can be passed to `FrameMsg(ble=...)` in place of a real FrameBle
+    connection, for load testing and benchmarking message throughput without Frame hardware.
+
+    The simulated Frame runs the equivalent of `data.lua`'s `update_app_data_accum` on every data packet:
+    messages are accumulated per msg_code, a receiver-paced ACK byte (or for the extended framing used by
+    windowed sends, a cumulative ACK with the message id and sequence number, plus a NACK for any gap) is sent back for every packet,
+    and complete messages are recorded in `messages` and passed to `message_handler`, if set.
+    Frame-to-host traffic (e.g. photo or audio chunks) can be injected with `notify()` and `send_chunked()`.
+
+    Timing model: each host write completes after `latency` (plus up to `jitter`) seconds and writes are
+    serialized on the link, as with a BLE write-with-response. Delivered packets are then processed in order
+    by the simulated Lua data handler, taking `process_time` each. Notifications from Frame arrive in order
+    after the same one-way latency. All delays are multiplied by `time_scale`; a `time_scale` of 0 makes
+    the link as fast as the event loop allows while preserving ordering.
+
+    Args:
+        mtu: Negotiated BLE MTU, which determines `max_data_payload()` and `max_lua_payload()`
+        latency: One-way per-packet latency in seconds
+        jitter: Maximum additional random latency in seconds per packet
+        drop_rate: Probability (0.0-1.0) that a host-to-Frame data packet is lost before it reaches the accumulator
+        process_time: Time in seconds the simulated Lua data handler takes to process each packet before it ACKs
+        ack_timeout: Seconds to wait for a data response when `send_data(await_data=True)` is used
+        time_scale: Multiplier applied to all simulated delays
+        seed: Optional seed for the drop and jitter random number generator
+    """
+    def __init__(
+        self,
+        mtu: int = 247,
+        latency: float = 0.0075,
+        jitter: float = 0.0,
+        drop_rate: float = 0.0,
+        process_time: float = 0.0,
+        ack_timeout: float = 5.0,
+        time_scale: float = 1.0,
+        seed: Optional[int] = None,
+    ):
+        self.mtu = mtu
+        self.latency = latency
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.process_time = process_time
+        self.ack_timeout = ack_timeout
+        self.time_scale = time_scale
+
+        self.stats = SimLinkStats()
+        # complete messages received by the simulated Frame, in order of completion
+        self.messages: List[Tuple[int, bytes]] = []
+        # optional callback for each complete message: message_handler(msg_code, payload)
+        self.message_handler: Optional[Callable[[int, bytes], None]] = None
+        # Lua strings sent to the simulated Frame, and files uploaded to it
+        self.lua_log: List[str] = []
+        self.files: Dict[str, str] = {}
+
+        self._rng = random.Random(seed)
+        self._connected = False
+        self._app_data_accum: Dict[int, dict] = {}
+        # extended framing streams and completed message ids by msg_code
+        self._ext_items: Dict[int, dict] = {}
+        self._data_response: asyncio.Queue = asyncio.Queue()
+        self._awaiting_data_response = False
+        self._print_response: asyncio.Queue = asyncio.Queue()
+        self._awaiting_print_response = False
+        self._uplink_lock = asyncio.Lock()
+        self._downlink: Optional[asyncio.Queue] = None
+        self._downlink_task: Optional[asyncio.Task] = None
+        self._downlink_ready_at = 0.0
+        self._device_rx: Optional[asyncio.Queue] = None
+        self._device_task: Optional[asyncio.Task] = None
+        self._user_data_response_handler: Optional[Callable] = None
+        self._user_print_response_handler: Optional[Callable] = None
+        self._user_disconnect_handler: Optional[Callable] = None
+
+    def _packet_delay(self) -> float:
+        """Simulated one-way delay for a single packet, before time scaling"""
+        return self.latency + (self._rng.uniform(0.0, self.jitter) if self.jitter > 0 else 0.0)
+
+    async def _sleep(self, delay: float) -> None:
+        await asyncio.sleep(delay * self.time_scale)
+
+    async def connect(
+        self,
+        name=None,
+        timeout=10,
+        print_response_handler=lambda _: None,
+        data_response_handler=lambda _: None,
+        disconnect_handler=lambda: None,
+    ):
+        """Connect to the simulated Frame. Takes the same arguments as `FrameBle.connect()`."""
+        self._user_print_response_handler = print_response_handler
+        self._user_data_response_handler = data_response_handler
+        self._user_disconnect_handler = disconnect_handler
+
+        self._downlink = asyncio.Queue()
+        self._downlink_ready_at = 0.0
+        self._downlink_task = asyncio.create_task(self._run_downlink())
+        self._device_rx = asyncio.Queue()
+        self._device_task = asyncio.create_task(self._run_device())
+        self._connected = True
+        return "SIM:FR:AM:E0:00:00"
+
+    async def disconnect(self):
+        """Disconnect from the simulated Frame and stop delivering notifications."""
+        if self._downlink_task is not None:
+            self._downlink_task.cancel()
+            self._downlink_task = None
+        if self._device_task is not None:
+            self._device_task.cancel()
+            self._device_task = None
+        was_connected = self._connected
+        self._connected = False
+        self._app_data_accum.clear()
+        self._ext_items.clear()
+        if was_connected and self._user_disconnect_handler is not None:
+            self._user_disconnect_handler()
+
+    def is_connected(self):
+        """Returns `True` if the simulated Frame is connected."""
+        return self._connected
+
+    def max_lua_payload(self):
+        """Returns the maximum length of a Lua string which may be transmitted."""
+        return self.mtu - 3
+
+    def max_data_payload(self):
+        """Returns the maximum length of a raw bytearray which may be transmitted."""
+        return self.mtu - 4
+
+    def max_length(self):
+        """Equivalent of `frame.bluetooth.max_length()` on the simulated Frame: the largest notification payload."""
+        return self.mtu - 4
+
+    async def _transmit(self, data: bytes) -> bool:
+        """
+        Simulate a write-with-response of a single packet to Frame.
+        Returns False if the drop model discarded the packet.
+        """
+        if not self._connected:
+            raise Exception("Not connected")
+
+        if len(data) > self.mtu - 3:
+            raise Exception("payload length is too large")
+
+        async with self._uplink_lock:
+            await self._sleep(self._packet_delay())
+
+        return not (self.drop_rate > 0 and self._rng.random() < self.drop_rate)
+
+    async def send_lua(self, string: str, show_me=False, await_print=False):
+        """
+        Record a Lua string sent to the simulated Frame. Lua is not executed, but if `await_print=True`
+        the simulated Frame prints an empty line so that callers waiting for a print() are released.
+        """
+        if show_me:
+            print(string)
+
+        self._awaiting_print_response = await_print
+        await self._transmit(string.encode())
+        self.lua_log.append(string)
+
+        if await_print:
+            self._enqueue_downlink(b'', is_print=True)
+            try:
+                return await asyncio.wait_for(self._print_response.get(), timeout=self.ack_timeout)
+            except asyncio.TimeoutError:
+                raise Exception("device didn't respond")
+
+    async def send_data(self, data: bytes, show_me=False, await_data=False):
+        """
+        Send a single raw data packet to the simulated Frame, where it is handled by the simulated data accumulator.
+        If `await_data=True`, waits for the next data response (the accumulator's ACK) or times out.
+        """
+        if show_me:
+            print(bytes(data))
+
+        self._awaiting_data_response = await_data
+        self.stats.packets_sent += 1
+        self.stats.bytes_sent += len(data)
+
+        delivered = await self._transmit(b'\x01' + bytes(data))
+
+        if delivered:
+            self._device_rx.put_nowait(bytes(data))
+        else:
+            self.stats.packets_dropped += 1
+
+        if await_data:
+            try:
+                return await asyncio.wait_for(self._data_response.get(), timeout=self.ack_timeout)
+            except asyncio.TimeoutError:
+                raise Exception("device didn't respond")
+
+    async def send_reset_signal(self, show_me=False):
+        """Simulate a Lua VM reset, which discards any partially accumulated messages."""
+        await self._transmit(b'\x04')
+        self._app_data_accum.clear()
+        self._ext_items.clear()
+
+    async def send_break_signal(self, show_me=False):
+        """Simulate a break signal."""
+        await self._transmit(b'\x03')
+
+    async def upload_file_from_string(self, content: str, frame_file_path="main.lua"):
+        """Store a file on the simulated Frame, accounting for the link time of a chunked upload."""
+        chunk_size = self.max_lua_payload() - 22
+        for _ in range(0, len(content), chunk_size):
+            await self._transmit(b'')
+        self.files[frame_file_path] = content
+
+    async def upload_file(self, local_file_path: str, frame_file_path="main.lua"):
+        """Upload a local file to the simulated Frame."""
+        with open(local_file_path, "r") as f:
+            content = f.read()
+
+        await self.upload_file_from_string(content, frame_file_path)
+
+    async def send_message(self, msg_code: int, payload: bytes, show_me: bool=False) -> None:
+        """
+        Send a message in MTU-sized chunks, waiting for the accumulator's ACK after each packet,
+        using the same packet format as `FrameBle.send_message()`.
+        """
+        if not 0 <= msg_code <= 255:
+            raise ValueError(f"Message code must be 0-255, got {msg_code}")
+
+        total_size = len(payload)
+        # a first packet starting 0xFF marks the extended framing
+        if total_size > 0xFEFF:
+            raise ValueError(f"Payload size {total_size} exceeds maximum {0xFEFF} bytes")
+
+        max_first_chunk = self.max_data_payload() - 3
+        max_chunk_size = self.max_data_payload() - 1
+
+        first_chunk_size = min(max_first_chunk, total_size)
+        await self.send_data(bytes([msg_code, total_size >> 8, total_size & 0xFF]) + payload[:first_chunk_size],
+                             show_me=show_me, await_data=True)
+        sent_bytes = first_chunk_size
+
+        while sent_bytes < total_size:
+            chunk_size = min(max_chunk_size, total_size - sent_bytes)
+            await self.send_data(bytes([msg_code]) + payload[sent_bytes:sent_bytes + chunk_size],
+                                 show_me=show_me, await_data=True)
+            sent_bytes += chunk_size
+
+    async def _run_device(self) -> None:
+        """Process delivered data packets in order, as the Frameside data handler does"""
+        while True:
+            data = await self._device_rx.get()
+            try:
+                if self.process_time > 0:
+                    await self._sleep(self.process_time)
+                self._update_app_data_accum(data)
+            except Exception:
+                _log.exception("Error in simulated data accumulator")
+                self._send_ack(b'\x01')
+            finally:
+                self._device_rx.task_done()
+
+    def _update_app_data_accum(self, data: bytes) -> None:
+        """Equivalent of data.lua's update_app_data_accum() for a single packet"""
+        msg_flag = data[0]
+        item = self._app_data_accum.get(msg_flag)
+        # extended framing: any packet starting 0xFF after the msg_code, unless it continues a legacy message
+        if item is None and data[1] == 0xFF:
+            self._update_ext_item(msg_flag, data)
+            return
+
+        if item is None:
+            item = {'chunks': [data[3:]], 'num_chunks': 1, 'size': data[1] << 8 | data[2], 'recv_bytes': len(data) - 3}
+            self._app_data_accum[msg_flag] = item
+        else:
+            item['chunks'].append(data[1:])
+            item['num_chunks'] += 1
+            item['recv_bytes'] += len(data) - 1
+
+        if item['recv_bytes'] == item['size']:
+            del self._app_data_accum[msg_flag]
+            self._deliver_message(msg_flag, b''.join(item['chunks']))
+
+        # send some data back as an ACK for receiver-paced flow control
+        self._send_ack(b'\x00')
+
+    def _update_ext_item(self, msg_flag: int, data: bytes) -> None:
+        """Equivalent of data.lua's handling of the extended framing used by windowed sends"""
+        item = self._ext_items.setdefault(msg_flag, {'streams': {}, 'done': {}})
+        if data[2] == 0xFF:
+            # first packet: flags, message id, message length (Uint16, or Uint32 with flag 0x01),
+            # uncompressed length (Uint32, with flag 0x02), data
+            msg_id = data[4]
+            stream = item['streams'].get(msg_id)
+            # a resent first packet of a message in progress or already complete is a duplicate
+            if stream is None and msg_id not in item['done']:
+                flags = data[3]
+                header_len = 9 if flags & 0x01 else 7
+                size = int.from_bytes(data[5:header_len], 'big')
+                if flags & 0x02:
+                    header_len += 4
+                stream = {'flags': flags, 'size': size,
+                          'chunks': [data[header_len:]], 'recv_bytes': len(data) - header_len,
+                          'seq': 0, 'max_seq': 0, 'pending': {}}
+                item['streams'][msg_id] = stream
+                # forget the message 64 ids behind, so its id can be reused
+                item['streams'].pop((msg_id - 64) % 255, None)
+                item['done'].pop((msg_id - 64) % 255, None)
+        else:
+            # subsequent packets: 0xFF, message id, sequence number (Uint16), data
+            msg_id = data[2]
+            stream = item['streams'].get(msg_id)
+            seq = data[3] << 8 | data[4]
+            if stream is not None and seq > stream['seq'] and seq not in stream['pending']:
+                pending = stream['pending']
+                pending[seq] = data[5:]
+                if seq == stream['seq'] + 1:
+                    # append this and any buffered packets that now follow in order
+                    while stream['seq'] + 1 in pending:
+                        stream['seq'] += 1
+                        chunk = pending.pop(stream['seq'])
+                        stream['chunks'].append(chunk)
+                        stream['recv_bytes'] += len(chunk)
+                elif seq > stream['max_seq'] + 1:
+                    # buffer the packet until the gap is filled, and NACK packets not seen missing before
+                    first, last = stream['max_seq'] + 1, seq - 1
+                    self._send_ack(bytes([0x01, msg_flag, msg_id, first >> 8, first & 0xFF, last >> 8, last & 0xFF]))
+                stream['max_seq'] = max(stream['max_seq'], seq)
+
+        if stream is not None and stream['recv_bytes'] == stream['size']:
+            del item['streams'][msg_id]
+            item['done'][msg_id] = stream['seq']
+            payload = b''.join(stream['chunks'])
+            # data.lua inflates compressed messages before they are parsed
+            if stream['flags'] & 0x02:
+                payload = lz4.frame.decompress(payload)
+            self._deliver_message(msg_flag, payload)
+            stream = None
+
+        # cumulative ACK of the last packet received in order, unless the first packet hasn't arrived yet
+        if stream is not None:
+            self._send_ack(bytes([0x00, msg_flag, msg_id, stream['seq'] >> 8, stream['seq'] & 0xFF]))
+        elif msg_id in item['done']:
+            done_seq = item['done'][msg_id]
+            self._send_ack(bytes([0x00, msg_flag, msg_id, done_seq >> 8, done_seq & 0xFF]))
+
+    def _send_ack(self, ack: bytes) -> None:
+        self.stats.acks_sent += 1
+        self._enqueue_downlink(ack)
+
+    def _deliver_message(self, msg_code: int, payload: bytes) -> None:
+        self.stats.messages_received += 1
+        self.messages.append((msg_code, payload))
+        if self.message_handler is not None:
+            self.message_handler(msg_code, payload)
+
+    def notify(self, data: bytes) -> None:
+        """
+        Send a data notification from the simulated Frame to the host, equivalent to Frameside
+        `frame.bluetooth.send(data)`. Notifications are delivered in order after the link latency.
+        """
+        if len(data) > self.max_length():
+            raise ValueError(f"Notification length {len(data)} exceeds max_length {self.max_length()}")
+        self.stats.notifications += 1
+        self.stats.bytes_received += len(data)
+        self._enqueue_downlink(bytes(data))
+
+    async def send_chunked(self, payload: bytes, non_final_flag: int, final_flag: int) -> None:
+        """
+        Stream a payload to the host the way `camera.lua` sends photos: each notification carries
+        the non-final flag and up to `max_length() - 1` bytes, followed by a notification with only the final flag.
+        Returns once all notifications have been delivered.
+        """
+        chunk_size = self.max_length() - 1
+        for offset in range(0, len(payload), chunk_size):
+            self.notify(bytes([non_final_flag]) + payload[offset:offset + chunk_size])
+        self.notify(bytes([final_flag]))
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Wait until all pending data packets have been processed and all pending notifications have been delivered to the host."""
+        if self._device_rx is not None:
+            await self._device_rx.join()
+        if self._downlink is not None:
+            await self._downlink.join()
+
+    def _enqueue_downlink(self, data: bytes, is_print: bool = False) -> None:
+        if self._downlink is None:
+            return
+        # notifications are delivered in order, so each one is due no earlier than the previous one
+        loop = asyncio.get_running_loop()
+        due = max(loop.time() + self._packet_delay() * self.time_scale, self._downlink_ready_at)
+        self._downlink_ready_at = due
+        self._downlink.put_nowait((due, data, is_print))
+
+    async def _run_downlink(self) -> None:
+        """Deliver notifications to the host handlers in order, as FrameBle's notification handler does"""
+        loop = asyncio.get_running_loop()
+        while True:
+            due, data, is_print = await self._downlink.get()
+            try:
+                delay = due - loop.time()
+                await asyncio.sleep(delay if delay > 0 else 0)
+                if is_print:
+                    decoded = data.decode()
+                    if self._awaiting_print_response:
+                        self._awaiting_print_response = False
+                        await self._print_response.put(decoded)
+                    if self._user_print_response_handler is not None:
+                        self._user_print_response_handler(decoded)
+                else:
+                    data_view = memoryview(data)
+                    if self._awaiting_data_response:
+                        self._awaiting_data_response = False
+                        await self._data_response.put(data_view)
+                    if self._user_data_response_handler is not None:
+                        if asyncio.iscoroutinefunction(self._user_data_response_handler):
+                            await self._user_data_response_handler(data_view)
+                        else:
+                            self._user_data_response_handler(data_view)
+            except Exception:
+                _log.exception("Error delivering simulated notification")
+            finally:
+                self._downlink.task_done()
@@ -0,0 +1,81 @@
+import time
+from typing import Optional, Sequence
+
+import numpy as np
+
+def record_getitem(self, key):
+    """
+    `__getitem__` for the NamedTuple telemetry records, which replaced dicts: a field name looks up the field
+    as the dict key did, so `result['brightness']['matrix']['r']` keeps working alongside `result.brightness.matrix.r`
+    """
+    if isinstance(key, str):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+    return tuple.__getitem__(self, key)
+
+class TelemetryFilter:
+    """
+    Decides which of a stream of telemetry values to queue: every `decimation`th one, and of those only the ones where
+    some value differs from the last queued one by more than `change_threshold`. The defaults queue everything.
+    """
+    def __init__(self, decimation: int = 1, change_threshold: float = 0.0):
+        if decimation < 1:
+            raise ValueError(f"decimation must be at least 1, got {decimation}")
+        self.decimation = decimation
+        self.change_threshold = change_threshold
+        self.skipped = 0
+        self._countdown = 1
+        self._last: Optional[Sequence[float]] = None
+
+    def accept(self, values: Sequence[float]) -> bool:
+        """Whether to queue these values, counting them in `skipped` if not"""
+        self._countdown -= 1
+        if self._countdown:
+            self.skipped += 1
+            return False
+        self._countdown = self.decimation
+
+        if self.change_threshold > 0 and self._last is not None:
+            threshold = self.change_threshold
+            if not any(abs(a - b) > threshold for a, b in zip(values, self._last)):
+                self.skipped += 1
+                return False
+
+        self._last = values
+        return True
+
+class TelemetryHistory:
+    """
+    Fixed-size ring buffer of the latest telemetry values with their host timestamps (seconds since the epoch),
+    stored in a numpy structured array with a 'timestamp' field and one float32 field per name, e.g. for plotting
+    how the auto exposure converges. Appending doesn't allocate.
+    """
+    def __init__(self, names: Sequence[str], size: int):
+        if size < 1:
+            raise ValueError(f"size must be at least 1, got {size}")
+        self.names = tuple(names)
+        self.size = size
+        self._buffer = np.zeros(size, dtype=[('timestamp', np.float64)] + [(name, np.float32) for name in self.names])
+        self._count = 0
+        self._index = 0
+
+    def append(self, values: Sequence[float], timestamp: Optional[float] = None) -> None:
+        """Add a set of values, in the order of `names`"""
+        self._buffer[self._index] = (time.time() if timestamp is None else timestamp, *values)
+        self._index = (self._index + 1) % self.size
+        self._count = min(self._count + 1, self.size)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def clear(self) -> None:
+        self._count = 0
+        self._index = 0
+
+    def array(self) -> np.ndarray:
+        """A copy of the values held, oldest first; fields are accessed by name, e.g. `history.array()['shutter']`"""
+        if self._count < self.size:
+            return self._buffer[:self._count].copy()
+        return np.roll(self._buffer, -self._index)
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import Optional
 import struct
 
 @dataclass
@@ -11,20 +12,28 @@ class TxCaptureSettings:
         quality_index: Index into [VERY_LOW, LOW, MEDIUM, HIGH, VERY_HIGH]
         pan: Image pan value (-140 to 140)
         raw: Whether to capture in RAW format
+        burst_count: If set, the number of photos for `camera.start_burst()` to capture
+            (0 for continuous capture until `camera.stop_burst()`), sent as a 7th byte
     """
     resolution: int = 512
     quality_index: int = 4
     pan: int = 0
     raw: bool = False
+    burst_count: Optional[int] = None
 
     def pack(self) -> bytes:
-        """Pack the settings into 6 bytes."""
+        """Pack the settings into 6 bytes, or 7 with a burst_count."""
         half_res = self.resolution // 2
         pan_shifted = self.pan + 140
 
-        return struct.pack('>BHHB',
+        packed = struct.pack('>BHHB',
             self.quality_index & 0xFF,
             half_res & 0xFFFF,
             pan_shifted & 0xFFFF,
             0x01 if self.raw else 0x00
-        )
\ No newline at end of file
+        )
+
+        if self.burst_count is not None:
+            packed += bytes([self.burst_count & 0xFF])
+
+        return packed
\ No newline at end of file
@@ -1,3 +1,4 @@
+from dataclasses import dataclass
 import struct
 from typing import List
 import numpy as np
@@ -37,32 +38,61 @@ class TxImageSpriteBlock:
         pixels = np.frombuffer(self.image.pixel_data, dtype=np.uint8)
         pixels = pixels.reshape((self.image.height, self.image.width))
 
-        # Process full-height lines
-        for i in range(0, self.image.height // self.sprite_line_height):
-            start_y = i * self.sprite_line_height
-            line_pixels = pixels[start_y:start_y + self.sprite_line_height]
-
-            self.sprite_lines.append(TxSprite(
-                width=self.image.width,
-                height=self.sprite_line_height,
-                num_colors=self.image.num_colors,
-                palette_data=self.image.palette_data,
-                pixel_data=line_pixels.tobytes(),
-                compress=self.image.compress
-            ))
-
-        # Process final partial line if any
-        remaining_height = self.image.height % self.sprite_line_height
-        if remaining_height > 0:
-            final_line = pixels[-remaining_height:]
-            self.sprite_lines.append(TxSprite(
-                width=self.image.width,
-                height=remaining_height,
-                num_colors=self.image.num_colors,
-                palette_data=self.image.palette_data,
-                pixel_data=final_line.tobytes(),
-                compress=self.image.compress
-            ))
+        # Process full-height lines, and the final partial line if any
+        for start_y in range(0, self.image.height, self.sprite_line_height):
+            self.sprite_lines.append(self._make_line(pixels, start_y))
+
+    def _make_line(self, pixels: np.ndarray, start_y: int) -> TxSprite:
+        """Create the sprite for the strip of the image starting at row start_y."""
+        line_pixels = pixels[start_y:start_y + self.sprite_line_height]
+
+        return TxSprite(
+            width=self.image.width,
+            height=line_pixels.shape[0],
+            num_colors=self.image.num_colors,
+            palette_data=self.image.palette_data,
+            pixel_data=line_pixels.tobytes(),
+            compress=self.image.compress
+        )
+
+    def update_image(self, image: TxSprite) -> List[bytes]:
+        """
+        Replace the block's image with a new frame of the same dimensions and number of colors, and return
+        packed `TxImageSpriteStrip` messages for only the strips whose pixels differ from the previous image.
+        Every strip is returned if the palette has changed. The strip layout depends on whether the image is compressed,
+        so a compressed image can only be updated with a compressed one, and an uncompressed one with an uncompressed one.
+
+        The block must be `updatable` so that Frame accepts strip updates once the block has been sent.
+        """
+        if not self.updatable:
+            raise ValueError("TxImageSpriteBlock must be updatable to send strip updates")
+
+        if (image.width, image.height, image.num_colors) != (self.image.width, self.image.height, self.image.num_colors):
+            raise ValueError("Updated image must have the same width, height and number of colors - send a new TxImageSpriteBlock instead")
+
+        if image.compress != self.image.compress:
+            raise ValueError("Updated image must have the same compress setting, which sets the strip height - send a new TxImageSpriteBlock instead")
+
+        pixels = np.frombuffer(image.pixel_data, dtype=np.uint8).reshape((image.height, image.width))
+
+        if image.palette_data != self.image.palette_data:
+            changed = np.arange(len(self.sprite_lines))
+        else:
+            old_pixels = np.frombuffer(self.image.pixel_data, dtype=np.uint8).reshape((image.height, image.width))
+            changed_rows = (pixels != old_pixels).any(axis=1)
+
+            # pad the rows out to a whole number of strips, then check each strip for any changed row
+            padding = len(self.sprite_lines) * self.sprite_line_height - image.height
+            changed_rows = np.concatenate((changed_rows, np.zeros(padding, dtype=bool)))
+            changed = np.flatnonzero(changed_rows.reshape(-1, self.sprite_line_height).any(axis=1))
+
+        self.image = image
+        messages = []
+        for i in changed.tolist():
+            self.sprite_lines[i] = self._make_line(pixels, i * self.sprite_line_height)
+            messages.append(TxImageSpriteStrip(index=i + 1, sprite=self.sprite_lines[i]).pack())
+
+        return messages
 
     def pack(self) -> bytes:
         """Pack the image block header."""
@@ -76,4 +106,24 @@ class TxImageSpriteBlock:
             self.sprite_line_height,
             1 if self.progressive_render else 0,
             1 if self.updatable else 0
-        )
\ No newline at end of file
+        )
+
+@dataclass
+class TxImageSpriteStrip:
+    """
+    A single strip of an image sprite block that replaces the strip at `index` in the image sprite block
+    currently held by the Frameside `image_sprite_block` parser.
+
+    Attributes:
+        index: 1-based index of the strip within the block
+        sprite: The strip sprite
+    """
+    index: int
+    sprite: TxSprite
+
+    def pack(self) -> bytes:
+        """Pack the strip update: strip marker, index, then the packed sprite."""
+        return struct.pack('>BH',
+            0xFE,  # Strip update marker
+            self.index
+        ) + self.sprite.pack()
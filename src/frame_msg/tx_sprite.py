@@ -1,9 +1,12 @@
+import asyncio
+from concurrent.futures import Executor
 from dataclasses import dataclass
 import struct
 import numpy as np
 from PIL import Image
 import io
 import lz4.frame
+from typing import Iterable, List, Optional, Union
 
 @dataclass
 class TxSprite:
@@ -106,6 +109,33 @@ class TxSprite:
             compress=compress
         )
 
+    @staticmethod
+    async def from_indexed_png_bytes_async(image_bytes: bytes, compress=False, executor: Optional[Executor] = None) -> 'TxSprite':
+        """
+        Awaitable version of `from_indexed_png_bytes()` that runs on `executor` (a thread or process pool)
+        so the event loop is not blocked. Defaults to the event loop's default executor.
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            executor, TxSprite.from_indexed_png_bytes, image_bytes, compress)
+
+    @staticmethod
+    async def from_image_bytes_async(image_bytes: bytes, max_pixels = 48000, compress=False, executor: Optional[Executor] = None) -> 'TxSprite':
+        """
+        Awaitable version of `from_image_bytes()` that runs the resizing and quantization on `executor`
+        (a thread or process pool) so the event loop is not blocked. Defaults to the event loop's default executor.
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            executor, TxSprite.from_image_bytes, image_bytes, max_pixels, compress)
+
+    @staticmethod
+    async def from_image_bytes_batch(images: Iterable[bytes], max_pixels = 48000, compress=False, executor: Optional[Executor] = None) -> List['TxSprite']:
+        """
+        Create sprites from many images concurrently on `executor`, returning them in the same order as `images`.
+        Pass a `concurrent.futures.ProcessPoolExecutor` to spread the work across CPU cores.
+        """
+        return list(await asyncio.gather(*(
+            TxSprite.from_image_bytes_async(image_bytes, max_pixels, compress, executor) for image_bytes in images)))
+
     @property
     def bpp(self) -> int:
         """Bits per pixel based on the number of colors."""
@@ -118,6 +148,21 @@ class TxSprite:
         else:
             raise ValueError(f"num_colors must be equal to or less than 16: {self.num_colors}")
 
+    @property
+    def packed_pixel_size(self) -> int:
+        """Length in bytes of the bit-packed (uncompressed) pixel data."""
+        pixels_per_byte = 8 // self.bpp
+        return (len(self.pixel_data) + pixels_per_byte - 1) // pixels_per_byte
+
+    @property
+    def packed_size(self) -> int:
+        """
+        Length in bytes of the packed sprite message (header, palette and uncompressed pixel data).
+        For compressed sprites the final length is only known after compression, so this is
+        the size of the uncompressed message.
+        """
+        return 7 + len(self.palette_data) + self.packed_pixel_size
+
     def pack(self) -> bytes:
         """Pack the sprite into its binary format."""
         # Calculate bits per pixel based on number of colors
@@ -148,35 +193,94 @@ class TxSprite:
 
         return header + self.palette_data + packed_pixels
 
+    def pack_into(self, buffer: Union[bytearray, memoryview], offset: int = 0) -> int:
+        """
+        Pack the sprite directly into a preallocated writable buffer (e.g. a bytearray or memoryview)
+        starting at `offset`, and return the number of bytes written.
+
+        For uncompressed sprites the pixels are bit-packed in place with no intermediate copies,
+        so a single buffer of `packed_size` bytes can be reused for every frame.
+        Compressed sprites are compressed first and then copied into the buffer.
+
+        Raises:
+            ValueError: If the buffer is too small to hold the packed sprite
+        """
+        bpp = self.bpp
+        palette_len = len(self.palette_data)
+        pixel_offset = offset + 7 + palette_len
+
+        if self.compress:
+            packed_pixels = lz4.frame.compress(self._pack_pixels(self.pixel_data, bpp), compression_level=9)
+            pixel_len = len(packed_pixels)
+        else:
+            pixel_len = self.packed_pixel_size
+
+        if len(buffer) < pixel_offset + pixel_len:
+            raise ValueError(f"Buffer too small for packed sprite: {len(buffer)} < {pixel_offset + pixel_len}")
+
+        struct.pack_into('>HHBBB', buffer, offset,
+            self.width,
+            self.height,
+            int(self.compress),
+            bpp,
+            self.num_colors
+        )
+        buffer[offset + 7:pixel_offset] = self.palette_data
+
+        if self.compress:
+            buffer[pixel_offset:pixel_offset + pixel_len] = packed_pixels
+        else:
+            out = np.frombuffer(buffer, dtype=np.uint8, count=pixel_len, offset=pixel_offset)
+            self._pack_pixels(self.pixel_data, bpp, out)
+
+        return pixel_offset + pixel_len - offset
+
+    @classmethod
+    def _pack_pixels(cls, data: bytes, bpp: int, out: Optional[np.ndarray] = None) -> bytes:
+        """Pack pixels at the given bits per pixel, optionally writing into the array `out`."""
+        if bpp == 1:
+            return cls._pack_1bit(data, out)
+        elif bpp == 2:
+            return cls._pack_2bit(data, out)
+        else:
+            return cls._pack_4bit(data, out)
+
     @staticmethod
-    def _pack_1bit(data: bytes) -> bytes:
+    def _pixel_groups(data: bytes, pixels_per_byte: int, mask: int) -> np.ndarray:
+        """
+        View the pixel data as rows of `pixels_per_byte` masked palette indices, one row per packed byte.
+        A final partial row is padded with zeros.
+        """
+        data_array = np.frombuffer(data, dtype=np.uint8)
+        remainder = len(data_array) % pixels_per_byte
+        if remainder:
+            data_array = np.concatenate((data_array, np.zeros(pixels_per_byte - remainder, dtype=np.uint8)))
+        return (data_array & mask).reshape(-1, pixels_per_byte)
+
+    @staticmethod
+    def _pack_1bit(data: bytes, out: Optional[np.ndarray] = None) -> bytes:
         """Pack 1-bit pixels (2 colors) into bytes."""
         data_array = np.frombuffer(data, dtype=np.uint8)
         packed = np.packbits(data_array)
+        if out is not None:
+            out[:] = packed
+            return out
         return packed.tobytes()
 
     @staticmethod
-    def _pack_2bit(data: bytes) -> bytes:
+    def _pack_2bit(data: bytes, out: Optional[np.ndarray] = None) -> bytes:
         """Pack 2-bit pixels (4 colors) into bytes."""
-        data_array = np.frombuffer(data, dtype=np.uint8)
-        packed = np.zeros(len(data_array) // 4 + (1 if len(data_array) % 4 else 0), dtype=np.uint8)
-
-        for i in range(0, len(data_array)):
-            byte_idx = i // 4
-            bit_offset = (3 - (i % 4)) * 2
-            packed[byte_idx] |= (data_array[i] & 0x03) << bit_offset
-
-        return packed.tobytes()
+        groups = TxSprite._pixel_groups(data, 4, 0x03)
+        packed = np.left_shift(groups[:, 0], 6, out=out)
+        packed |= groups[:, 1] << 4
+        packed |= groups[:, 2] << 2
+        packed |= groups[:, 3]
+        return packed if out is not None else packed.tobytes()
 
     @staticmethod
-    def _pack_4bit(data: bytes) -> bytes:
+    def _pack_4bit(data: bytes, out: Optional[np.ndarray] = None) -> bytes:
         """Pack 4-bit pixels (16 colors) into bytes."""
-        data_array = np.frombuffer(data, dtype=np.uint8)
-        packed = np.zeros(len(data_array) // 2 + (1 if len(data_array) % 2 else 0), dtype=np.uint8)
-
-        for i in range(0, len(data_array)):
-            byte_idx = i // 2
-            bit_offset = (1 - (i % 2)) * 4
-            packed[byte_idx] |= (data_array[i] & 0x0F) << bit_offset
-
-        return packed.tobytes()
+        groups = TxSprite._pixel_groups(data, 2, 0x0F)
+        packed = np.left_shift(groups[:, 0], 4, out=out)
+        packed |= groups[:, 1]
+        return packed if out is not None else packed.tobytes()
@@ -0,0 +1,162 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import hashlib
+import struct
+from typing import List, Optional, Tuple
+
+from .frame_msg import FrameMsg
+from .tx_sprite import TxSprite
+from .tx_sprite_coords import TxSpriteCoords
+
+@dataclass
+class TxSpriteCacheStore:
+    """
+    A message that stores a sprite in a slot of the Frameside sprite cache (`sprite_cache.lua`),
+    first evicting the listed slots.
+
+    Attributes:
+        slot: Cache slot to store the sprite in (1-255)
+        sprite: The sprite to store
+        evict: Slots to clear before storing the sprite
+    """
+    slot: int
+    sprite: TxSprite
+    evict: List[int] = field(default_factory=list)
+
+    def pack(self) -> bytes:
+        """
+        Packs the message into a binary format.
+
+        Returns:
+            bytes: Binary representation of the message in the format:
+                  [slot, evict_count, evict_slots..., packed_sprite...]
+        """
+        return struct.pack(f'>BB{len(self.evict)}B',
+            self.slot & 0xFF,
+            len(self.evict) & 0xFF,
+            *(slot & 0xFF for slot in self.evict)
+        ) + self.sprite.pack()
+
+class SpriteCache:
+    """
+    Hostside mirror of the sprites resident in the Frameside sprite cache, so that a sprite
+    that has been sent before can be drawn again with a 6-byte `TxSpriteCoords` message instead of being resent.
+
+    Sprites are identified by a hash of their packed contents. The hostside mirror is authoritative:
+    it evicts least recently used sprites to stay within `max_bytes` of packed sprite data and `max_slots` slots,
+    and every `TxSpriteCacheStore` it produces tells Frame which slots to evict, so both sides stay in step.
+    Call `clear()` whenever the Frameside app restarts, since its cache is then empty.
+
+    Args:
+        max_bytes: Budget for the total size of packed sprites resident on Frame
+        max_slots: Number of cache slots available on Frame (1-255)
+    """
+    def __init__(self, max_bytes: int = 32768, max_slots: int = 255):
+        if not 1 <= max_slots <= 255:
+            raise ValueError(f"max_slots must be 1-255, got {max_slots}")
+
+        self.max_bytes = max_bytes
+        self.max_slots = max_slots
+        self.hits = 0
+        self.misses = 0
+
+        # digest of packed sprite -> (slot, packed size), in least to most recently used order
+        self._entries: 'OrderedDict[bytes, Tuple[int, int]]' = OrderedDict()
+        self._free_slots: List[int] = list(range(max_slots, 0, -1))
+        self._resident_bytes = 0
+
+    @property
+    def resident_bytes(self) -> int:
+        """Total packed size of the sprites currently resident on Frame"""
+        return self._resident_bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        """Forget all resident sprites, e.g. after the Frameside app has restarted."""
+        self._entries.clear()
+        self._free_slots = list(range(self.max_slots, 0, -1))
+        self._resident_bytes = 0
+
+    @staticmethod
+    def _digest(packed: bytes) -> bytes:
+        return hashlib.blake2b(packed, digest_size=16).digest()
+
+    def lookup(self, sprite: TxSprite) -> Optional[int]:
+        """Return the slot holding the sprite on Frame, or None if it isn't resident. Does not affect recency."""
+        entry = self._entries.get(self._digest(sprite.pack()))
+        return entry[0] if entry else None
+
+    def discard(self, sprite: TxSprite) -> None:
+        """Forget the sprite, e.g. if its `TxSpriteCacheStore` message couldn't be sent, so it is sent again next time."""
+        entry = self._entries.pop(self._digest(sprite.pack()), None)
+        if entry is not None:
+            slot, size = entry
+            self._free_slots.append(slot)
+            self._resident_bytes -= size
+
+    def store(self, sprite: TxSprite) -> Tuple[int, Optional[bytes]]:
+        """
+        Mark the sprite as most recently used, allocating a slot for it if it isn't already resident.
+        The sprite is recorded as resident straight away, so if the returned message isn't sent, call `discard()`.
+
+        Returns:
+            A tuple of the sprite's slot and the packed `TxSpriteCacheStore` message that must be sent
+            to make it resident, or None if it is already resident.
+
+        Raises:
+            ValueError: If the packed sprite is larger than the whole byte budget
+        """
+        packed = sprite.pack()
+        digest = self._digest(packed)
+
+        entry = self._entries.get(digest)
+        if entry is not None:
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return entry[0], None
+
+        size = len(packed)
+        if size > self.max_bytes:
+            raise ValueError(f"Packed sprite size {size} exceeds the cache byte budget {self.max_bytes}")
+
+        # evict least recently used sprites until the new one fits
+        evict = []
+        while not self._free_slots or self._resident_bytes + size > self.max_bytes:
+            _, (slot, evicted_size) = self._entries.popitem(last=False)
+            self._free_slots.append(slot)
+            self._resident_bytes -= evicted_size
+            evict.append(slot)
+
+        slot = self._free_slots.pop()
+        # the new sprite's own slot is overwritten on Frame so it doesn't need evicting separately
+        evict = [s for s in evict if s != slot]
+        self._entries[digest] = (slot, size)
+        self._resident_bytes += size
+        self.misses += 1
+
+        return slot, TxSpriteCacheStore(slot=slot, sprite=sprite, evict=evict).pack()
+
+    async def draw(self, frame: FrameMsg, sprite: TxSprite, x: int, y: int,
+                   store_msg_code: int, coords_msg_code: int, offset: int = 0) -> bool:
+        """
+        Draw a sprite on Frame, sending it to the Frameside cache first (on `store_msg_code`) only if it isn't
+        already resident, then sending a `TxSpriteCoords` message (on `coords_msg_code`) that refers to its cache slot.
+
+        If the sprite can't be stored (the send raises, or the message is dropped), it is discarded from the cache
+        so that the next draw sends it again, and the error is raised.
+
+        Returns:
+            True if the sprite was already resident and only the coordinates were sent
+        """
+        slot, store_msg = self.store(sprite)
+        if store_msg is not None:
+            try:
+                if await frame.send_message(store_msg_code, store_msg) is False:
+                    raise Exception(f"Sprite cache store message on msg_code {store_msg_code} was dropped before it was sent")
+            except BaseException:
+                self.discard(sprite)
+                raise
+        await frame.send_message(coords_msg_code, TxSpriteCoords(code=slot, x=x, y=y, offset=offset).pack())
+        return store_msg is None
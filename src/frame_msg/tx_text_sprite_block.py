@@ -1,8 +1,51 @@
-from dataclasses import dataclass
-from typing import List, Optional
+import asyncio
+from concurrent.futures import Executor
+from dataclasses import dataclass, replace
+from functools import lru_cache, partial
+import struct
+from typing import Iterable, List, Optional, Tuple
+import numpy as np
 from PIL import Image, ImageDraw, ImageFont
+from .frame_msg import FrameMsg
 from .tx_sprite import TxSprite
 
+# Maximum number of rendered lines kept in the line sprite cache
+LINE_SPRITE_CACHE_SIZE = 1024
+
+@lru_cache(maxsize=32)
+def _load_font(font_family: Optional[str], font_size: int):
+    """Load the specified font or use the default, caching loaded fonts across blocks"""
+    try:
+        return ImageFont.truetype(font_family, font_size) if font_family else \
+               ImageFont.load_default()
+    except OSError:
+        return ImageFont.load_default()
+
+@lru_cache(maxsize=LINE_SPRITE_CACHE_SIZE)
+def _render_line(font_family: Optional[str], font_size: int, width: int, line: str) -> Optional[TxSprite]:
+    """
+    Render a single line of text into a 1-bit TxSprite cropped to the line's bounding box,
+    or None if the line has no height. Results are cached, so the returned sprite must not be modified.
+    """
+    font = _load_font(font_family, font_size)
+    bbox = ImageDraw.Draw(Image.new('L', (1, 1))).textbbox((0, 0), line, font=font)
+    if bbox[3] - bbox[1] <= 0:
+        return None
+
+    # draw the line on its own canvas the width of the block, then crop to its bounding box
+    img = Image.new('L', (width, bbox[3]), 0)
+    ImageDraw.Draw(img).text((0, 0), line, font=font, fill=255)
+    line_img = img.crop((bbox[0], 0, bbox[2], bbox[3]))
+
+    # Convert to TxSprite with 2-color palette
+    return TxSprite(
+        width=line_img.width,
+        height=line_img.height,
+        num_colors=2,
+        palette_data=bytes([0,0,0, 255,255,255]),  # Black and white
+        pixel_data=(np.asarray(line_img) > 127).astype(np.uint8).tobytes()
+    )
+
 @dataclass
 class TxTextSpriteBlock:
     """
@@ -25,42 +68,44 @@ class TxTextSpriteBlock:
         self.sprites: List[TxSprite] = []
         self._create_text_sprites()
 
-    def _create_text_sprites(self):
-        """Create sprites from rendered text."""
-        # Create image large enough for text
-        img = Image.new('RGB', (self.width, self.font_size * self.max_display_rows), 'black')
-        draw = ImageDraw.Draw(img)
+    @classmethod
+    async def create_async(cls, width: int, font_size: int, max_display_rows: int, text: str,
+                           font_family: Optional[str] = None, executor: Optional[Executor] = None) -> 'TxTextSpriteBlock':
+        """
+        Create a TxTextSpriteBlock with the font rendering run on `executor` (a thread or process pool)
+        so the event loop is not blocked. Defaults to the event loop's default executor.
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            executor, partial(cls, width, font_size, max_display_rows, text, font_family))
 
-        # Try to load specified font or use default
-        try:
-            font = ImageFont.truetype(self.font_family, self.font_size) if self.font_family else \
-                   ImageFont.load_default()
-        except OSError:
-            font = ImageFont.load_default()
+    @classmethod
+    async def create_batch(cls, texts: Iterable[str], width: int, font_size: int, max_display_rows: int,
+                           font_family: Optional[str] = None, executor: Optional[Executor] = None) -> List['TxTextSpriteBlock']:
+        """
+        Create a TxTextSpriteBlock for each of `texts` concurrently on `executor`, returned in the same order.
+        Pass a `concurrent.futures.ProcessPoolExecutor` to spread the rendering across CPU cores.
+        """
+        return list(await asyncio.gather(*(
+            cls.create_async(width, font_size, max_display_rows, text, font_family, executor) for text in texts)))
 
-        # Draw text and split into lines
-        lines = []
-        y = 0
+    def _create_text_sprites(self):
+        """Create sprites from rendered text, reusing cached renders of lines seen before."""
         for line in self.text.split('\n'):
-            bbox = draw.textbbox((0, y), line, font=font)
-            if bbox[3] - bbox[1] > 0:  # If line has height
-                draw.text((0, y), line, font=font, fill='white')
-                lines.append((bbox[0], y, bbox[2], bbox[3]))
-            y += self.font_size
-
-        # Convert each line to a sprite
-        for left, top, right, bottom in lines:
-            line_img = img.crop((left, top, right, bottom))
-
-            # Convert to TxSprite with 2-color palette
-            sprite = TxSprite(
-                width=line_img.width,
-                height=line_img.height,
-                num_colors=2,
-                palette_data=bytes([0,0,0, 255,255,255]),  # Black and white
-                pixel_data=bytes(1 if p[0] > 127 else 0 for p in line_img.getdata())
-            )
-            self.sprites.append(sprite)
+            sprite = _render_line(self.font_family, self.font_size, self.width, line)
+            if sprite is not None:  # If line has height
+                # shallow copy so the cached sprite can't be modified through this block
+                self.sprites.append(replace(sprite))
+
+    @staticmethod
+    def clear_cache() -> None:
+        """Clear the cached fonts and rendered line sprites, e.g. after a font file has changed."""
+        _render_line.cache_clear()
+        _load_font.cache_clear()
+
+    @staticmethod
+    def cache_info():
+        """Hit and miss statistics for the rendered line sprite cache, as returned by `functools.lru_cache`."""
+        return _render_line.cache_info()
 
     def pack(self) -> bytes:
         """Pack the text block header."""
@@ -81,3 +126,125 @@ class TxTextSpriteBlock:
             self.max_display_rows & 0xFF,
             len(self.sprites) & 0xFF
         ]) + bytes(offsets)
+
+@dataclass
+class TxTextSpriteLine:
+    """
+    A single line sprite that replaces (or appends) the line at `index` in the text sprite block
+    currently held by the Frameside `text_sprite_block` parser, without resending the rest of the block.
+
+    Attributes:
+        index: 1-based index of the line within the block (1-255)
+        sprite: The rendered line sprite
+        x: X offset of the line within the block
+        y: Y offset of the line within the block
+    """
+    index: int
+    sprite: TxSprite
+    x: int = 0
+    y: int = 0
+
+    def pack(self) -> bytes:
+        """Pack the line update: line marker, index, x and y offsets, then the packed sprite."""
+        if not 1 <= self.index <= 255:
+            raise ValueError(f"Line index must be 1-255, got {self.index}")
+
+        return struct.pack('>BBHH',
+            0xFE,  # Line update marker
+            self.index,
+            self.x,
+            self.y
+        ) + self.sprite.pack()
+
+class TextSpriteSession:
+    """
+    Hostside state for a text sprite block displayed on Frame that is updated incrementally.
+
+    The session remembers the line sprites last sent and, for each new text, produces only the messages needed
+    to bring Frame up to date: the full block header and line sprites the first time (or when lines are removed),
+    and otherwise a `TxTextSpriteLine` for each new or changed line. For streaming captions, where usually only
+    the last line changes, this sends one line sprite per update instead of the whole block.
+    A block holds at most 255 lines, so when the text grows past that, a new block is started with just the lines
+    Frame displays (the last `max_display_rows`), and later lines are numbered from there.
+
+    All messages are sent on the msg_code of the Frameside `text_sprite_block` parser.
+    """
+    # line indexes (and the line count in the block header) are Uint8
+    MAX_BLOCK_LINES = 255
+
+    def __init__(self, width: int, font_size: int, max_display_rows: int, font_family: Optional[str] = None):
+        self.width = width
+        self.font_size = font_size
+        self.max_display_rows = max_display_rows
+        self.font_family = font_family
+
+        # the line sprites in the block on Frame, which starts from line _base of the text
+        self._sent_sprites: Optional[List[TxSprite]] = None
+        self._base = 0
+
+    def reset(self) -> None:
+        """Forget what was sent so the next update resends the whole block, e.g. after the Frameside app restarts."""
+        self._sent_sprites = None
+        self._base = 0
+
+    def update(self, text: str) -> List[bytes]:
+        """
+        Render `text` and return the packed messages, in order, that update Frame's text sprite block to show it.
+        The session assumes all returned messages are sent; if they aren't, call `reset()`.
+        """
+        messages, self._base, self._sent_sprites = self._diff(text)
+        return messages
+
+    def _diff(self, text: str) -> Tuple[List[bytes], int, List[TxSprite]]:
+        """
+        The messages that bring Frame from the lines last sent to `text`,
+        and the text line the block on Frame then starts from and the line sprites it holds
+        """
+        block = TxTextSpriteBlock(self.width, self.font_size, self.max_display_rows, text, self.font_family)
+        sprites = block.sprites
+        previous = self._sent_sprites
+        base = self._base
+
+        if previous is None or len(sprites) - base < len(previous) or len(sprites) - base > self.MAX_BLOCK_LINES:
+            # full block: header then every line sprite, starting a new block from the displayed lines if the text
+            # has more lines than a block can hold
+            base = max(0, len(sprites) - self.max_display_rows) if len(sprites) > self.MAX_BLOCK_LINES else 0
+            block.sprites = sprites[base:]
+            if not block.sprites:
+                header = bytes([0xFF, self.width >> 8, self.width & 0xFF, self.max_display_rows & 0xFF, 0])
+                return [header], base, block.sprites
+            return [block.pack()] + [sprite.pack() for sprite in block.sprites], base, block.sprites
+
+        lines = sprites[base:]
+        messages = []
+        y = 0
+        # only lines in the rolling window of the last max_display_rows lines are held by Frame
+        first_visible = len(lines) - self.max_display_rows
+        for i, sprite in enumerate(lines):
+            if i >= first_visible and (i >= len(previous) or sprite != previous[i]):
+                messages.append(TxTextSpriteLine(index=i + 1, sprite=sprite, x=0, y=y).pack())
+            y += sprite.height
+
+        return messages, base, lines
+
+    async def send(self, frame: FrameMsg, msg_code: int, text: str) -> int:
+        """
+        Update the text shown by sending only the new or changed lines to Frame on `msg_code`.
+        The lines are only recorded as sent once every message has been sent. If a send fails (or a message is dropped),
+        the session is reset so that the next update resends the whole block.
+
+        Returns:
+            The number of payload bytes sent
+        """
+        messages, base, sprites = self._diff(text)
+        try:
+            for message in messages:
+                if await frame.send_message(msg_code, message) is False:
+                    raise Exception(f"Text sprite message on msg_code {msg_code} was dropped before it was sent")
+        except BaseException:
+            # Frame may have received some of the messages, so what it holds is unknown
+            self.reset()
+            raise
+
+        self._base, self._sent_sprites = base, sprites
+        return sum(len(message) for message in messages)
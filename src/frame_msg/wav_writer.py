@@ -0,0 +1,119 @@
+import asyncio
+import struct
+from pathlib import Path
+from typing import BinaryIO, Optional, Union
+
+# Frame's 8-bit samples are signed, WAV's are unsigned: flipping the top bit adds 128 modulo 256
+SIGNED_TO_UNSIGNED_8BIT = bytes(i ^ 0x80 for i in range(256))
+
+def wav_header(data_size: int, sample_rate: int = 8000, bits_per_sample: int = 8, channels: int = 1) -> bytes:
+    """The 44-byte header of a PCM WAV file with `data_size` bytes of sample data"""
+    byte_rate = sample_rate * channels * bits_per_sample // 8
+    return struct.pack(
+        '<4sI4s'    # RIFF chunk descriptor
+        '4sI'       # fmt chunk
+        'HHIIHH'    # fmt chunk data
+        '4sI',      # data chunk header
+
+        # RIFF chunk
+        b'RIFF',
+        min(36 + data_size + (data_size & 1), 0xFFFFFFFF),
+        b'WAVE',
+
+        # fmt chunk
+        b'fmt ',
+        16,                         # Subchunk1Size (16 for PCM)
+        1,                          # AudioFormat (1 for PCM)
+        channels,                   # NumChannels
+        sample_rate,                # SampleRate
+        byte_rate,                  # ByteRate
+        channels * bits_per_sample // 8,  # BlockAlign
+        bits_per_sample,            # BitsPerSample
+
+        # data chunk header
+        b'data',
+        min(data_size, 0xFFFFFFFF)
+    )
+
+class WavWriter:
+    """
+    Writes Frame audio to a WAV file incrementally, e.g. the chunks from a streaming `RxAudio`,
+    so that long recordings don't need to be held in memory.
+
+    The header is written first with placeholder sizes that are patched by `close()`. If the output
+    isn't seekable (e.g. a pipe), the sizes are left at their maximum, which most readers
+    take to mean "read to the end of the stream".
+    """
+    def __init__(
+        self,
+        file: Union[str, Path, BinaryIO],
+        sample_rate: int = 8000,
+        bits_per_sample: int = 8,
+        channels: int = 1
+    ):
+        """
+        Args:
+            file: Path of the file to create, or a binary file object to write to (left open by `close()`)
+            sample_rate: Audio sample rate in Hz
+            bits_per_sample: 8 (signed samples from Frame are converted to unsigned for WAV) or 16 (written as-is)
+            channels: Number of audio channels
+        """
+        if bits_per_sample not in (8, 16):
+            raise ValueError(f"bits_per_sample must be 8 or 16, got {bits_per_sample}")
+
+        self.sample_rate = sample_rate
+        self.bits_per_sample = bits_per_sample
+        self.channels = channels
+        self.data_size = 0
+
+        self._owns_file = isinstance(file, (str, Path))
+        self._file: Optional[BinaryIO] = open(file, 'wb') if self._owns_file else file
+        self._seekable = self._file.seekable()
+        self._start = self._file.tell() if self._seekable else 0
+        self._file.write(wav_header(0xFFFFFFFF, sample_rate, bits_per_sample, channels))
+
+    def write(self, pcm_data: bytes) -> None:
+        """Append a chunk of PCM data straight from Frame"""
+        if self.bits_per_sample == 8:
+            pcm_data = bytes(pcm_data).translate(SIGNED_TO_UNSIGNED_8BIT)
+        self._file.write(pcm_data)
+        self.data_size += len(pcm_data)
+
+    async def write_from_queue(self, queue: asyncio.Queue) -> int:
+        """
+        Write the chunks (or batches of chunks) from a streaming `RxAudio` queue until the end of stream,
+        and return the number of bytes of PCM data written
+        """
+        while (chunk := await queue.get()) is not None:
+            if isinstance(chunk, list):
+                for c in chunk:
+                    self.write(c)
+            else:
+                self.write(chunk)
+        return self.data_size
+
+    def close(self) -> None:
+        """Pad the data to an even length as RIFF requires, patch the sizes in the header and close the file if we opened it"""
+        if self._file is None:
+            return
+
+        if self.data_size & 1:
+            self._file.write(b'\x00')
+
+        if self._seekable:
+            end = self._file.tell()
+            self._file.seek(self._start)
+            self._file.write(wav_header(self.data_size, self.sample_rate, self.bits_per_sample, self.channels))
+            self._file.seek(end)
+
+        if self._owns_file:
+            self._file.close()
+        else:
+            self._file.flush()
+        self._file = None
+
+    def __enter__(self) -> 'WavWriter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
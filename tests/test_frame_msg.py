@@ -0,0 +1,37 @@
+"""Tests for FrameMsg's dispatch of data responses to registered handlers."""
+import asyncio
+
+import pytest
+
+from frame_msg import FrameMsg, SimFrameBle
+
+@pytest.mark.parametrize('windowed', [False, True], ids=['stop_and_wait', 'windowed'])
+def test_app_data_on_ack_codes_is_dispatched(windowed):
+    # payloads on msg codes 0x00 and 0x01 as long as a windowed ACK or NACK, that don't refer to a transfer
+    frame = FrameMsg(ble=SimFrameBle(time_scale=0), windowed=windowed)
+    received = []
+    frame.register_data_response_handler('app', [0x00, 0x01], lambda data: received.append(bytes(data)))
+    payloads = [bytes([0x00, 0x20, 0x05, 0x00, 0x01]), bytes([0x01, 0x20, 0x05, 0x00, 0x01, 0x00, 0x02]), b'\x00']
+
+    async def notify():
+        for payload in payloads:
+            await frame._handle_data_response(memoryview(payload))
+
+    asyncio.run(notify())
+    assert received == payloads
+
+def test_windowed_acks_are_not_dispatched():
+    sim = SimFrameBle(time_scale=0.1, seed=1)
+    frame = FrameMsg(ble=sim, windowed=True)
+    received = []
+    frame.register_data_response_handler('app', [0x00, 0x01], lambda data: received.append(bytes(data)))
+
+    async def send():
+        await frame.connect(initialize=False)
+        await frame.send_message(0x20, bytes(5000))
+        await sim.flush()
+        await frame.disconnect()
+
+    asyncio.run(send())
+    assert sim.messages == [(0x20, bytes(5000))]
+    assert received == []
@@ -0,0 +1,49 @@
+"""Tests for message ordering and flow control in SendScheduler, over a simulated Frame link."""
+import asyncio
+
+import pytest
+
+from frame_msg import FrameMsg, SimFrameBle
+
+@pytest.mark.parametrize('window_size', [1, 2, 4, None], ids=['window_1', 'window_2', 'window_4', 'adaptive'])
+def test_windowed_send_order_and_limits(window_size):
+    # a burst of messages of mixed sizes on one msg_code: they must complete in the order they were queued,
+    # with at most MAX_TRANSFERS messages and the window's worth of packets in flight at any time
+    sim = SimFrameBle(time_scale=0.1, seed=1)
+    frame = FrameMsg(ble=sim, windowed=True, window_size=window_size)
+    scheduler = frame.scheduler
+    payloads = [bytes([i]) * (20000 if i % 8 == 0 else 10) for i in range(80)]
+    max_transfers = max_packets = 0
+
+    async def send_burst():
+        nonlocal max_transfers, max_packets
+        await frame.connect(initialize=False)
+        futures = [await frame.queue_message(0x20, payload) for payload in payloads]
+        while not all(future.done() for future in futures):
+            transfers = scheduler._transfers.values()
+            max_transfers = max(max_transfers, len(transfers))
+            max_packets = max(max_packets, sum(transfer.unacked() for transfer in transfers))
+            await asyncio.sleep(0)
+        await sim.flush()
+        await frame.disconnect()
+
+    asyncio.run(send_burst())
+    assert sim.messages == [(0x20, payload) for payload in payloads]
+    assert max_transfers <= scheduler.MAX_TRANSFERS
+    assert max_packets <= (window_size or scheduler.max_window_size)
+
+def test_higher_priority_overtakes_bulk_transfer():
+    sim = SimFrameBle(time_scale=0.1, seed=1)
+    frame = FrameMsg(ble=sim, windowed=True)
+
+    async def send():
+        await frame.connect(initialize=False)
+        bulk = await frame.queue_message(0x20, b'A' * 20000)
+        await asyncio.sleep(0.05)
+        urgent = await frame.queue_message(0x21, b'B' * 10, priority=1)
+        await asyncio.gather(bulk, urgent)
+        await sim.flush()
+        await frame.disconnect()
+
+    asyncio.run(send())
+    assert sim.messages == [(0x21, b'B' * 10), (0x20, b'A' * 20000)]
@@ -0,0 +1,55 @@
+"""Tests for keeping SpriteCache in step with the Frameside sprite cache."""
+import asyncio
+
+import pytest
+
+from frame_msg import SpriteCache, TxSprite, TxSpriteCacheStore
+
+class FlakyFrame:
+    """Records the messages sent, raising (or reporting the message dropped) for the next `failures` store messages"""
+    def __init__(self, store_msg_code: int, failures: int = 0, dropped: bool = False):
+        self.store_msg_code = store_msg_code
+        self.failures = failures
+        self.dropped = dropped
+        self.sent = []
+
+    async def send_message(self, msg_code: int, payload: bytes) -> bool:
+        if msg_code == self.store_msg_code and self.failures:
+            self.failures -= 1
+            if self.dropped:
+                return False
+            raise Exception("device didn't respond")
+        self.sent.append((msg_code, payload))
+        return True
+
+def make_sprite(value: int) -> TxSprite:
+    return TxSprite(width=8, height=8, num_colors=2, palette_data=bytes(6), pixel_data=bytes([value % 2]) * 64)
+
+@pytest.mark.parametrize('dropped', [False, True], ids=['raises', 'dropped'])
+def test_failed_store_is_resent(dropped):
+    cache = SpriteCache()
+    frame = FlakyFrame(0x30, failures=1, dropped=dropped)
+    sprite = make_sprite(1)
+
+    async def draw_twice():
+        with pytest.raises(Exception):
+            await cache.draw(frame, sprite, 1, 1, 0x30, 0x31)
+        assert cache.lookup(sprite) is None
+        assert cache.resident_bytes == 0
+        return await cache.draw(frame, sprite, 1, 1, 0x30, 0x31)
+
+    resident = asyncio.run(draw_twice())
+    assert not resident
+    assert [msg_code for msg_code, _ in frame.sent] == [0x30, 0x31]
+    assert frame.sent[0][1] == TxSpriteCacheStore(slot=cache.lookup(sprite), sprite=sprite).pack()
+
+def test_resident_sprite_sends_only_coords():
+    cache = SpriteCache()
+    frame = FlakyFrame(0x30)
+    sprite = make_sprite(1)
+
+    async def draw_twice():
+        return [await cache.draw(frame, sprite, 1, 1, 0x30, 0x31) for _ in range(2)]
+
+    assert asyncio.run(draw_twice()) == [False, True]
+    assert [msg_code for msg_code, _ in frame.sent] == [0x30, 0x31, 0x31]
@@ -0,0 +1,47 @@
+"""Tests for TextSpriteSession's incremental updates of the Frameside text sprite block."""
+import asyncio
+
+from frame_msg import TextSpriteSession, TxTextSpriteBlock
+
+class TextSpriteBlockModel:
+    """What the Frameside text_sprite_block parser holds: the packed line sprites by 1-based index"""
+    def __init__(self):
+        self.lines = {}
+        self.expected_sprites = 0
+
+    def receive(self, message: bytes) -> None:
+        if message[0] == 0xFF:
+            self.lines = {}
+            self.expected_sprites = message[4]
+            assert len(message) == 5 + 4 * self.expected_sprites
+        elif message[0] == 0xFE:
+            self.lines[message[1]] = message[6:]
+        else:
+            assert self.expected_sprites > 0, "more line sprites than the block header announced"
+            self.expected_sprites -= 1
+            self.lines[len(self.lines) + 1] = message
+
+    def last_lines(self, count: int):
+        return [self.lines[index] for index in sorted(self.lines)[-count:]]
+
+class RecordingFrame:
+    def __init__(self):
+        self.model = TextSpriteBlockModel()
+
+    async def send_message(self, msg_code: int, payload: bytes) -> bool:
+        self.model.receive(payload)
+        return True
+
+def test_caption_longer_than_a_block():
+    # a streaming caption that grows one line at a time well past the 255 lines a block can index
+    session = TextSpriteSession(width=200, font_size=24, max_display_rows=3)
+    frame = RecordingFrame()
+    lines = [f"line {i}" for i in range(1, 601)]
+
+    async def stream():
+        for count in range(1, len(lines) + 1):
+            await session.send(frame, 0x20, '\n'.join(lines[:count]))
+            expected = TxTextSpriteBlock(200, 24, 3, '\n'.join(lines[max(0, count - 3):count])).sprites
+            assert frame.model.last_lines(len(expected)) == [sprite.pack() for sprite in expected]
+
+    asyncio.run(stream())
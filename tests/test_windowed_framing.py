@@ -0,0 +1,135 @@
+"""
+Tests for the windowed (extended) framing, against SimFrameBle's model of data.lua and, if lupa is installed,
+against data.lua itself running in a Lua runtime.
+"""
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from frame_msg import FrameMsg, SimFrameBle
+
+DATA_LUA = Path(__file__).parents[1] / 'src' / 'frame_msg' / 'lua' / 'data.lua'
+
+class DropSimFrameBle(SimFrameBle):
+    """SimFrameBle that also drops the data packets (without the 0x01 prefix) that `drop(packet)` returns True for"""
+    def __init__(self, drop=None, **kwargs):
+        super().__init__(**kwargs)
+        self.drop = drop
+
+    async def _transmit(self, data: bytes) -> bool:
+        delivered = await super()._transmit(data)
+        return delivered and not (self.drop is not None and data[0] == 0x01 and self.drop(data[1:]))
+
+class LuaFrameBle(DropSimFrameBle):
+    """DropSimFrameBle whose data accumulator is data.lua, run by lupa"""
+    def __init__(self, **kwargs):
+        lupa = pytest.importorskip('lupa')
+        super().__init__(**kwargs)
+        self.lua = lupa.LuaRuntime(encoding=None)
+        self.lua_acks = []
+        self.lua.execute(b"frame = {bluetooth={}, sleep=function() end, compression={}}")
+        frame = self.lua.globals()[b'frame']
+        frame[b'bluetooth'][b'send'] = lambda ack: self.lua_acks.append(bytes(ack))
+        frame[b'bluetooth'][b'receive_callback'] = lambda handler: None
+        self.data_lua = self.lua.execute(DATA_LUA.read_bytes())
+
+    def _update_app_data_accum(self, data: bytes) -> None:
+        self.data_lua[b'update_app_data_accum'](data)
+        for ack in self.lua_acks:
+            self._send_ack(ack)
+        self.lua_acks.clear()
+
+        blocks = self.data_lua[b'app_data_block']
+        for msg_code in list(blocks.keys()):
+            self._deliver_message(msg_code, bytes(blocks[msg_code]))
+            blocks[msg_code] = None
+
+@pytest.fixture(params=[DropSimFrameBle, LuaFrameBle], ids=['sim', 'data_lua'])
+def device(request):
+    return request.param
+
+def send_all(sim, messages, windowed=True, one_at_a_time=False):
+    """Send (msg_code, payload) messages from a FrameMsg over `sim`, and return what Frame received"""
+    frame = FrameMsg(ble=sim, windowed=windowed)
+
+    async def send():
+        await frame.connect(initialize=False)
+        if one_at_a_time:
+            for msg_code, payload in messages:
+                await frame.send_message(msg_code, payload)
+        else:
+            futures = [await frame.queue_message(msg_code, payload) for msg_code, payload in messages]
+            await asyncio.gather(*futures)
+        await sim.flush()
+        await frame.disconnect()
+
+    asyncio.run(send())
+    return sim.messages
+
+def drop_once(predicate):
+    """A drop function that drops only the first packet `predicate` returns True for"""
+    dropped = []
+    def drop(packet):
+        if not dropped and predicate(packet):
+            dropped.append(packet)
+            return True
+        return False
+    return drop
+
+def is_first_packet(packet):
+    return packet[1:3] == b'\xff\xff'
+
+def test_lost_first_packet_is_resent(device):
+    # with no other extended message on the msg_code, the packets after a lost first packet arrive first
+    messages = [(0x20, bytes(range(256)) * 12), (0x20, b'next' * 100)]
+    sim = device(drop=drop_once(is_first_packet), time_scale=0.1, seed=1)
+    assert send_all(sim, messages) == messages
+    assert sim.stats.packets_dropped == 1
+
+def test_lost_first_packet_between_messages(device):
+    # a message that completes, then one whose first packet is lost
+    messages = [(0x20, b'a' * 1000), (0x20, bytes(range(256)) * 12)]
+    sim = device(drop=drop_once(lambda packet: is_first_packet(packet) and packet[4] == 1), time_scale=0.1, seed=1)
+    assert send_all(sim, messages, one_at_a_time=True) == messages
+    assert sim.stats.packets_dropped == 1
+
+def test_random_packet_loss(device):
+    messages = [(0x20, bytes([i]) * (100 + 150 * i)) for i in range(20)]
+    sim = device(drop_rate=0.02, time_scale=0.1, seed=3)
+    assert send_all(sim, messages) == messages
+
+def test_legacy_messages_after_extended_messages(device):
+    # a legacy first packet [0x20, 0x01, 0x00, 0x00, ...] (256 bytes, starting 0x00) looks like a late duplicate of
+    # message id 1 to a guess based on completed message ids, but the framings are told apart by the 0xFF marker
+    extended = [(0x20, b'a' * 1000), (0x20, b'b' * 1000)]
+    legacy = [(0x20, bytes(256)), (0x20, b'\xff' * 600)]
+    sim = device(time_scale=0.1, seed=1)
+    frame = FrameMsg(ble=sim, windowed=True)
+
+    async def send():
+        await frame.connect(initialize=False)
+        for msg_code, payload in extended:
+            await frame.send_message(msg_code, payload)
+        for msg_code, payload in legacy:
+            await sim.send_message(msg_code, payload)
+        await frame.send_message(0x20, b'c' * 1000)
+        await sim.flush()
+        await frame.disconnect()
+
+    asyncio.run(send())
+    assert sim.messages == extended + legacy + [(0x20, b'c' * 1000)]
+
+def test_legacy_payload_limit():
+    sim = SimFrameBle(time_scale=0)
+    frame = FrameMsg(ble=sim)
+
+    async def send():
+        await frame.connect(initialize=False)
+        with pytest.raises(ValueError):
+            await frame.send_message(0x20, bytes(0xFF00))
+        await frame.send_message(0x20, bytes(0xFEFF))
+        await frame.disconnect()
+
+    asyncio.run(send())
+    assert sim.messages == [(0x20, bytes(0xFEFF))]